@@ -358,6 +358,13 @@ async function processBatchWithPython(parcelId) {
         '1'
     ];
 
+    if (process.env.PYTHON_WORKER_MODE === 'spawn') {
+        return runPythonOnce(pythonCommand, args);
+    }
+    return getPersistentWorker(pythonCommand, workerPath).submit(args.slice(1));
+}
+
+function runPythonOnce(pythonCommand, args) {
     console.log(`🚀 Executing Python: ${pythonCommand} with ${args.length} arguments`);
 
     return new Promise((resolve, reject) => {
@@ -402,6 +409,101 @@ async function processBatchWithPython(parcelId) {
     });
 }
 
+// ==================== PERSISTENT PYTHON WORKER ====================
+// One long-lived `pipeline.py --serve` process answers JSON-lines requests, so
+// claims no longer pay interpreter startup and library imports each time.
+
+let persistentWorker = null;
+
+function getPersistentWorker(pythonCommand, workerPath) {
+    if (!persistentWorker || persistentWorker.exited) {
+        persistentWorker = createPersistentWorker(pythonCommand, workerPath);
+    }
+    return persistentWorker;
+}
+
+function createPersistentWorker(pythonCommand, workerPath) {
+    console.log(`🚀 Starting persistent Python worker: ${pythonCommand} ${workerPath} --serve`);
+    const py = spawn(pythonCommand, [workerPath, '--serve'], {
+        cwd: process.cwd(),
+        stdio: ['pipe', 'pipe', 'pipe']
+    });
+    const pending = new Map();
+    const worker = { exited: false };
+    let nextId = 1;
+    let buffered = '';
+
+    const failAll = (message) => {
+        pending.forEach(({ reject, timeout }) => {
+            clearTimeout(timeout);
+            reject(new Error(message));
+        });
+        pending.clear();
+    };
+
+    py.stdout.on('data', data => {
+        buffered += data.toString();
+        let newline;
+        while ((newline = buffered.indexOf('\n')) !== -1) {
+            const line = buffered.slice(0, newline);
+            buffered = buffered.slice(newline + 1);
+            if (!line.trim()) continue;
+            let result;
+            try {
+                result = JSON.parse(line);
+            } catch (error) {
+                console.error(`❌ Invalid JSON from Python worker: ${error.message}`);
+                continue;
+            }
+            const entry = pending.get(result.request_id);
+            if (!entry) continue;
+            pending.delete(result.request_id);
+            clearTimeout(entry.timeout);
+            if (result.error) {
+                entry.reject(new Error(`Python failed: ${result.error}${result.details ? ` - ${result.details}` : ''}`));
+            } else {
+                console.log('✅ Python processing completed');
+                entry.resolve(result);
+            }
+        }
+    });
+
+    py.stderr.on('data', data => console.log('[PYTHON]:', data.toString()));
+
+    py.on('close', code => {
+        worker.exited = true;
+        failAll(`Python worker exited with code ${code}`);
+    });
+
+    py.on('error', error => {
+        worker.exited = true;
+        failAll(`Failed to start Python: ${error.message}`);
+    });
+
+    worker.stop = () => py.stdin.end();
+
+    worker.submit = (claimArgs) => new Promise((resolve, reject) => {
+        if (worker.exited) {
+            reject(new Error('Python worker is not running'));
+            return;
+        }
+        const requestId = String(nextId++);
+        const timeout = setTimeout(() => {
+            pending.delete(requestId);
+            reject(new Error('Python timeout (60s)'));
+            // A stuck worker would hold every later claim too: kill it so the
+            // close handler fails the rest and the next submit respawns it
+            worker.exited = true;
+            py.kill();
+        }, 60000);
+        pending.set(requestId, { resolve, reject, timeout });
+        console.log(`🚀 Submitting claim ${requestId} to persistent Python worker`);
+        py.stdin.write(JSON.stringify({ request_id: requestId, args: claimArgs }) + '\n');
+    });
+
+    return worker;
+}
+
 function generateFallbackResult(files, reason) {
     console.log(`⚠️ Fallback result: ${reason}`);
     return {
@@ -916,6 +1018,9 @@ app.use('*', (req, res) => {
 
 const gracefulShutdown = () => {
     console.log('\n🛑 Shutting down gracefully...');
+    if (persistentWorker && !persistentWorker.exited) {
+        persistentWorker.stop();
+    }
     if (mongoose.connection.readyState === 1) {
         mongoose.connection.close(() => {
             console.log('📴 MongoDB closed');
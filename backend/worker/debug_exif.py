@@ -64,7 +64,21 @@ def debug_image_exif(image_path):
     except Exception as e:
         results['methods']['exif_lib'] = {'success': False, 'error': str(e)}
     
-    # Method 3: exifread library
+    # Method 3: pipeline's header-only reader
+    try:
+        from exif_reader import read_exif_header
+        header = read_exif_header(image_path)
+        results['methods']['header_reader'] = {
+            'success': True,
+            'image_info': header['image_info'],
+            'tags_found': len(header['tags']) + len(header['gps']),
+            'data': {**{k: str(v) for k, v in header['tags'].items()},
+                     **{f'GPS_{k}': str(v) for k, v in header['gps'].items()}}
+        }
+    except Exception as e:
+        results['methods']['header_reader'] = {'success': False, 'error': str(e)}
+    
+    # Method 4: exifread library
     try:
         import exifread
         with open(image_path, 'rb') as f:
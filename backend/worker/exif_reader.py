@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Header-only EXIF reader
+
+Memory-maps the image, walks the JPEG markers up to the first scan and decodes
+an allowlist of tags from the APP1/Exif TIFF block. Pixel data is never read,
+so the cost does not grow with the image's megapixels.
+"""
+
+import mmap
+import struct
+
+# Values larger than this (MakerNote, thumbnails, padding blobs) are skipped
+MAX_VALUE_BYTES = 256
+
+IFD0_TAGS = {271: 'Make', 272: 'Model', 305: 'Software', 306: 'DateTime'}
+EXIF_IFD_TAGS = {36867: 'DateTimeOriginal', 36868: 'DateTimeDigitized'}
+GPS_TAGS = {
+    1: 'GPSLatitudeRef', 2: 'GPSLatitude', 3: 'GPSLongitudeRef', 4: 'GPSLongitude',
+    5: 'GPSAltitudeRef', 6: 'GPSAltitude', 7: 'GPSTimeStamp', 29: 'GPSDateStamp',
+}
+EXIF_IFD_POINTER = 34665
+GPS_IFD_POINTER = 34853
+
+# TIFF field type -> (struct code, size in bytes)
+_TIFF_TYPES = {
+    1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('L', 4), 5: ('LL', 8),
+    7: ('B', 1), 9: ('l', 4), 10: ('ll', 8),
+}
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_JPEG_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+class ExifParseError(ValueError):
+    """The fast path could not make sense of the file; callers fall back to PIL"""
+
+def _read_value(buf, base, endian, field_type, count, value_field_pos):
+    """Decode one IFD entry's value, or return None when it is too large to bother with"""
+    code, size = _TIFF_TYPES[field_type]
+    total = size * count
+    if total > MAX_VALUE_BYTES:
+        return None
+    if total <= 4:
+        pos = value_field_pos
+    else:
+        pos = base + struct.unpack_from(endian + 'L', buf, value_field_pos)[0]
+    if pos + total > len(buf):
+        raise ExifParseError('EXIF value points outside the APP1 segment')
+
+    if field_type == 2:
+        return bytes(buf[pos:pos + total]).split(b'\x00', 1)[0].decode('utf-8', errors='replace').strip()
+    if field_type in (5, 10):
+        values = []
+        for i in range(count):
+            num, den = struct.unpack_from(endian + code, buf, pos + i * 8)
+            values.append(num / den if den else float(num))
+    else:
+        values = list(struct.unpack_from(f"{endian}{count}{code}", buf, pos))
+    return values[0] if count == 1 else tuple(values)
+
+def _read_ifd(buf, base, endian, offset, allowed):
+    """Read allowlisted tags from the IFD at `offset` (relative to the TIFF header)"""
+    pos = base + offset
+    if offset <= 0 or pos + 2 > len(buf):
+        raise ExifParseError('IFD offset outside the APP1 segment')
+    (count,) = struct.unpack_from(endian + 'H', buf, pos)
+    if pos + 2 + count * 12 > len(buf):
+        raise ExifParseError('IFD entries run past the APP1 segment')
+
+    tags = {}
+    for i in range(count):
+        entry = pos + 2 + i * 12
+        tag, field_type, value_count = struct.unpack_from(endian + 'HHL', buf, entry)
+        if tag not in allowed or field_type not in _TIFF_TYPES:
+            continue
+        value = _read_value(buf, base, endian, field_type, value_count, entry + 8)
+        if value is not None:
+            tags[tag] = value
+    return tags
+
+def _parse_tiff(buf, base):
+    """Decode IFD0, the Exif IFD and the GPS IFD from a TIFF block starting at `base`"""
+    byte_order = bytes(buf[base:base + 2])
+    if byte_order == b'II':
+        endian = '<'
+    elif byte_order == b'MM':
+        endian = '>'
+    else:
+        raise ExifParseError('Unknown TIFF byte order')
+    magic, ifd0_offset = struct.unpack_from(endian + 'HL', buf, base + 2)
+    if magic != 42:
+        raise ExifParseError('Bad TIFF magic number')
+
+    pointers = {EXIF_IFD_POINTER: 'exif', GPS_IFD_POINTER: 'gps'}
+    ifd0 = _read_ifd(buf, base, endian, ifd0_offset, set(IFD0_TAGS) | set(pointers))
+    tags = {IFD0_TAGS[t]: v for t, v in ifd0.items() if t in IFD0_TAGS}
+    gps = {}
+    if EXIF_IFD_POINTER in ifd0:
+        exif_ifd = _read_ifd(buf, base, endian, ifd0[EXIF_IFD_POINTER], set(EXIF_IFD_TAGS))
+        tags.update({EXIF_IFD_TAGS[t]: v for t, v in exif_ifd.items()})
+    if GPS_IFD_POINTER in ifd0:
+        gps = _read_ifd(buf, base, endian, ifd0[GPS_IFD_POINTER], set(GPS_TAGS))
+    return tags, gps
+
+def read_exif_header(image_path):
+    """
+    Read image info and allowlisted EXIF tags from a JPEG's headers
+
+    Returns {'image_info': {format, mode, size}, 'tags': {name: value},
+    'gps': {gps_tag_id: value}}; GPS values keep their numeric tag ids so they
+    line up with PIL's GPSInfo dict. Raises ExifParseError for anything that
+    is not a well-formed JPEG.
+    """
+    try:
+        with open(image_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _walk_jpeg(mm)
+    except (OSError, ValueError, struct.error) as e:
+        if isinstance(e, ExifParseError):
+            raise
+        raise ExifParseError(str(e)) from e
+
+def _walk_jpeg(mm):
+    if mm[:2] != b'\xff\xd8':
+        raise ExifParseError('Not a JPEG file')
+
+    tags, gps, image_info = {}, {}, None
+    pos, size = 2, len(mm)
+    while pos + 4 <= size:
+        if mm[pos] != 0xFF:
+            raise ExifParseError(f'Expected JPEG marker at offset {pos}')
+        marker = mm[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0xD8 or 0xD0 <= marker <= 0xD7:  # standalone markers
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):  # end of image / start of scan: headers are over
+            break
+        (length,) = struct.unpack_from('>H', mm, pos + 2)
+        segment_start, segment_end = pos + 4, pos + 2 + length
+        if length < 2 or segment_end > size:
+            raise ExifParseError('Truncated JPEG segment')
+
+        if marker == 0xE1 and not tags and not gps and mm[segment_start:segment_start + 6] == b'Exif\x00\x00':
+            app1 = memoryview(mm)[segment_start + 6:segment_end]
+            try:
+                tags, gps = _parse_tiff(app1, 0)
+            finally:
+                app1.release()
+        elif marker in _SOF_MARKERS:
+            _precision, height, width, components = struct.unpack_from('>BHHB', mm, segment_start)
+            image_info = {
+                'format': 'JPEG',
+                'mode': _JPEG_MODES.get(components, f'{components}-channel'),
+                'size': [width, height]
+            }
+            break
+        pos = segment_end
+
+    if image_info is None:
+        raise ExifParseError('No JPEG frame header found')
+    return {'image_info': image_info, 'tags': tags, 'gps': gps}
@@ -0,0 +1,360 @@
+# Shared module: canonical copy in backend/worker/, vendored unchanged into cropfarmPY/modules/
+"""
+Pooled keep-alive HTTP clients for external providers
+
+One client per provider holds a bounded pool of persistent connections, so a
+long-lived or batch worker pays DNS, TCP and TLS setup once per connection
+instead of once per lookup. Requests retry transient failures (connection
+errors, 429 and 5xx) with jittered exponential backoff, never past their
+deadline, and every client keeps a latency histogram.
+
+Base URLs can be overridden per provider (e.g. OPEN_METEO_URL) to point the
+client at a local stub server.
+"""
+
+import http.client
+import json
+import os
+import random
+import ssl
+import sys
+import threading
+import time
+import urllib.parse
+
+DEBUG_MODE = os.getenv('DEBUG_MODE', 'true').lower() == 'true'
+# Persistent connections kept per provider; also the cap on concurrent requests
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '4'))
+# Extra attempts after the first for retryable failures
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+# Backoff before retry n is uniform in [0, base * 2**n], capped at HTTP_BACKOFF_MAX_S
+HTTP_BACKOFF_S = float(os.getenv('HTTP_BACKOFF_SECONDS', '0.2'))
+HTTP_BACKOFF_MAX_S = 2.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Upper bounds of the latency histogram buckets
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Provider name -> base URL
+PROVIDER_URLS = {
+    'open_meteo': os.getenv('OPEN_METEO_URL', 'https://api.open-meteo.com'),
+    'open_meteo_archive': os.getenv('OPEN_METEO_ARCHIVE_URL', 'https://archive-api.open-meteo.com'),
+    'meteostat': os.getenv('METEOSTAT_URL', 'https://meteostat.p.rapidapi.com'),
+}
+
+def debug(msg):
+    if DEBUG_MODE:
+        print(f"[DEBUG] {msg}", file=sys.stderr)
+
+def _decode(status, body):
+    """JSON body, or None when empty; error pages are often HTML, so only successful responses must parse"""
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        if status < 400:
+            raise
+        return None
+
+class HttpError(Exception):
+    """A request that failed after all its attempts"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class DeadlineExceeded(HttpError):
+    """A request that ran out of time before an attempt could finish"""
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles are bucket upper bounds"""
+
+    def __init__(self, bounds_ms=LATENCY_BUCKETS_MS):
+        self.bounds_ms = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, ms):
+        i = next((i for i, bound in enumerate(self.bounds_ms) if ms <= bound), len(self.bounds_ms))
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile (the max for the overflow bucket)"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank, seen = pct / 100.0 * self.count, 0
+            for i, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank and n:
+                    return self.bounds_ms[i] if i < len(self.bounds_ms) else round(self.max_ms, 1)
+            return round(self.max_ms, 1)
+
+    def snapshot(self):
+        with self._lock:
+            counts, count, total_ms, max_ms = list(self.counts), self.count, self.total_ms, self.max_ms
+        labels = [f"<={b}" for b in self.bounds_ms] + [f">{self.bounds_ms[-1]}"]
+        return {
+            'count': count,
+            'mean_ms': round(total_ms / count, 1) if count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(max_ms, 1) if count else None,
+            'buckets_ms': {label: n for label, n in zip(labels, counts) if n},
+        }
+
+class HttpClient:
+    """Keep-alive connection pool to one provider host"""
+
+    def __init__(self, name, base_url, pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES,
+                 backoff_s=HTTP_BACKOFF_S, timeout_s=10.0):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.name = name
+        self.base_url = base_url
+        self.https = parsed.scheme == 'https'
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.base_path = parsed.path.rstrip('/')
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.failures = 0
+        self.retried = 0
+        self.connections_opened = 0
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._ssl_context = None
+
+    # -------------------------------------------------------------------------
+    # Connection pool
+    # -------------------------------------------------------------------------
+
+    def _connect(self, timeout):
+        with self._lock:
+            self.connections_opened += 1
+            if self.https and self._ssl_context is None:
+                # Loading the CA bundle is costly, so every connection shares one context
+                self._ssl_context = ssl.create_default_context()
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=self._ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout):
+        """(connection, reused) once a pool slot is free within `timeout`"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Sockets inherited across a fork belong to the parent, and so do slots
+                # held by its other threads, which never run in the child to release them
+                self._idle, self._slots, self._pid = [], threading.BoundedSemaphore(self.pool_size), os.getpid()
+            slots = self._slots
+        if not slots.acquire(timeout=max(0.0, timeout)):
+            raise DeadlineExceeded(f"{self.name}: no free connection before the deadline")
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return self._connect(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn, reusable):
+        if reusable:
+            with self._lock:
+                self._idle.append(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    # -------------------------------------------------------------------------
+    # Requests
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _send(conn, target, headers):
+        conn.request('GET', target, headers=headers)
+        response = conn.getresponse()
+        body = response.read()
+        return response.status, body, not response.will_close
+
+    def _attempt(self, target, headers, remaining):
+        """One GET on a pooled connection; returns (status, body)"""
+        conn, reused = self._acquire(remaining)
+        try:
+            try:
+                status, body, reusable = self._send(conn, target, headers)
+            except ConnectionError:
+                if not reused:
+                    raise
+                # The server may have closed an idle keep-alive connection; retry once on a fresh one
+                conn.close()
+                conn = self._connect(remaining)
+                status, body, reusable = self._send(conn, target, headers)
+        except BaseException:
+            self._release(conn, False)
+            raise
+        self._release(conn, reusable)
+        return status, body
+
+    def get_json(self, path, params=None, headers=None, deadline_s=None):
+        """
+        GET base_url + path and decode the JSON body. Returns (status, data); data
+        is None for an empty body. Raises HttpError once retries are exhausted and
+        DeadlineExceeded when the deadline (default timeout_s) passes first.
+        """
+        target = self.base_path + path + ('?' + urllib.parse.urlencode(params) if params else '')
+        headers = dict(headers or {}, **{'Accept': 'application/json', 'Connection': 'keep-alive'})
+        start = time.monotonic()
+        deadline = start + (deadline_s if deadline_s is not None else self.timeout_s)
+        with self._lock:
+            self.requests += 1
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count_failure()
+                raise DeadlineExceeded(f"{self.name}: deadline exceeded after {attempt} attempts")
+            try:
+                status, body = self._attempt(target, headers, remaining)
+                if status not in RETRY_STATUSES:
+                    self.latency.record((time.monotonic() - start) * 1000.0)
+                    return status, _decode(status, body)
+                error = HttpError(f"{self.name}: HTTP {status}", status)
+            except DeadlineExceeded:
+                self._count_failure()
+                raise
+            except (OSError, http.client.HTTPException) as e:
+                error = HttpError(f"{self.name}: {type(e).__name__}: {e}")
+
+            attempt += 1
+            if attempt > self.retries:
+                self._count_failure()
+                raise error
+            pause = random.uniform(0.0, min(HTTP_BACKOFF_MAX_S, self.backoff_s * (2 ** (attempt - 1))))
+            if time.monotonic() + pause >= deadline:
+                self._count_failure()
+                raise DeadlineExceeded(f"{self.name}: no time left to retry ({error})")
+            with self._lock:
+                self.retried += 1
+            debug(f"{self.name}: {error}, retrying in {pause * 1000:.0f}ms")
+            time.sleep(pause)
+
+    def _count_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def stats(self):
+        with self._lock:
+            report = {
+                'base_url': self.base_url,
+                'pool_size': self.pool_size,
+                'idle_connections': len(self._idle),
+                'connections_opened': self.connections_opened,
+                'requests': self.requests,
+                'retries': self.retried,
+                'failures': self.failures,
+            }
+        report['latency'] = self.latency.snapshot()
+        return report
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def http_client(provider):
+    """Process-wide pooled client for a provider named in PROVIDER_URLS"""
+    with _clients_lock:
+        client = _clients.get(provider)
+        if client is None:
+            client = _clients[provider] = HttpClient(provider, PROVIDER_URLS[provider])
+    return client
+
+def http_stats():
+    """Pool, retry and latency statistics for every client used in this process"""
+    with _clients_lock:
+        clients = dict(_clients)
+    return {name: client.stats() for name, client in clients.items()}
+
+# -----------------------------------------------------------------------------
+# Self-test
+# -----------------------------------------------------------------------------
+
+def self_test():
+    """
+    Checks for `pipeline.py --self-test` against a local http.server stub:
+    keep-alive reuse, retry after a 5xx, the deadline, and pool slots after a fork.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {'fail': 0, 'delay_s': 0.0}
+
+    class Stub(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(state['delay_s'])
+            status = 503 if state['fail'] > 0 else 200
+            state['fail'] -= 1
+            body = b'{"ok": true}'
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Stub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    report = {}
+    try:
+        client = HttpClient('self_test', url, pool_size=1, backoff_s=0.01)
+        for _ in range(3):
+            client.get_json('/')
+        report['keep_alive_reuse'] = {'ok': client.connections_opened == 1,
+                                      'connections_opened': client.connections_opened}
+
+        state['fail'] = 2
+        status, data = client.get_json('/')
+        report['retry_on_5xx'] = {'ok': status == 200 and client.retried == 2 and data == {'ok': True},
+                                  'status': status, 'retries': client.retried}
+
+        state['delay_s'] = 0.5
+        started = time.monotonic()
+        try:
+            client.get_json('/', deadline_s=0.2)
+            raised = None
+        except DeadlineExceeded as e:
+            raised = type(e).__name__
+        elapsed = time.monotonic() - started
+        report['deadline'] = {'ok': raised == 'DeadlineExceeded' and elapsed < 0.45,
+                              'raised': raised, 'elapsed_s': round(elapsed, 3)}
+        state['delay_s'] = 0.0
+
+        # A slot held by a parent thread at fork time must not be lost in the child
+        forked = HttpClient('self_test', url, pool_size=1)
+        forked._slots.acquire()
+        forked._pid = -1
+        try:
+            status, _ = forked.get_json('/', deadline_s=0.5)
+        except HttpError as e:
+            status = str(e)
+        report['slots_after_fork'] = {'ok': status == 200, 'status': status}
+    finally:
+        server.shutdown()
+        server.server_close()
+    return report
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Compact binary parcel store
+
+A cadastral GeoJSON is converted once into a flat binary file that workers open
+with numpy.memmap. Nothing is parsed at startup and every worker process
+shares the same pages through the OS page cache, whatever the size of the
+cadastre.
+
+Layout (little-endian, every section 8-byte aligned, in this order):
+
+    header      64 bytes: magic, format version, parcel count, vertex count,
+                hash table size, id blob size
+    offsets     uint64[n + 1]    first vertex of each parcel
+    bboxes      float64[n, 4]    min_lon, min_lat, max_lon, max_lat
+    vertices    float64[v, 2]    exterior rings as lon, lat
+    id_offsets  uint64[n + 1]    start of each parcel_id in the id blob
+    id_table    int64[size]      open-addressing hash of parcel_id -> parcel (-1 = empty)
+    id_blob     bytes            UTF-8 parcel ids back to back
+
+Usage:
+    python parcel_store.py <cadastre.geojson> [<output.parcels>]
+"""
+
+import array
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+MAGIC = b'PARCELS1'
+FORMAT_VERSION = 1
+HEADER_BYTES = 64
+_HEADER = struct.Struct('<8sI4xQQQQ')
+STORE_SUFFIX = '.parcels'
+READ_CHUNK_CHARS = 1 << 20
+
+def _align8(n):
+    return (n + 7) & ~7
+
+def _id_hash(key_bytes):
+    """Stable 64-bit hash of a parcel id (Python's hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), 'little')
+
+def is_parcel_store(path):
+    """True when `path` is a binary parcel store rather than GeoJSON"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def store_path_for(geojson_path):
+    """Where the converter writes the store for a GeoJSON file by default"""
+    return os.path.splitext(geojson_path)[0] + STORE_SUFFIX
+
+def _section_layout(n_parcels, n_vertices, table_size, id_bytes):
+    """Byte offset of every section, derived from the counts in the header"""
+    sizes = [
+        ('offsets', (n_parcels + 1) * 8),
+        ('bboxes', n_parcels * 32),
+        ('vertices', n_vertices * 16),
+        ('id_offsets', (n_parcels + 1) * 8),
+        ('id_table', table_size * 8),
+        ('id_blob', id_bytes),
+    ]
+    layout, pos = {}, HEADER_BYTES
+    for name, size in sizes:
+        layout[name] = pos
+        pos = _align8(pos + size)
+    return layout, pos
+
+# -----------------------------------------------------------------------------
+# Streaming GeoJSON reader
+# -----------------------------------------------------------------------------
+
+class _JsonStream:
+    """Incremental JSON tokenizer over a file, decoding one value at a time with raw_decode"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.f.read(READ_CHUNK_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has been consumed so the buffer stays about one chunk long
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at end of file"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f"Expected '{ch}' at GeoJSON offset ~{self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A value ending at the buffer edge may be a truncated number or literal
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def iter_geojson_features(path):
+    """Yield the features of a FeatureCollection one at a time without loading the whole file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if key == 'features':
+                stream.expect('[')
+                if stream.peek() == ']':
+                    stream.pos += 1
+                else:
+                    while True:
+                        yield stream.value()
+                        if stream.peek() == ',':
+                            stream.pos += 1
+                            continue
+                        stream.expect(']')
+                        break
+            else:
+                stream.value()  # type, name, crs, bbox... are not needed
+            if stream.peek() == ',':
+                stream.pos += 1
+                continue
+            stream.expect('}')
+            return
+
+def feature_ring(feature):
+    """Exterior ring of a Polygon feature, or None when the feature has no usable polygon"""
+    geometry = feature.get('geometry') or {}
+    if geometry.get('type', 'Polygon') != 'Polygon':
+        return None
+    try:
+        ring = geometry['coordinates'][0]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return ring if ring else None
+
+# -----------------------------------------------------------------------------
+# Converter
+# -----------------------------------------------------------------------------
+
+def convert_geojson(geojson_path, store_path=None):
+    """Stream a cadastral GeoJSON into a binary parcel store; returns a summary dict"""
+    start = time.perf_counter()
+    store_path = store_path or store_path_for(geojson_path)
+    offsets = array.array('Q', [0])
+    bboxes = array.array('d')
+    id_offsets = array.array('Q', [0])
+    id_chunks = []
+    id_bytes = 0
+    skipped = 0
+
+    out_dir = os.path.dirname(os.path.abspath(store_path))
+    with tempfile.TemporaryFile(dir=out_dir) as vertex_file:
+        for feature in iter_geojson_features(geojson_path):
+            ring = feature_ring(feature)
+            try:
+                coords = array.array('d')
+                for c in ring:
+                    coords.append(float(c[0]))
+                    coords.append(float(c[1]))
+            except (TypeError, ValueError, IndexError):
+                skipped += 1
+                continue
+
+            lons, lats = coords[0::2], coords[1::2]
+            bboxes.extend((min(lons), min(lats), max(lons), max(lats)))
+            coords.tofile(vertex_file)
+            offsets.append(offsets[-1] + len(lons))
+
+            parcel_id = (feature.get('properties') or {}).get('parcel_id')
+            key = str(parcel_id).encode('utf-8') if parcel_id is not None else b''
+            id_chunks.append(key)
+            id_bytes += len(key)
+            id_offsets.append(id_bytes)
+
+        n_parcels, n_vertices = len(offsets) - 1, offsets[-1]
+        id_blob = b''.join(id_chunks)
+        id_table = _build_id_table(id_blob, id_offsets, n_parcels)
+        layout, total = _section_layout(n_parcels, n_vertices, len(id_table), len(id_blob))
+
+        tmp_path = store_path + '.tmp'
+        with open(tmp_path, 'wb') as out:
+            out.write(_HEADER.pack(MAGIC, FORMAT_VERSION, n_parcels, n_vertices, len(id_table), len(id_blob))
+                      .ljust(HEADER_BYTES, b'\0'))
+            for name, data in (('offsets', offsets), ('bboxes', bboxes), ('vertices', vertex_file),
+                               ('id_offsets', id_offsets), ('id_table', id_table), ('id_blob', id_blob)):
+                out.write(b'\0' * (layout[name] - out.tell()))
+                if name == 'vertices':
+                    vertex_file.seek(0)
+                    while True:
+                        block = vertex_file.read(READ_CHUNK_CHARS)
+                        if not block:
+                            break
+                        out.write(block)
+                elif isinstance(data, array.array):
+                    data.tofile(out)
+                else:
+                    out.write(data)
+            out.write(b'\0' * (total - out.tell()))
+        os.replace(tmp_path, store_path)
+
+    return {
+        'store_path': store_path,
+        'parcels': n_parcels,
+        'vertices': n_vertices,
+        'skipped_features': skipped,
+        'store_bytes': total,
+        'elapsed_s': round(time.perf_counter() - start, 2)
+    }
+
+def _build_id_table(id_blob, id_offsets, n_parcels):
+    """Open-addressing table (linear probing, load <= 0.5); the first parcel with an id wins"""
+    size = 1
+    while size < 2 * max(1, n_parcels):
+        size <<= 1
+    table = array.array('q', [-1]) * size
+    mask = size - 1
+    for i in range(n_parcels):
+        key = id_blob[id_offsets[i]:id_offsets[i + 1]]
+        if not key:
+            continue
+        slot = _id_hash(key) & mask
+        while table[slot] != -1:
+            j = table[slot]
+            if id_blob[id_offsets[j]:id_offsets[j + 1]] == key:
+                break
+            slot = (slot + 1) & mask
+        else:
+            table[slot] = i
+    return table
+
+# -----------------------------------------------------------------------------
+# Reader
+# -----------------------------------------------------------------------------
+
+class ParcelStore:
+    """Read-only memory-mapped view of a binary parcel store"""
+
+    def __init__(self, path):
+        self.path = path
+        self._mm = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, n, v, table_size, id_bytes = _HEADER.unpack_from(self._mm[:_HEADER.size].tobytes())
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} parcel store")
+        layout, total = _section_layout(n, v, table_size, id_bytes)
+        if len(self._mm) < total:
+            raise ValueError(f"{path} is truncated")
+
+        def section(name, dtype, count):
+            return np.frombuffer(self._mm, dtype=dtype, count=count, offset=layout[name])
+
+        self.n_parcels = n
+        self.offsets = section('offsets', '<u8', n + 1)
+        self.bboxes = section('bboxes', '<f8', n * 4).reshape(n, 4)
+        self.vertices = section('vertices', '<f8', v * 2).reshape(v, 2)
+        self.id_offsets = section('id_offsets', '<u8', n + 1)
+        self.id_table = section('id_table', '<i8', table_size)
+        self.id_blob = section('id_blob', np.uint8, id_bytes)
+
+    def __len__(self):
+        return self.n_parcels
+
+    def ring(self, i):
+        """Exterior ring of parcel i as an (k, 2) lon/lat view into the mapped file"""
+        return self.vertices[self.offsets[i]:self.offsets[i + 1]]
+
+    def parcel_id(self, i):
+        start, end = self.id_offsets[i], self.id_offsets[i + 1]
+        return self.id_blob[start:end].tobytes().decode('utf-8') if end > start else None
+
+    def find(self, parcel_id):
+        """Index of the parcel with this id, or None"""
+        key = str(parcel_id).encode('utf-8')
+        if not key or not len(self.id_table):
+            return None
+        mask = len(self.id_table) - 1
+        slot = _id_hash(key) & mask
+        while True:
+            i = int(self.id_table[slot])
+            if i < 0:
+                return None
+            start, end = self.id_offsets[i], self.id_offsets[i + 1]
+            if self.id_blob[start:end].tobytes() == key:
+                return i
+            slot = (slot + 1) & mask
+
+def main():
+    if len(sys.argv) < 2:
+        print(json.dumps({'error': 'Usage: python parcel_store.py <cadastre.geojson> [<output.parcels>]'}))
+        sys.exit(1)
+    summary = convert_geojson(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == '__main__':
+    main()
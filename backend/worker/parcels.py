@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Cadastral parcel index for geofencing
+
+A ParcelIndex parses a parcel file once per process and is shared by every
+corner image and every claim that uses it. Parcels are found by id through a
+hash table and by location through an STRtree over their bounding boxes.
+Shapely geometries are built on first use, prepared for fast point tests and
+kept in an LRU bounded by an approximate memory budget. The file is reloaded
+when its mtime or size changes.
+
+The index reads either the GeoJSON itself or a binary store written by
+parcel_store.py. A store next to the GeoJSON (parcel.geojson -> parcel.parcels)
+is used instead whenever it is at least as new, so large cadastres are
+memory-mapped rather than parsed in every worker.
+"""
+
+import json
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from lazy_imports import lazy_import, has_capability
+import geodesy
+from parcel_store import ParcelStore, feature_ring, is_parcel_store, store_path_for
+
+np = lazy_import('numpy')
+shapely = lazy_import('shapely')
+shapely_geometry = lazy_import('shapely.geometry')
+shapely_prepared = lazy_import('shapely.prepared')
+
+DEBUG_MODE = os.getenv('DEBUG_MODE', 'true').lower() == 'true'
+PARCEL_CACHE_MAX_BYTES = int(float(os.getenv('PARCEL_CACHE_MAX_MB', '256')) * 1024 * 1024)
+# Rough cost of one cached vertex across the polygon and the prepared index
+BYTES_PER_VERTEX = 96
+GEOMETRY_OVERHEAD_BYTES = 2048
+
+def debug(msg):
+    if DEBUG_MODE:
+        print(f"[DEBUG] {msg}", file=sys.stderr)
+
+class Parcel:
+    """One cadastral parcel: id, position in the file, exterior ring as [lon, lat] pairs and its bbox"""
+    __slots__ = ('parcel_id', 'index', 'ring', 'bbox')
+
+    def __init__(self, parcel_id, index, ring, bbox=None):
+        self.parcel_id = parcel_id
+        self.index = index
+        self.ring = ring
+        if bbox is None:
+            lons = [c[0] for c in ring]
+            lats = [c[1] for c in ring]
+            bbox = (min(lons), min(lats), max(lons), max(lats))
+        self.bbox = bbox
+
+class ParcelGeometry:
+    """Shapely polygon and prepared polygon for one parcel"""
+    __slots__ = ('polygon', 'prepared', 'cost')
+
+    def __init__(self, ring):
+        self.polygon = shapely_geometry.shape({"type": "Polygon", "coordinates": [ring]})
+        self.prepared = shapely_prepared.prep(self.polygon)
+        self.cost = GEOMETRY_OVERHEAD_BYTES + BYTES_PER_VERTEX * len(ring)
+
+class ParcelIndex:
+    """Parcels of one GeoJSON file or parcel store, looked up by id, with LRU-cached prepared geometries"""
+
+    def __init__(self, path, max_bytes=PARCEL_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.parcels = []
+        self.by_id = {}
+        self.store = None
+        self._geometries = OrderedDict()
+        self._geometry_bytes = 0
+        self._tree = None
+        self._lock = threading.Lock()
+        self._tree_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if is_parcel_store(self.path):
+            # Nothing is parsed: rings, bboxes and the id table stay in the mapped file
+            self.store = ParcelStore(self.path)
+            debug(f"Parcel index: {len(self.store)} parcels mapped from {os.path.basename(self.path)}")
+            return
+
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+
+        skipped = 0
+        for feature in data.get('features', []):
+            try:
+                ring = feature_ring(feature)
+                parcel_id = (feature.get('properties') or {}).get('parcel_id')
+                parcel = Parcel(parcel_id, len(self.parcels), ring)
+            except (KeyError, IndexError, TypeError, ValueError):
+                skipped += 1
+                continue
+            self.parcels.append(parcel)
+            if parcel_id is not None:
+                self.by_id.setdefault(str(parcel_id), parcel)
+
+        debug(f"Parcel index: {len(self.parcels)} parcels from {os.path.basename(self.path)}"
+              + (f" ({skipped} malformed features skipped)" if skipped else ""))
+
+    def __len__(self):
+        return len(self.store) if self.store is not None else len(self.parcels)
+
+    def parcel(self, i):
+        """Parcel at position i in the file; store parcels are views built on demand"""
+        if self.store is None:
+            return self.parcels[i]
+        return Parcel(self.store.parcel_id(i), i, self.store.ring(i), tuple(self.store.bboxes[i].tolist()))
+
+    def first(self):
+        return self.parcel(0) if len(self) else None
+
+    def get(self, parcel_id):
+        if self.store is None:
+            return self.by_id.get(str(parcel_id))
+        i = self.store.find(parcel_id)
+        return self.parcel(i) if i is not None else None
+
+    def geometry(self, parcel):
+        """Prepared geometry for a parcel, built on first use and evicted LRU past the memory budget"""
+        with self._lock:
+            geom = self._geometries.get(parcel.index)
+            if geom is not None:
+                self._geometries.move_to_end(parcel.index)
+                return geom
+
+            geom = ParcelGeometry(parcel.ring)
+            self._geometries[parcel.index] = geom
+            self._geometry_bytes += geom.cost
+            while self._geometry_bytes > self.max_bytes and len(self._geometries) > 1:
+                _, evicted = self._geometries.popitem(last=False)
+                self._geometry_bytes -= evicted.cost
+            return geom
+
+    # -------------------------------------------------------------------------
+    # Spatial queries
+    # -------------------------------------------------------------------------
+
+    def _spatial_tree(self):
+        """STRtree over parcel bounding boxes, built on the first spatial query"""
+        with self._tree_lock:
+            if self._tree is None:
+                if self.store is not None:
+                    xmin, ymin, xmax, ymax = self.store.bboxes.T
+                else:
+                    xmin, ymin, xmax, ymax = zip(*(p.bbox for p in self.parcels)) if self.parcels else ((),) * 4
+                self._tree = shapely.STRtree(shapely.box(xmin, ymin, xmax, ymax))
+            return self._tree
+
+    def _covers(self, parcel, pt):
+        geom = self.geometry(parcel)
+        return geom.prepared.contains(pt) or geom.prepared.touches(pt)
+
+    def containing(self, lat, lon):
+        """Parcels whose polygon contains (or touches) the point, in file order"""
+        if not has_capability('shapely'):
+            # Bounding boxes narrow the candidates, NumPy ray casting decides
+            if self.store is not None:
+                b = self.store.bboxes
+                hits = np.flatnonzero((b[:, 0] <= lon) & (lon <= b[:, 2]) & (b[:, 1] <= lat) & (lat <= b[:, 3]))
+                candidates = [self.parcel(int(i)) for i in hits]
+            else:
+                candidates = [p for p in self.parcels
+                              if p.bbox[0] <= lon <= p.bbox[2] and p.bbox[1] <= lat <= p.bbox[3]]
+            return [p for p in candidates if geodesy.validate_points([lat], [lon], p.ring)[0][0]]
+        pt = shapely_geometry.Point(lon, lat)
+        candidates = (self.parcel(int(i)) for i in sorted(self._spatial_tree().query(pt)))
+        return [p for p in candidates if self._covers(p, pt)]
+
+    def nearest(self, lat, lon):
+        """(parcel, metres) of the parcel closest to the point; 0 when inside"""
+        if not len(self) or not has_capability('shapely'):
+            return None, None
+        pt = shapely_geometry.Point(lon, lat)
+        tree = self._spatial_tree()
+
+        def closest(indices):
+            # Ranked in metres through each parcel's cached frame; ties go to the parcel first in the file
+            return min((float(geodesy.validate_points([lat], [lon], self.parcel(i).ring)[1][0]), i)
+                       for i in sorted(set(map(int, indices))))
+
+        best_m, best_i = closest(tree.query_nearest(pt, all_matches=True))
+        if best_m > 0:
+            # Box distances are in degrees, where east-west gaps look longer than they are.
+            # A parcel within best_m metres is within best_m / (R cos lat) radians, taking the
+            # cosine at the most poleward latitude it could reach, so no candidate is missed.
+            reach = math.degrees(best_m / geodesy.EARTH_RADIUS_M)
+            cos_lat = math.cos(math.radians(min(89.0, abs(lat) + reach)))
+            radius = reach / cos_lat * 1.01
+            best_m, best_i = closest(list(tree.query(pt, predicate='dwithin', distance=radius)) + [best_i])
+        return self.parcel(best_i), best_m
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'parcels': len(self),
+                'memory_mapped': self.store is not None,
+                'cached_geometries': len(self._geometries),
+                'cached_geometry_bytes': self._geometry_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+# Path -> (file signature, index); one index per file per process
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def _file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def _resolve_source(path):
+    """The converted store next to a GeoJSON file when it is at least as new, else the file itself"""
+    store_path = store_path_for(path)
+    try:
+        if (store_path != path and is_parcel_store(store_path)
+                and os.stat(store_path).st_mtime_ns >= os.stat(path).st_mtime_ns):
+            return store_path
+    except OSError:
+        pass
+    return path
+
+def open_parcel_index(path):
+    """Return the process-wide index for `path`, reloading it if the file changed on disk"""
+    key = os.path.realpath(_resolve_source(path))
+    signature = _file_signature(key)
+    with _indexes_lock:
+        entry = _indexes.get(key)
+        if entry is None or entry[0] != signature:
+            if entry is not None:
+                debug(f"Parcel file changed, reloading {os.path.basename(path)}")
+            entry = (signature, ParcelIndex(key))
+            _indexes[key] = entry
+    return entry[1]
+
+# -----------------------------------------------------------------------------
+# Self-test
+# -----------------------------------------------------------------------------
+
+def _square(lon0, lat0, lon1, lat1):
+    return [[lon0, lat0], [lon1, lat0], [lon1, lat1], [lon0, lat1], [lon0, lat0]]
+
+def self_test():
+    """
+    Checks for `pipeline.py --self-test`. At 20 degrees N parcel 'east' is
+    0.00100 degrees of longitude from the point (104.5 m) and parcel 'north'
+    0.00095 degrees of latitude (105.6 m): nearer in degrees, farther on the ground.
+    """
+    import tempfile
+    lat, lon = 20.0, 78.0
+    features = [
+        {'type': 'Feature', 'properties': {'parcel_id': 'north'},
+         'geometry': {'type': 'Polygon', 'coordinates': [_square(lon - 0.0002, lat + 0.00095, lon + 0.0002, lat + 0.00145)]}},
+        {'type': 'Feature', 'properties': {'parcel_id': 'east'},
+         'geometry': {'type': 'Polygon', 'coordinates': [_square(lon + 0.0010, lat - 0.0002, lon + 0.0015, lat + 0.0002)]}},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'parcels.geojson')
+        with open(path, 'w') as f:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f)
+        if not has_capability('shapely'):
+            return {'nearest_parcel_metric': {'ok': True, 'skipped': 'shapely not installed'}}
+        parcel, metres = ParcelIndex(path).nearest(lat, lon)
+    return {'nearest_parcel_metric': {
+        'ok': parcel is not None and parcel.parcel_id == 'east' and abs(metres - 104.5) < 0.5,
+        'parcel_id': parcel.parcel_id if parcel else None,
+        'distance_m': round(metres, 2) if metres is not None else None,
+    }}
@@ -6,48 +6,49 @@ Includes: EXIF GPS, Coordinate Matching, Geofencing, Weather, AI Damage Assessme
 """
 
 import sys
+import io
 import json
 import time
 import os
-import urllib.request
-import urllib.parse
 import math
+import socketserver
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
 from pathlib import Path
 
-# Optional libs
-try:
-    from PIL import Image, ExifTags
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
-    print("Warning: PIL/Pillow not available", file=sys.stderr)
-
-try:
-    import numpy as np
-except ImportError:
-    np = None
-
-try:
-    import torch
-    import torchvision.transforms as transforms
-    from torchvision import models
-    TORCH_AVAILABLE = True
-except ImportError:
-    TORCH_AVAILABLE = False
-
-try:
-    from shapely.geometry import Point, shape as geom_shape
-    from shapely.ops import nearest_points
-    SHAPELY_AVAILABLE = True
-except ImportError:
-    SHAPELY_AVAILABLE = False
-    print("Warning: Shapely not available - using basic geofencing", file=sys.stderr)
+# Taken before the worker's own modules load, so the startup profile includes them
+_MODULE_LOAD_START = time.perf_counter()
+
+from lazy_imports import lazy_import, has_capability, capabilities, startup_profile
+from exif_reader import read_exif_header, ExifParseError
+from result_cache import result_cache
+from parcels import open_parcel_index
+import geodesy
+from weather import (fetch_real_weather_data, prefetch_weather, start_weather_lookup, weather_provider_stats,
+                     weather_unavailable)
+from weather_cache import weather_cache
+from http_client import http_stats
+from tiled_stats import TILED_MIN_PIXELS, streamed_channel_stats
+
+# Heavy libraries load on first use; availability comes from has_capability()
+Image = lazy_import('PIL.Image')
+ExifTags = lazy_import('PIL.ExifTags')
+np = lazy_import('numpy')
+shapely_geometry = lazy_import('shapely.geometry')
 
 # Configuration
 DEBUG_MODE = True
 TRUST_CLAIMED_COORDS = True
 EXIF_CLAIMED_MATCH_TOLERANCE_M = 50.0
+# Per-image stages run on 'thread' (default) or 'process' executors
+IMAGE_EXECUTOR_KIND = os.getenv('PIPELINE_IMAGE_EXECUTOR', 'thread')
+IMAGE_EXECUTOR_WORKERS = int(os.getenv('PIPELINE_IMAGE_WORKERS', '5'))
+# Bump a stage's version whenever its output changes so cached results are not reused
+ANALYZER_VERSIONS = {'exif': 1, 'damage': 1}
+# Colour-statistics analyzers decode JPEGs at up to 1/N scale (1, 2, 4 or 8; 1 = full resolution)
+ANALYSIS_REDUCTION = int(os.getenv('IMAGE_ANALYSIS_REDUCTION', '8'))
+ANALYSIS_REDUCTIONS = (1, 2, 4, 8)
 
 # -----------------------------------------------------------------------------
 # Helpers
@@ -96,64 +97,100 @@ def _dms_to_decimal(dms, ref):
 # EXIF extraction
 # -----------------------------------------------------------------------------
 
+def _add_gps_fields(exif_data, gps_info, image_path):
+    """Decode an EXIF GPS block (keyed by GPS tag id) into GPS_Latitude/GPS_Longitude"""
+    gps_lat = gps_info.get(2)
+    gps_lat_ref = gps_info.get(1, 'N')
+    gps_lon = gps_info.get(4)
+    gps_lon_ref = gps_info.get(3, 'E')
+
+    debug(f"EXIF GPS for {os.path.basename(image_path)}: lat={gps_lat} {gps_lat_ref}, lon={gps_lon} {gps_lon_ref}")
+
+    lat_dec = _dms_to_decimal(gps_lat, gps_lat_ref) if gps_lat else None
+    lon_dec = _dms_to_decimal(gps_lon, gps_lon_ref) if gps_lon else None
+
+    if lat_dec is not None and lon_dec is not None:
+        exif_data['GPS_Latitude'] = lat_dec
+        exif_data['GPS_Longitude'] = lon_dec
+        exif_data['GPS_Source'] = 'EXIF'
+        debug(f"✓ Extracted EXIF GPS: {lat_dec:.6f}, {lon_dec:.6f}")
+    else:
+        debug("✗ EXIF GPS present but could not decode")
+
+def _extract_exif_fast(image_path):
+    """Header-only path: allowlisted tags from the JPEG APP1 segment, no pixel decode"""
+    header = read_exif_header(image_path)
+    exif_data = {'Image_Info': header['image_info']}
+    # Same PIL_<tag> keys as the PIL path so downstream checks see no difference
+    for tag, value in header['tags'].items():
+        exif_data[f'PIL_{tag}'] = str(value)
+    if header['gps']:
+        _add_gps_fields(exif_data, header['gps'], image_path)
+    elif header['tags']:
+        debug(f"✗ No GPS block in EXIF for {os.path.basename(image_path)}")
+    else:
+        debug(f"✗ No EXIF found for {os.path.basename(image_path)}")
+    return exif_data
+
+def _extract_exif_pil(image_path):
+    """Full PIL path, used for non-JPEG files or when the header parse fails"""
+    exif_data = {}
+    with Image.open(image_path) as img:
+        exif_data['Image_Info'] = {
+            'format': img.format, 
+            'mode': img.mode, 
+            'size': list(img.size)
+        }
+        
+        exif_dict = img._getexif() if hasattr(img, '_getexif') else None
+        if exif_dict:
+            # Map standard tags
+            for tag_id, value in exif_dict.items():
+                tag = ExifTags.TAGS.get(tag_id, f"Tag_{tag_id}")
+                try:
+                    if isinstance(value, bytes):
+                        exif_data[f'PIL_{tag}'] = value.decode('utf-8', errors='replace')
+                    else:
+                        exif_data[f'PIL_{tag}'] = str(value)
+                except Exception:
+                    pass
+
+            # Extract GPS block
+            gps_info = exif_dict.get(34853)  # GPS IFD
+            if gps_info:
+                _add_gps_fields(exif_data, gps_info, image_path)
+            else:
+                debug(f"✗ No GPS block in EXIF for {os.path.basename(image_path)}")
+        else:
+            debug(f"✗ No EXIF found for {os.path.basename(image_path)}")
+    return exif_data
+
 def extract_comprehensive_exif(image_path):
     """Extract EXIF metadata including GPS data"""
     exif_data = {}
     if not os.path.exists(image_path):
         debug(f"Image not found: {image_path}")
         return {}, {"error": f"Image not found: {image_path}"}
-    if not PIL_AVAILABLE:
-        debug("PIL not available for EXIF extraction")
-        return {}, {"error": "PIL not available"}
+
+    cache = result_cache()
+    cached = cache.get('exif', ANALYZER_VERSIONS['exif'], image_path)
+    if cached is not None:
+        return cached, {'total_fields_extracted': len(cached)}
 
     try:
-        with Image.open(image_path) as img:
-            exif_data['Image_Info'] = {
-                'format': img.format, 
-                'mode': img.mode, 
-                'size': list(img.size)
-            }
-            
-            exif_dict = img._getexif()
-            if exif_dict:
-                # Map standard tags
-                for tag_id, value in exif_dict.items():
-                    tag = ExifTags.TAGS.get(tag_id, f"Tag_{tag_id}")
-                    try:
-                        if isinstance(value, bytes):
-                            exif_data[f'PIL_{tag}'] = value.decode('utf-8', errors='replace')
-                        else:
-                            exif_data[f'PIL_{tag}'] = str(value)
-                    except Exception:
-                        pass
-
-                # Extract GPS block
-                gps_info = exif_dict.get(34853)  # GPS IFD
-                if gps_info:
-                    gps_lat = gps_info.get(2)
-                    gps_lat_ref = gps_info.get(1, 'N')
-                    gps_lon = gps_info.get(4)
-                    gps_lon_ref = gps_info.get(3, 'E')
-
-                    debug(f"EXIF GPS for {os.path.basename(image_path)}: lat={gps_lat} {gps_lat_ref}, lon={gps_lon} {gps_lon_ref}")
-
-                    lat_dec = _dms_to_decimal(gps_lat, gps_lat_ref) if gps_lat else None
-                    lon_dec = _dms_to_decimal(gps_lon, gps_lon_ref) if gps_lon else None
-
-                    if lat_dec is not None and lon_dec is not None:
-                        exif_data['GPS_Latitude'] = lat_dec
-                        exif_data['GPS_Longitude'] = lon_dec
-                        exif_data['GPS_Source'] = 'EXIF'
-                        debug(f"✓ Extracted EXIF GPS: {lat_dec:.6f}, {lon_dec:.6f}")
-                    else:
-                        debug("✗ EXIF GPS present but could not decode")
-                else:
-                    debug(f"✗ No GPS block in EXIF for {os.path.basename(image_path)}")
-            else:
-                debug(f"✗ No EXIF found for {os.path.basename(image_path)}")
-    except Exception as e:
-        debug(f"EXIF extraction error: {e}")
+        exif_data = _extract_exif_fast(image_path)
+    except ExifParseError as e:
+        debug(f"Fast EXIF path unavailable for {os.path.basename(image_path)} ({e}), using PIL")
+        if not has_capability('pil'):
+            debug("PIL not available for EXIF extraction")
+            return {}, {"error": "PIL not available"}
+        try:
+            exif_data = _extract_exif_pil(image_path)
+        except Exception as e:
+            debug(f"EXIF extraction error: {e}")
+            return exif_data, {'total_fields_extracted': len(exif_data)}
 
+    cache.put('exif', ANALYZER_VERSIONS['exif'], image_path, exif_data)
     return exif_data, {'total_fields_extracted': len(exif_data)}
 
 # -----------------------------------------------------------------------------
@@ -200,50 +237,6 @@ def analyze_coordinate_consistency(exif_coords, claimed_coords, tolerance_m=EXIF
             'error': f'Error analyzing coordinates: {str(e)}'
         }
 
-# -----------------------------------------------------------------------------
-# Weather API
-# -----------------------------------------------------------------------------
-
-def fetch_real_weather_data(lat, lon, date_iso):
-    """Fetch weather data from Open-Meteo API"""
-    try:
-        debug(f"Fetching weather for {lat:.4f}, {lon:.4f} on {date_iso}")
-        base_url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            'latitude': lat,
-            'longitude': lon,
-            'start_date': date_iso,
-            'end_date': date_iso,
-            'daily': 'temperature_2m_max,temperature_2m_min,precipitation_sum,relative_humidity_2m_mean',
-            'timezone': 'auto'
-        }
-        url = f"{base_url}?{urllib.parse.urlencode(params)}"
-        
-        with urllib.request.urlopen(url, timeout=10) as response:
-            if response.getcode() == 200:
-                data = json.loads(response.read().decode('utf-8'))
-                if 'daily' in data:
-                    daily = data['daily']
-                    debug("✓ Weather data fetched successfully")
-                    return {
-                        'api_success': True,
-                        'source': 'open_meteo',
-                        'processed_data': {
-                            'temperature_min': daily.get('temperature_2m_min', [None])[0],
-                            'temperature_max': daily.get('temperature_2m_max', [None])[0],
-                            'precipitation_mm': daily.get('precipitation_sum', [None])[0] or 0,
-                            'humidity_percent': daily.get('relative_humidity_2m_mean', [None])[0]
-                        }
-                    }
-    except Exception as e:
-        debug(f"✗ Weather API error: {e}")
-    
-    return {
-        'api_success': False, 
-        'error': 'Weather data unavailable', 
-        'source': 'open_meteo'
-    }
-
 # -----------------------------------------------------------------------------
 # Geofencing
 # -----------------------------------------------------------------------------
@@ -276,35 +269,24 @@ def _ensure_geojson_boundary(geojson_path, center_lat, center_lon, boundary_size
         json.dump(test_parcel, f)
     debug(f"Created boundary at {geojson_path} centered on {center_lat:.6f},{center_lon:.6f}")
 
-def _point_in_polygon_and_distance(lat, lon, polygon_coords):
-    """Check if point is inside polygon and calculate distance to boundary"""
-    if SHAPELY_AVAILABLE:
-        poly = geom_shape({"type": "Polygon", "coordinates": [polygon_coords]})
-        pt = Point(lon, lat)
-        inside = poly.contains(pt) or poly.touches(pt)
+def _point_in_parcel_and_distance(lat, lon, parcel_index, parcel):
+    """Check if point is inside the parcel and calculate distance to its boundary"""
+    if has_capability('shapely'):
+        geom = parcel_index.geometry(parcel)
+        pt = shapely_geometry.Point(lon, lat)
+        inside = geom.prepared.contains(pt) or geom.prepared.touches(pt)
         if inside:
             return True, 0.0
-        nearest = nearest_points(poly.boundary, pt)[0]
-        d_m = haversine_m(lat, lon, nearest.y, nearest.x)
-        return False, d_m
+        # Metric distance in the parcel's cached local frame rather than in degrees
+        dist, _, _ = geodesy.distance_to_boundary([lat], [lon], parcel.ring)
+        return False, float(dist[0])
     else:
-        # Fallback: bounding box
-        lats = [c[1] for c in polygon_coords]
-        lons = [c[0] for c in polygon_coords]
-        min_lat, max_lat = min(lats), max(lats)
-        min_lon, max_lon = min(lons), max(lons)
+        # Exact ray casting and edge distance in NumPy
+        inside, dist = geodesy.validate_points([lat], [lon], parcel.ring)
+        return bool(inside[0]), float(dist[0])
 
-        inside = (min_lat <= lat <= max_lat) and (min_lon <= lon <= max_lon)
-        if inside:
-            return True, 0.0
-
-        clamped_lat = min(max(lat, min_lat), max_lat)
-        clamped_lon = min(max(lon, min_lon), max_lon)
-        d_m = haversine_m(lat, lon, clamped_lat, clamped_lon)
-        return False, d_m
-
-def perform_geofencing_analysis(lat, lon, geojson_path, fallback_center=None):
-    """Analyze if coordinates are within parcel boundaries"""
+def perform_geofencing_analysis(lat, lon, geojson_path, fallback_center=None, parcel_id=None):
+    """Analyze if coordinates are within the claimed parcel's boundary"""
     try:
         if not os.path.exists(geojson_path):
             if fallback_center:
@@ -312,23 +294,46 @@ def perform_geofencing_analysis(lat, lon, geojson_path, fallback_center=None):
             else:
                 _ensure_geojson_boundary(geojson_path, lat, lon)
 
-        with open(geojson_path, 'r') as f:
-            geojson_data = json.load(f)
-
-        for feature in geojson_data.get('features', []):
-            coords = feature['geometry']['coordinates'][0]
-            inside, dist_m = _point_in_polygon_and_distance(lat, lon, coords)
-            
-            status = "✓ INSIDE" if inside else f"✗ OUTSIDE ({dist_m:.1f}m away)"
-            debug(f"Geofencing: {status} boundary")
-            
-            return {
-                'geofencing_available': True,
-                'point_inside_boundary': bool(inside),
-                'closest_boundary_distance': round(float(dist_m), 2)
-            }
+        # Parsed once per process and shared across corner images and claims
+        parcel_index = open_parcel_index(geojson_path)
+        parcel = parcel_index.get(parcel_id) if parcel_id is not None else None
+        parcel_id_matched = parcel is not None
+        if parcel is None:
+            # In a cadastre an unknown id must not be checked against whichever parcel comes first
+            if parcel_id is not None and len(parcel_index) > 1:
+                debug(f"Geofencing: parcel {parcel_id} not in cadastre")
+                return {'geofencing_available': False, 'error': f'Parcel {parcel_id} not found in GeoJSON'}
+            # A single-parcel file is the claim's own boundary whatever its id
+            parcel = parcel_index.first()
+            if parcel is None:
+                return {'geofencing_available': False, 'error': 'No features in GeoJSON'}
+
+        inside, dist_m = _point_in_parcel_and_distance(lat, lon, parcel_index, parcel)
+        
+        status = "✓ INSIDE" if inside else f"✗ OUTSIDE ({dist_m:.1f}m away)"
+        debug(f"Geofencing: {status} boundary of parcel {parcel.parcel_id}")
+        
+        result = {
+            'geofencing_available': True,
+            'point_inside_boundary': bool(inside),
+            'closest_boundary_distance': round(float(dist_m), 2),
+            'parcel_id': parcel.parcel_id,
+            'parcel_id_matched': parcel_id_matched
+        }
 
-        return {'geofencing_available': False, 'error': 'No features in GeoJSON'}
+        # A photo outside the claimed parcel but inside another one was taken on a neighbour's field
+        if not inside and len(parcel_index) > 1:
+            others = [p for p in parcel_index.containing(lat, lon) if p.index != parcel.index]
+            if others:
+                result['neighbour_parcel_id'] = others[0].parcel_id
+                debug(f"Geofencing: point lies inside neighbouring parcel {others[0].parcel_id}")
+            else:
+                # Between parcels: name the closest one when it is not the claimed parcel
+                nearest, nearest_m = parcel_index.nearest(lat, lon)
+                if nearest is not None and nearest.index != parcel.index:
+                    result['nearest_parcel_id'] = nearest.parcel_id
+                    result['nearest_parcel_distance'] = round(nearest_m, 2)
+        return result
     except Exception as e:
         debug(f"Geofencing error: {e}")
         return {'geofencing_available': False, 'error': str(e)}
@@ -337,50 +342,94 @@ def perform_geofencing_analysis(lat, lon, geojson_path, fallback_center=None):
 # Damage classification
 # -----------------------------------------------------------------------------
 
+def analysis_reduction(declared):
+    """Decode reduction for an analyzer that tolerates `declared`, capped by IMAGE_ANALYSIS_REDUCTION"""
+    factor = max(1, min(declared, ANALYSIS_REDUCTION))
+    return max(r for r in ANALYSIS_REDUCTIONS if r <= factor)
+
+def decode_rgb(image_path, reduction=1):
+    """
+    Decode an image as RGB at roughly 1/reduction scale. JPEGs are scaled in
+    the DCT domain by draft(), so the full-size raster is never built; other
+    formats ignore the hint and decode at full size.
+    """
+    with Image.open(image_path) as img:
+        if reduction > 1:
+            img.draft('RGB', (max(1, img.width // reduction), max(1, img.height // reduction)))
+        return img.convert('RGB')
+
 class CropDamageClassifier:
+    # Channel means and a global std barely move at 1/8 scale
+    ANALYSIS_REDUCTION = 8
+
     def __init__(self):
         self.damage_classes = ['DR', 'G', 'ND', 'WD', 'other']
-        self.use_torch = TORCH_AVAILABLE
+        self.use_torch = has_capability('torch')
         debug(f"Damage classifier initialized (PyTorch: {self.use_torch})")
 
     def predict_damage(self, image_path):
         """Predict crop damage from image"""
         try:
-            if not PIL_AVAILABLE or np is None:
+            if not has_capability('pil') or not has_capability('numpy'):
                 debug("Using fallback damage prediction (PIL/NumPy unavailable)")
                 return self._fallback_prediction()
+
+            # The decode scale is part of the key, so changing it never serves stale results
+            reduction = analysis_reduction(self.ANALYSIS_REDUCTION)
+            stage = 'damage' if reduction == 1 else f'damage@1/{reduction}'
+            cache = result_cache()
+            cached = cache.get(stage, ANALYZER_VERSIONS['damage'], image_path)
+            if cached is not None:
+                debug(f"Damage analysis (cached): {cached['damage_percentage']:.1f}% ({cached['primary_damage_type']})")
+                return cached
             
-            img = Image.open(image_path).convert('RGB')
-            damage_probs = self._heuristic_damage_detection(img)
-            damage_scores = {
-                self.damage_classes[i]: float(damage_probs[i]) 
-                for i in range(len(self.damage_classes))
-            }
-            
-            primary_damage = max(damage_scores.items(), key=lambda x: x[1])
-            damage_percent = self._calculate_damage_percentage(damage_scores)
-            
-            debug(f"Damage analysis: {damage_percent:.1f}% ({primary_damage[0]})")
-            
-            return {
-                'damage_scores': damage_scores,
-                'primary_damage_type': primary_damage[0],
-                'confidence': primary_damage[1],
-                'damage_percentage': damage_percent,
-                'severity': self._categorize_severity(damage_percent),
-                'is_genuine_damage': primary_damage[0] != 'ND' and primary_damage[1] > 0.4
-            }
+            result = self.analyze(image_path, reduction)
+            debug(f"Damage analysis: {result['damage_percentage']:.1f}% ({result['primary_damage_type']})")
+            cache.put(stage, ANALYZER_VERSIONS['damage'], image_path, result)
+            return result
         except Exception as e:
             debug(f"Damage prediction error: {e}")
             return self._fallback_prediction()
 
-    def _heuristic_damage_detection(self, img):
+    def analyze(self, image_path, reduction=1):
+        """Uncached damage prediction from a decode at 1/reduction scale"""
+        damage_probs = self._heuristic_damage_detection(self.colour_stats(decode_rgb(image_path, reduction)))
+        damage_scores = {
+            self.damage_classes[i]: float(damage_probs[i]) 
+            for i in range(len(self.damage_classes))
+        }
+        primary_damage = max(damage_scores.items(), key=lambda x: x[1])
+        damage_percent = self._calculate_damage_percentage(damage_scores)
+        return {
+            'damage_scores': damage_scores,
+            'primary_damage_type': primary_damage[0],
+            'confidence': primary_damage[1],
+            'damage_percentage': damage_percent,
+            'severity': self._categorize_severity(damage_percent),
+            'is_genuine_damage': primary_damage[0] != 'ND' and primary_damage[1] > 0.4
+        }
+
+    @staticmethod
+    def colour_stats(img):
+        """Per-channel means and the global standard deviation of an RGB image"""
+        if img.width * img.height > TILED_MIN_PIXELS:
+            # Streamed in row bands so a 48 MP frame never needs image-sized float64 temporaries
+            stats = streamed_channel_stats(img)
+            mean_red, mean_green, mean_blue = (float(m) for m in stats.mean)
+            return {'mean_red': mean_red, 'mean_green': mean_green, 'mean_blue': mean_blue,
+                    'std_color': float(stats.pooled().std[0])}
+        img_array = np.asarray(img)
+        return {
+            'mean_red': float(np.mean(img_array[:, :, 0])),
+            'mean_green': float(np.mean(img_array[:, :, 1])),
+            'mean_blue': float(np.mean(img_array[:, :, 2])),
+            'std_color': float(np.std(img_array)),
+        }
+
+    def _heuristic_damage_detection(self, stats):
         """Heuristic-based damage detection using color analysis"""
-        img_array = np.array(img)
-        mean_green = np.mean(img_array[:, :, 1])
-        mean_red = np.mean(img_array[:, :, 0])
-        mean_blue = np.mean(img_array[:, :, 2])
-        std_color = np.std(img_array)
+        mean_green, mean_red = stats['mean_green'], stats['mean_red']
+        mean_blue, std_color = stats['mean_blue'], stats['std_color']
         health_score = mean_green / (mean_red + mean_blue + 1)
         
         if mean_green < 80 and std_color < 40:
@@ -422,12 +471,22 @@ class CropDamageClassifier:
             'is_genuine_damage': True
         }
 
+_damage_classifier = None
+
+def get_damage_classifier():
+    """Return the process-wide classifier, constructing it on first use"""
+    global _damage_classifier
+    if _damage_classifier is None:
+        _damage_classifier = CropDamageClassifier()
+    return _damage_classifier
+
 # -----------------------------------------------------------------------------
 # Fraud detection
 # -----------------------------------------------------------------------------
 
 class FraudDetectionEngine:
-    def analyze_fraud_patterns(self, all_exif_data, all_coord_analyses, damage_analysis, weather_data):
+    def analyze_fraud_patterns(self, all_exif_data, all_coord_analyses, damage_analysis, weather_data,
+                               auth_results=None):
         """Analyze fraud patterns across all images"""
         red_flags = []
         
@@ -453,6 +512,17 @@ class FraudDetectionEngine:
                         'confidence': 0.9
                     })
         
+        # Check for photos taken inside a neighbouring parcel
+        for idx, auth_result in enumerate(auth_results or []):
+            neighbour = auth_result.get('neighbour_parcel_id')
+            if neighbour is not None:
+                red_flags.append({
+                    'category': 'location',
+                    'severity': 'high',
+                    'detail': f'Image {idx+1}: taken inside neighbouring parcel {neighbour}',
+                    'confidence': 0.85
+                })
+        
         # Check for image editing software
         for idx, exif_data in enumerate(all_exif_data):
             if exif_data:
@@ -485,13 +555,110 @@ class FraudDetectionEngine:
             'investigation_required': len(red_flags) > 0
         }
 
+# -----------------------------------------------------------------------------
+# Per-image stages
+# -----------------------------------------------------------------------------
+
+_image_executor = None
+
+def _warm_worker_process():
+    """Warm a pool process once so claims don't pay for it"""
+    get_damage_classifier()
+
+def get_image_executor():
+    """Return the process-wide executor for per-image stages"""
+    global _image_executor
+    if _image_executor is None:
+        if IMAGE_EXECUTOR_KIND == 'process':
+            _image_executor = ProcessPoolExecutor(max_workers=IMAGE_EXECUTOR_WORKERS,
+                                                  initializer=_warm_worker_process)
+        else:
+            _image_executor = ThreadPoolExecutor(max_workers=IMAGE_EXECUTOR_WORKERS,
+                                                 thread_name_prefix='image-stage')
+        debug(f"Image executor: {IMAGE_EXECUTOR_KIND} x{IMAGE_EXECUTOR_WORKERS}")
+    return _image_executor
+
+def analyze_corner_image(idx, img_path, lat, lon, geojson_path, center, parcel_id=None):
+    """EXIF, coordinate check and geofencing for one corner image"""
+    debug(f"\nProcessing corner image {idx+1}/4: {os.path.basename(img_path)}")
+
+    exif_data, _meta = extract_comprehensive_exif(img_path)
+    coord_analysis = analyze_coordinate_consistency(exif_data, {'lat': lat, 'lon': lon})
+
+    # Determine coordinates for geofencing
+    if coord_analysis.get('coordinates_available') and coord_analysis.get('coordinates_match'):
+        gf_lat = coord_analysis['exif_coordinates']['lat']
+        gf_lon = coord_analysis['exif_coordinates']['lon']
+        debug("Using EXIF coordinates for geofencing")
+    else:
+        gf_lat, gf_lon = (lat, lon)
+        debug("Using claimed coordinates for geofencing")
+
+    geo_result = perform_geofencing_analysis(gf_lat, gf_lon, geojson_path, fallback_center=center,
+                                             parcel_id=parcel_id)
+
+    auth_result = {
+        'image_index': idx + 1,
+        'image_path': os.path.basename(img_path),
+        'exif_available': bool(exif_data),
+        'gps_verified': coord_analysis.get('coordinates_available', False) and coord_analysis.get('coordinates_match', False),
+        'within_boundary': geo_result.get('point_inside_boundary', False),
+        'distance_to_boundary_m': geo_result.get('closest_boundary_distance'),
+        'exif_vs_claimed_distance_m': coord_analysis.get('distance_meters'),
+        'exif_match_level': coord_analysis.get('match_level', 'unknown')
+    }
+    for key in ('neighbour_parcel_id', 'nearest_parcel_id', 'nearest_parcel_distance'):
+        if geo_result.get(key) is not None:
+            auth_result[key] = geo_result[key]
+    return exif_data, coord_analysis, auth_result
+
+def assess_damage_image(damage_image_path):
+    """AI damage assessment for the damage image"""
+    debug(f"Analyzing damage image: {os.path.basename(damage_image_path)}")
+    return get_damage_classifier().predict_damage(damage_image_path)
+
+EXIF_DATE_TAGS = ('DateTimeOriginal', 'DateTimeDigitized', 'DateTime')
+
+def image_capture_date(image_path):
+    """Capture date (date_iso) from a JPEG's EXIF header, or None if it has no usable date"""
+    try:
+        tags = read_exif_header(image_path)['tags']
+    except ExifParseError:
+        return None
+    today = datetime.now().date()
+    for tag in EXIF_DATE_TAGS:
+        try:
+            day = datetime.strptime(str(tags.get(tag, ''))[:10], '%Y:%m:%d').date()
+        except ValueError:
+            continue
+        # A camera clock set in the future says nothing about the capture date
+        if day <= today:
+            return day.isoformat()
+    return None
+
+def claim_weather_point(coordinates, image_paths=(), damage_image_path=None, capture_date=None):
+    """
+    (lat, lon, date_iso) a claim's weather is looked up for: the first corner's
+    claimed location on the capture date. The date is `capture_date` when the
+    request gives one, else the damage photo's EXIF date, else the corner
+    photos', and today only when none of them has one.
+    """
+    lat, lon = coordinates[0]
+    if capture_date:
+        return lat, lon, str(capture_date)[:10]
+    for path in [damage_image_path, *image_paths]:
+        day = image_capture_date(path) if path else None
+        if day:
+            return lat, lon, day
+    return lat, lon, datetime.now().strftime("%Y-%m-%d")
+
 # -----------------------------------------------------------------------------
 # Main batch processing function
 # -----------------------------------------------------------------------------
 
 def process_claim_comprehensive(image_paths, coordinates, damage_image_path,
                                 farmer_claimed_damage, sum_insured, geojson_path,
-                                parcel_id, claim_id=None):
+                                parcel_id, claim_id=None, capture_date=None):
     """
     Process complete claim with 4 corner images + 1 damage image
     Returns comprehensive analysis with decision recommendation
@@ -505,68 +672,48 @@ def process_claim_comprehensive(image_paths, coordinates, damage_image_path,
     debug(f"Parcel ID: {parcel_id}")
     debug("="*60)
 
-    damage_classifier = CropDamageClassifier()
     fraud_detector = FraudDetectionEngine()
+    executor = get_image_executor()
 
-    # Phase 1: Process authentication images (4 corners)
+    # Weather for the first corner's claimed location on the capture date runs
+    # in the background and is only joined at scoring time
+    center_lat, center_lon, date_iso = claim_weather_point(coordinates, image_paths, damage_image_path, capture_date)
+    weather_lookup = start_weather_lookup(center_lat, center_lon, date_iso)
+
+    # Phase 1 + 2: all five images are analysed concurrently; results are
+    # collected in submission order so the output is unchanged
     debug("\n[PHASE 1] Authentication image verification...")
+    if not os.path.exists(geojson_path):
+        _ensure_geojson_boundary(geojson_path, center_lat, center_lon)
+
+    corner_futures = [
+        executor.submit(analyze_corner_image, idx, img_path, lat, lon,
+                        geojson_path, (center_lat, center_lon), parcel_id)
+        for idx, (img_path, (lat, lon)) in enumerate(zip(image_paths, coordinates))
+    ]
+    debug("\n[PHASE 2] AI damage assessment...")
+    damage_future = executor.submit(assess_damage_image, damage_image_path)
+
     auth_results = []
     all_exif_data = []
     all_coord_analyses = []
-    weather_data = {}
-
-    center_lat, center_lon = coordinates[0]
-
-    for idx, (img_path, (lat, lon)) in enumerate(zip(image_paths, coordinates)):
-        debug(f"\nProcessing corner image {idx+1}/4: {os.path.basename(img_path)}")
-        
-        exif_data, _meta = extract_comprehensive_exif(img_path)
+    for future in corner_futures:
+        exif_data, coord_analysis, auth_result = future.result()
         all_exif_data.append(exif_data)
-        
-        coord_analysis = analyze_coordinate_consistency(exif_data, {'lat': lat, 'lon': lon})
         all_coord_analyses.append(coord_analysis)
-        
-        # Fetch weather only once
-        if idx == 0:
-            date_iso = datetime.now().strftime("%Y-%m-%d")
-            weather_data = fetch_real_weather_data(lat, lon, date_iso)
-        
-        # Determine coordinates for geofencing
-        if coord_analysis.get('coordinates_available') and coord_analysis.get('coordinates_match'):
-            gf_lat = coord_analysis['exif_coordinates']['lat']
-            gf_lon = coord_analysis['exif_coordinates']['lon']
-            debug("Using EXIF coordinates for geofencing")
-        else:
-            gf_lat, gf_lon = (lat, lon)
-            debug("Using claimed coordinates for geofencing")
-        
-        geo_result = perform_geofencing_analysis(
-            gf_lat, gf_lon, geojson_path, 
-            fallback_center=(center_lat, center_lon)
-        )
-        
-        auth_results.append({
-            'image_index': idx + 1,
-            'image_path': os.path.basename(img_path),
-            'exif_available': bool(exif_data),
-            'gps_verified': coord_analysis.get('coordinates_available', False) and coord_analysis.get('coordinates_match', False),
-            'within_boundary': geo_result.get('point_inside_boundary', False),
-            'distance_to_boundary_m': geo_result.get('closest_boundary_distance'),
-            'exif_vs_claimed_distance_m': coord_analysis.get('distance_meters'),
-            'exif_match_level': coord_analysis.get('match_level', 'unknown')
-        })
-
-    # Phase 2: Damage assessment
-    debug("\n[PHASE 2] AI damage assessment...")
-    debug(f"Analyzing damage image: {os.path.basename(damage_image_path)}")
-    damage_result = damage_classifier.predict_damage(damage_image_path)
+        auth_results.append(auth_result)
+
+    damage_result = damage_future.result()
+
+    # The weather lookup is joined only now that all image work is done;
+    # past its deadline the claim continues without weather data
+    weather_data = weather_lookup.result(default=weather_unavailable('Weather lookup deadline exceeded'))
 
     # Phase 3: Fraud analysis
     debug("\n[PHASE 3] Fraud pattern analysis...")
     fraud_analysis = fraud_detector.analyze_fraud_patterns(
-        all_exif_data, all_coord_analyses, damage_result, weather_data
+        all_exif_data, all_coord_analyses, damage_result, weather_data, auth_results
     )
-
     # Phase 4: Scoring and decision
     debug("\n[PHASE 4] Scoring and decision making...")
     
@@ -658,6 +805,8 @@ def process_claim_comprehensive(image_paths, coordinates, damage_image_path,
             'location_verified': all(r['within_boundary'] for r in auth_results),
             'damage_verified': damage_result.get('is_genuine_damage', False),
             'weather_supports_claim': weather_data.get('api_success', False),
+            'weather_date': date_iso,
+            'weather_window': weather_data.get('window'),
             'authentication_images_summary': auth_results
         },
 
@@ -698,12 +847,465 @@ def process_claim_comprehensive(image_paths, coordinates, damage_image_path,
     if decision == 'REJECT':
         output['rejection_reasons'] = fraud_analysis['fraud_indicators']
 
+    cache_stats = result_cache().stats()
+    if cache_stats.get('enabled'):
+        debug(f"Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses (process total)")
+    weather_stats = weather_cache().stats()
+    if weather_stats.get('enabled'):
+        debug(f"Weather cache: {weather_stats['hits']} hits, {weather_stats['misses']} misses (process total)")
+
     return output
 
+# -----------------------------------------------------------------------------
+# Request parsing
+# -----------------------------------------------------------------------------
+
+USAGE = ('python pipeline.py <img1> <lat1> <lon1> <img2> <lat2> <lon2> '
+         '<img3> <lat3> <lon3> <img4> <lat4> <lon4> <damage_img> '
+         '<farmer_damage%> <sum_insured> <geojson_path> <parcel_id> [TRUST_CLAIMED_COORDS]')
+
+def parse_claim_args(args):
+    """Turn the positional CLI arguments into process_claim_comprehensive kwargs"""
+    return {
+        'image_paths': [args[0], args[3], args[6], args[9]],
+        'coordinates': [
+            (float(args[1]), float(args[2])),   # Corner 1
+            (float(args[4]), float(args[5])),   # Corner 2
+            (float(args[7]), float(args[8])),   # Corner 3
+            (float(args[10]), float(args[11]))  # Corner 4
+        ],
+        'damage_image_path': args[12],
+        'farmer_claimed_damage': float(args[13]),
+        'sum_insured': float(args[14]),
+        'geojson_path': args[15],
+        'parcel_id': args[16] if len(args) > 16 else 'PARCEL_001'
+    }
+
+def parse_claim_request(request):
+    """
+    Turn one JSON claim request into process_claim_comprehensive kwargs
+
+    Accepts either {"args": [<the 17 CLI arguments>]} or the structured form:
+    {"images": [{"path", "lat", "lon"} x4], "damage_image", "farmer_damage",
+     "sum_insured", "geojson_path", "parcel_id", "claim_id"}
+    Either form may add "capture_date" (YYYY-MM-DD) to override the EXIF date
+    used for the weather lookup.
+    """
+    if 'args' in request:
+        args = [str(a) for a in request['args']]
+        if len(args) < 16:
+            raise ValueError(f"'args' needs at least 16 values, got {len(args)}")
+        kwargs = parse_claim_args(args)
+    else:
+        images = request['images']
+        if len(images) != 4:
+            raise ValueError(f"Expected 4 corner images, got {len(images)}")
+        kwargs = {
+            'image_paths': [img['path'] for img in images],
+            'coordinates': [(float(img['lat']), float(img['lon'])) for img in images],
+            'damage_image_path': request['damage_image'],
+            'farmer_claimed_damage': float(request.get('farmer_damage', 50.0)),
+            'sum_insured': float(request.get('sum_insured', 100000)),
+            'geojson_path': request['geojson_path'],
+            'parcel_id': request.get('parcel_id', 'PARCEL_001')
+        }
+    if request.get('claim_id'):
+        kwargs['claim_id'] = request['claim_id']
+    if request.get('capture_date'):
+        kwargs['capture_date'] = str(request['capture_date'])[:10]
+    return kwargs
+
+def find_missing_file(claim_kwargs):
+    """Return the first input image that does not exist, or None"""
+    for file_path in claim_kwargs['image_paths'] + [claim_kwargs['damage_image_path']]:
+        if not os.path.exists(file_path):
+            return file_path
+    return None
+
+# -----------------------------------------------------------------------------
+# Persistent worker mode
+# -----------------------------------------------------------------------------
+
+def worker_stats():
+    """Caches and external HTTP clients of this long-lived worker"""
+    return {
+        'result_cache': result_cache().stats(),
+        'weather_cache': weather_cache().stats(),
+        'weather_providers': weather_provider_stats(),
+        'http': http_stats(),
+        'timestamp': datetime.now().isoformat()
+    }
+
+def handle_claim_request(line):
+    """Process one JSON request line and return the JSON-serialisable response"""
+    request_id = None
+    try:
+        request = json.loads(line)
+        request_id = request.get('request_id')
+        if request.get('stats'):
+            response = worker_stats()
+            if request_id is not None:
+                response['request_id'] = request_id
+            return response
+        claim_kwargs = parse_claim_request(request)
+        missing = find_missing_file(claim_kwargs)
+        if missing:
+            response = {
+                'error': 'File not found',
+                'missing_file': missing,
+                'timestamp': datetime.now().isoformat()
+            }
+        else:
+            response = process_claim_comprehensive(**claim_kwargs)
+    except (ValueError, KeyError, TypeError) as e:
+        response = {
+            'error': 'Invalid request format',
+            'details': str(e),
+            'type': type(e).__name__,
+            'timestamp': datetime.now().isoformat()
+        }
+    except Exception as e:
+        response = {
+            'error': 'Processing failed',
+            'details': str(e),
+            'type': type(e).__name__,
+            'timestamp': datetime.now().isoformat()
+        }
+    if request_id is not None:
+        response['request_id'] = request_id
+    return response
+
+def serve_stream(stream_in, stream_out):
+    """Answer JSON-lines claim requests until the input stream closes"""
+    for line in stream_in:
+        if not line.strip():
+            continue
+        stream_out.write(json.dumps(handle_claim_request(line)) + '\n')
+        stream_out.flush()
+
+class _ClaimRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        serve_stream(io.TextIOWrapper(self.rfile, encoding='utf-8'),
+                     io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True))
+
+class ClaimSocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve_socket(socket_path):
+    """Answer JSON-lines claim requests on a local Unix socket"""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with ClaimSocketServer(socket_path, _ClaimRequestHandler) as server:
+        debug(f"Worker listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+def serve(socket_path=None):
+    """
+    Long-lived worker: load everything once, then handle one claim per request line
+
+    Each request is a JSON object on its own line (see parse_claim_request); an
+    optional "request_id" is echoed back. Each response is one JSON line.
+    {"stats": true} returns cache and HTTP client statistics (latency
+    histograms, retries, pooled connections) instead of processing a claim.
+    """
+    get_damage_classifier()
+    if socket_path:
+        serve_socket(socket_path)
+    else:
+        debug("Worker ready, reading claim requests from stdin")
+        serve_stream(sys.stdin, sys.stdout)
+
+# -----------------------------------------------------------------------------
+# Batch mode
+# -----------------------------------------------------------------------------
+
+BATCH_MAX_IN_FLIGHT_PER_WORKER = 4
+
+def _run_manifest_claim(line_no, request):
+    """Process one manifest entry inside a pool process; never raises"""
+    start = time.perf_counter()
+    record = {'manifest_line': line_no, 'request_id': request.get('request_id')}
+    try:
+        claim_kwargs = parse_claim_request(request)
+        missing = find_missing_file(claim_kwargs)
+        if missing:
+            raise FileNotFoundError(f"Image not found: {missing}")
+        result = process_claim_comprehensive(**claim_kwargs)
+        record.update({'status': 'ok', 'claim_id': result['claim_id'], 'result': result})
+    except Exception as e:
+        record.update({'status': 'error', 'claim_id': request.get('claim_id'),
+                       'error': str(e), 'type': type(e).__name__})
+    record['latency_ms'] = round((time.perf_counter() - start) * 1000.0, 2)
+    return record
+
+def _read_manifest(manifest_path):
+    """Yield (line_no, request, parse_error) for each non-blank manifest line"""
+    with open(manifest_path, 'r') as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('manifest entry must be a JSON object')
+                yield line_no, request, None
+            except ValueError as e:
+                yield line_no, None, e
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def batch_summary(latencies_ms, succeeded, failed, elapsed_s):
+    """Throughput over every entry; latency percentiles over the claims that ran"""
+    latencies_ms = sorted(latencies_ms)
+    total = succeeded + failed
+    return {
+        'claims_total': total,
+        'claims_succeeded': succeeded,
+        'claims_failed': failed,
+        'elapsed_s': round(elapsed_s, 2),
+        'throughput_claims_per_s': round(total / elapsed_s, 2) if elapsed_s > 0 else None,
+        'latency_ms': {
+            'p50': _percentile(latencies_ms, 50),
+            'p90': _percentile(latencies_ms, 90),
+            'p95': _percentile(latencies_ms, 95),
+            'p99': _percentile(latencies_ms, 99),
+            'max': latencies_ms[-1] if latencies_ms else None
+        }
+    }
+
+def _manifest_weather_points(manifest_path):
+    """Yield the weather lookup point of every valid manifest claim"""
+    for _, request, parse_error in _read_manifest(manifest_path):
+        if parse_error is not None:
+            continue
+        try:
+            kwargs = parse_claim_request(request)
+            yield claim_weather_point(kwargs['coordinates'], kwargs['image_paths'],
+                                      kwargs['damage_image_path'], kwargs.get('capture_date'))
+        except (KeyError, TypeError, ValueError):
+            continue   # reported when the claim itself runs
+
+def run_batch(manifest_path, output_path, workers=None, prefetch=True):
+    """
+    Process every claim in a JSONL manifest on a process pool
+
+    Each manifest line is a claim request (see parse_claim_request). Results are
+    appended to output_path in completion order, one JSON line per claim, and a
+    failing claim is recorded with its error instead of aborting the batch.
+    With `prefetch`, weather for the whole manifest is fetched into the shared
+    weather cache before any claim starts.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * BATCH_MAX_IN_FLIGHT_PER_WORKER
+    latencies, succeeded, failed = [], 0, 0
+    start = time.perf_counter()
+    prefetch_summary = prefetch_weather(_manifest_weather_points(manifest_path)) if prefetch else None
+
+    def record_result(out, record):
+        nonlocal succeeded, failed
+        if record['status'] == 'ok':
+            succeeded += 1
+        else:
+            failed += 1
+        # Entries that never ran (bad manifest lines, claims lost to a dead pool) have no latency
+        if record['latency_ms'] is not None:
+            latencies.append(record['latency_ms'])
+        out.write(json.dumps(record) + '\n')
+        out.flush()
+
+    def new_pool(max_workers):
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=_warm_worker_process)
+
+    def error_record(line_no, request, e):
+        return {'manifest_line': line_no, 'request_id': request.get('request_id'),
+                'claim_id': request.get('claim_id'), 'status': 'error',
+                'error': str(e) or type(e).__name__, 'type': type(e).__name__, 'latency_ms': None}
+
+    with open(output_path, 'w') as out:
+        pool = new_pool(workers)
+        pending = {}
+
+        def collect(futures, crashed):
+            """Record finished claims; those lost to a dead pool process go to `crashed`"""
+            for future in futures:
+                line_no, request = pending.pop(future)
+                try:
+                    record = future.result()
+                except BrokenProcessPool:
+                    crashed.append((line_no, request))
+                    continue
+                except Exception as e:
+                    record = error_record(line_no, request, e)
+                record_result(out, record)
+
+        def run_isolated(suspects):
+            """
+            Rerun claims caught in a pool crash one at a time in a fresh process,
+            so only a claim that kills its process on its own is charged with it
+            """
+            for line_no, request in sorted(suspects, key=lambda suspect: suspect[0]):
+                with new_pool(1) as solo:
+                    try:
+                        record = solo.submit(_run_manifest_claim, line_no, request).result()
+                    except Exception as e:
+                        record = error_record(line_no, request, e)
+                record_result(out, record)
+
+        def recover(crashed):
+            """A pool process died: every claim in flight fails with it, so settle them all and rebuild the pool"""
+            nonlocal pool
+            debug(f"Batch pool broken; rerunning {len(pending) + len(crashed)} in-flight claims one at a time")
+            collect(list(wait(pending)[0]), crashed)
+            pool.shutdown(wait=True)
+            run_isolated(crashed)
+            pool = new_pool(workers)
+
+        def drain(return_when):
+            crashed = []
+            collect(wait(pending, return_when=return_when)[0], crashed)
+            if crashed:
+                recover(crashed)
+
+        try:
+            for line_no, request, parse_error in _read_manifest(manifest_path):
+                if parse_error is not None:
+                    record_result(out, {'manifest_line': line_no, 'status': 'error',
+                                        'error': f'Invalid manifest entry: {parse_error}',
+                                        'type': type(parse_error).__name__, 'latency_ms': None})
+                    continue
+                try:
+                    future = pool.submit(_run_manifest_claim, line_no, request)
+                except BrokenProcessPool:
+                    # The pool broke since the last drain; recover before queuing more work
+                    recover([])
+                    future = pool.submit(_run_manifest_claim, line_no, request)
+                pending[future] = (line_no, request)
+                if len(pending) >= max_in_flight:
+                    drain(FIRST_COMPLETED)
+            while pending:
+                drain(ALL_COMPLETED)
+        finally:
+            pool.shutdown(wait=True)
+
+    summary = batch_summary(latencies, succeeded, failed, time.perf_counter() - start)
+    if prefetch_summary is not None:
+        summary['weather_prefetch'] = prefetch_summary
+    return summary
+
+# -----------------------------------------------------------------------------
+# Startup profile
+# -----------------------------------------------------------------------------
+
+# Modules each stage pulls in on first use
+STAGE_MODULES = {
+    'exif': ['PIL.Image', 'PIL.ExifTags'],
+    'geofencing': ['shapely.geometry', 'shapely.ops', 'shapely.prepared'],
+    'damage_assessment': ['numpy'],
+}
+
+def startup_profile_report():
+    """Report what the worker cost to load and what each stage adds on first use"""
+    return {
+        'module_load_ms': round(_MODULE_LOAD_MS, 2),
+        'capabilities': capabilities(),
+        'stage_imports': {stage: startup_profile(modules) for stage, modules in STAGE_MODULES.items()},
+    }
+
+# Support modules shared with cropfarmPY. The two apps are run from their own
+# directories and neither has the other on sys.path, so cropfarmPY/modules/ keeps
+# a vendored copy of each: edit the one here and copy it over unchanged
+SHARED_MODULES = ('lazy_imports', 'geodesy', 'result_cache', 'weather_cache', 'http_client', 'tiled_stats')
+CROPFARM_MODULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'cropfarmPY', 'modules')
+
+def shared_module_drift():
+    """Names of shared modules whose cropfarmPY copy differs from the worker's, or None without a cropfarmPY tree"""
+    if not os.path.isdir(CROPFARM_MODULES_DIR):
+        return None
+    here = os.path.dirname(os.path.abspath(__file__))
+    drift = []
+    for name in SHARED_MODULES:
+        try:
+            with open(os.path.join(here, f'{name}.py'), 'rb') as a, \
+                    open(os.path.join(CROPFARM_MODULES_DIR, f'{name}.py'), 'rb') as b:
+                if a.read() != b.read():
+                    drift.append(name)
+        except OSError:
+            drift.append(name)
+    return drift
+
+def self_test_report():
+    """Offline checks of the worker's support modules, keyed by check name"""
+    import http_client
+    import parcels
+    report = {}
+    report.update(parcels.self_test())
+    report.update(http_client.self_test())
+    drift = shared_module_drift()
+    report['shared_modules_identical'] = ({'ok': True, 'skipped': 'no cropfarmPY tree'} if drift is None
+                                          else {'ok': not drift, 'differ': drift})
+    return report
+
+# -----------------------------------------------------------------------------
+# Resolution drift
+# -----------------------------------------------------------------------------
+
+def resolution_drift_report(image_paths):
+    """
+    Run the damage heuristic on each image at every decode reduction and report
+    how far the colour statistics drift from the full-resolution decode, whether
+    the predicted damage type changes, and what each decode cost.
+    """
+    classifier = CropDamageClassifier()
+    if image_paths:
+        # The first decode pays for lazy imports; keep that out of the timings
+        classifier.analyze(image_paths[0])
+    worst = {r: {'max_abs_drift': 0.0, 'type_changes': 0, 'total_ms': 0.0} for r in ANALYSIS_REDUCTIONS}
+    images = []
+    for path in image_paths:
+        runs = {}
+        for r in ANALYSIS_REDUCTIONS:
+            start = time.perf_counter()
+            img = decode_rgb(path, r)
+            stats = classifier.colour_stats(img)
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            result = classifier.analyze(path, r)
+            runs[r] = {'decoded_size': list(img.size), 'elapsed_ms': round(elapsed_ms, 2),
+                       'stats': {k: round(v, 3) for k, v in stats.items()},
+                       'primary_damage_type': result['primary_damage_type'],
+                       'damage_percentage': result['damage_percentage']}
+        full = runs[1]
+        for r, run in runs.items():
+            run['max_abs_drift'] = round(max(abs(run['stats'][k] - full['stats'][k]) for k in full['stats']), 3)
+            run['type_changed'] = run['primary_damage_type'] != full['primary_damage_type']
+            worst[r]['max_abs_drift'] = max(worst[r]['max_abs_drift'], run['max_abs_drift'])
+            worst[r]['type_changes'] += int(run['type_changed'])
+            worst[r]['total_ms'] = round(worst[r]['total_ms'] + run['elapsed_ms'], 2)
+        images.append({'path': path, 'by_reduction': {f"1/{r}": run for r, run in runs.items()}})
+    return {
+        'declared_reduction': CropDamageClassifier.ANALYSIS_REDUCTION,
+        'configured_reduction': analysis_reduction(CropDamageClassifier.ANALYSIS_REDUCTION),
+        'summary': {f"1/{r}": totals for r, totals in worst.items()},
+        'images': images,
+    }
+
 # -----------------------------------------------------------------------------
 # CLI Entry Point
 # -----------------------------------------------------------------------------
 
+def _cli_option(name, default=None):
+    """Value following `name` on the command line, or default"""
+    if name in sys.argv[:-1]:
+        return sys.argv[sys.argv.index(name) + 1]
+    return default
+
 def main():
     """
     Command-line interface for batch processing
@@ -712,16 +1314,56 @@ def main():
     python pipeline.py <img1> <lat1> <lon1> <img2> <lat2> <lon2> <img3> <lat3> <lon3> 
                       <img4> <lat4> <lon4> <damage_img> <farmer_damage%> <sum_insured> 
                       <geojson_path> <parcel_id> [TRUST_CLAIMED_COORDS]
+    python pipeline.py --serve [--socket <path>]
+    python pipeline.py --startup-profile
+    python pipeline.py --cache-stats [--clear]
+    python pipeline.py --resolution-drift <image> [<image> ...]
+    python pipeline.py --batch <manifest.jsonl> --output <results.jsonl> [--workers N] [--no-weather-prefetch]
+    python pipeline.py --self-test
     """
     
+    if len(sys.argv) > 1 and sys.argv[1] == '--startup-profile':
+        print(json.dumps(startup_profile_report(), indent=2))
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--self-test':
+        report = self_test_report()
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if all(check['ok'] for check in report.values()) else 1)
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--cache-stats':
+        if '--clear' in sys.argv:
+            result_cache().clear()
+            weather_cache().clear()
+        report = result_cache().stats()
+        report['weather'] = weather_cache().stats()
+        print(json.dumps(report, indent=2))
+        return
+
+    if len(sys.argv) > 2 and sys.argv[1] == '--resolution-drift':
+        print(json.dumps(resolution_drift_report(sys.argv[2:]), indent=2))
+        return
+
+    if len(sys.argv) > 2 and sys.argv[1] == '--batch':
+        manifest_path = sys.argv[2]
+        output_path = _cli_option('--output', os.path.splitext(manifest_path)[0] + '.results.jsonl')
+        workers = _cli_option('--workers')
+        summary = run_batch(manifest_path, output_path, workers=int(workers) if workers else None,
+                            prefetch='--no-weather-prefetch' not in sys.argv)
+        summary['output_path'] = output_path
+        print(json.dumps(summary, indent=2))
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve(_cli_option('--socket'))
+        return
+
     if len(sys.argv) < 17:
         error_response = {
             'error': 'Insufficient arguments',
             'required_args': 17,
             'provided_args': len(sys.argv) - 1,
-            'usage': 'python pipeline.py <img1> <lat1> <lon1> <img2> <lat2> <lon2> '
-                    '<img3> <lat3> <lon3> <img4> <lat4> <lon4> <damage_img> '
-                    '<farmer_damage%> <sum_insured> <geojson_path> <parcel_id> [TRUST_CLAIMED_COORDS]',
+            'usage': USAGE,
             'example': 'python pipeline.py corner1.jpg 19.123 72.456 corner2.jpg 19.124 72.457 '
                       'corner3.jpg 19.125 72.458 corner4.jpg 19.126 72.459 damage.jpg 50.0 '
                       '100000 data/parcel.geojson PARCEL001 1'
@@ -731,24 +1373,7 @@ def main():
 
     try:
         args = sys.argv[1:]
-        
-        # Parse image paths (4 corner images)
-        image_paths = [args[0], args[3], args[6], args[9]]
-        
-        # Parse coordinates for each corner
-        coordinates = [
-            (float(args[1]), float(args[2])),   # Corner 1
-            (float(args[4]), float(args[5])),   # Corner 2
-            (float(args[7]), float(args[8])),   # Corner 3
-            (float(args[10]), float(args[11]))  # Corner 4
-        ]
-        
-        # Parse damage image and parameters
-        damage_img = args[12]
-        farmer_damage = float(args[13])
-        sum_insured = float(args[14])
-        geojson_path = args[15]
-        parcel_id = args[16] if len(args) > 16 else 'PARCEL_001'
+        claim_kwargs = parse_claim_args(args)
 
         # Optional: Trust claimed coordinates flag
         trust_coords = TRUST_CLAIMED_COORDS
@@ -756,27 +1381,18 @@ def main():
             trust_coords = (str(args[17]).strip() in ('1', 'true', 'True', 'YES', 'yes'))
 
         # Validate file existence
-        all_files = image_paths + [damage_img]
-        for file_path in all_files:
-            if not os.path.exists(file_path):
-                error_response = {
-                    'error': 'File not found',
-                    'missing_file': file_path,
-                    'timestamp': datetime.now().isoformat()
-                }
-                print(json.dumps(error_response, indent=2), file=sys.stderr)
-                sys.exit(1)
+        missing = find_missing_file(claim_kwargs)
+        if missing:
+            error_response = {
+                'error': 'File not found',
+                'missing_file': missing,
+                'timestamp': datetime.now().isoformat()
+            }
+            print(json.dumps(error_response, indent=2), file=sys.stderr)
+            sys.exit(1)
 
         # Run comprehensive processing
-        result = process_claim_comprehensive(
-            image_paths=image_paths,
-            coordinates=coordinates,
-            damage_image_path=damage_img,
-            farmer_claimed_damage=farmer_damage,
-            sum_insured=sum_insured,
-            geojson_path=geojson_path,
-            parcel_id=parcel_id
-        )
+        result = process_claim_comprehensive(**claim_kwargs)
         
         # Output JSON result to stdout
         print(json.dumps(result, indent=2))
@@ -801,5 +1417,7 @@ def main():
         print(json.dumps(error_response, indent=2), file=sys.stderr)
         sys.exit(1)
 
+_MODULE_LOAD_MS = (time.perf_counter() - _MODULE_LOAD_START) * 1000.0
+
 if __name__ == '__main__':
     main()
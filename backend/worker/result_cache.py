@@ -0,0 +1,241 @@
+# Shared module: canonical copy in backend/worker/, vendored unchanged into cropfarmPY/modules/
+"""
+Persistent cache for per-image analysis results
+
+Results are stored in SQLite keyed by the image's content hash, the stage name
+and the analyzer version, so a resubmitted photo costs one hash and one lookup
+no matter what it is called on disk. The file is bounded by total size and
+evicts least recently used entries first.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+DEBUG_MODE = os.getenv('DEBUG_MODE', 'true').lower() == 'true'
+# The app's own directory: the worker's, or cropfarmPY/ above its modules package
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+if __package__:
+    APP_DIR = os.path.dirname(APP_DIR)
+# Empty or 'off' disables the cache
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', os.path.join(APP_DIR, 'cache', 'results.sqlite3'))
+RESULT_CACHE_MAX_BYTES = int(float(os.getenv('RESULT_CACHE_MAX_MB', '256')) * 1024 * 1024)
+# A hit only rewrites last_used when the stored value is older than this
+TOUCH_INTERVAL_S = 60.0
+# Eviction trims the cache to this fraction of the limit
+EVICT_TO_FRACTION = 0.9
+HASH_CHUNK_BYTES = 1 << 20
+HASH_MEMO_SIZE = 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    digest TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (digest, stage, version)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used);
+CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals VALUES ('bytes', 0);
+CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results BEGIN
+    UPDATE totals SET value = value + NEW.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS results_update AFTER UPDATE OF size ON results BEGIN
+    UPDATE totals SET value = value + NEW.size - OLD.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results BEGIN
+    UPDATE totals SET value = value - OLD.size WHERE name = 'bytes';
+END;
+"""
+
+def debug(msg):
+    if DEBUG_MODE:
+        print(f"[DEBUG] {msg}", file=sys.stderr)
+
+def _json_default(value):
+    # NumPy scalars (np.bool_, np.float64) come back as plain Python values
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class ResultCache:
+    """Content-hash keyed store for stage results (JSON-serializable dicts)"""
+
+    def __init__(self, path, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = Counter()
+        self.misses = Counter()
+        self._local = threading.local()
+        self._digests = OrderedDict()
+        self._digest_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # Storage
+    # -------------------------------------------------------------------------
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def file_digest(self, image_path):
+        """Content hash of a file, memoized per (path, size, mtime) within the process"""
+        st = os.stat(image_path)
+        memo_key = (os.path.realpath(image_path), st.st_size, st.st_mtime_ns)
+        with self._digest_lock:
+            digest = self._digests.get(memo_key)
+            if digest is not None:
+                self._digests.move_to_end(memo_key)
+                return digest
+
+        h = hashlib.blake2b(digest_size=20)
+        buf = bytearray(HASH_CHUNK_BYTES)
+        view = memoryview(buf)
+        with open(image_path, 'rb') as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                h.update(view[:n])
+        digest = h.hexdigest()
+
+        with self._digest_lock:
+            self._digests[memo_key] = digest
+            if len(self._digests) > HASH_MEMO_SIZE:
+                self._digests.popitem(last=False)
+        return digest
+
+    def get(self, stage, version, image_path):
+        """Return the cached result for this image and stage, or None"""
+        try:
+            digest = self.file_digest(image_path)
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT value, last_used FROM results WHERE digest = ? AND stage = ? AND version = ?',
+                (digest, stage, str(version))
+            ).fetchone()
+            if row is not None:
+                now = time.time()
+                if now - row[1] > TOUCH_INTERVAL_S:
+                    with conn:
+                        conn.execute(
+                            'UPDATE results SET last_used = ? WHERE digest = ? AND stage = ? AND version = ?',
+                            (now, digest, stage, str(version))
+                        )
+                value = json.loads(row[0])
+            else:
+                value = None
+        except (OSError, sqlite3.Error, ValueError) as e:
+            debug(f"Result cache lookup failed ({stage}): {e}")
+            value = None
+
+        with self._stats_lock:
+            (self.misses if value is None else self.hits)[stage] += 1
+        return value
+
+    def put(self, stage, version, image_path, value):
+        """Store a stage result; failures are logged and otherwise ignored"""
+        try:
+            digest = self.file_digest(image_path)
+            payload = json.dumps(value, default=_json_default, separators=(',', ':'))
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    'INSERT INTO results (digest, stage, version, value, size, last_used) VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (digest, stage, version) DO UPDATE SET '
+                    'value = excluded.value, size = excluded.size, last_used = excluded.last_used',
+                    (digest, stage, str(version), payload, len(payload), time.time())
+                )
+                self._evict(conn)
+        except (OSError, sqlite3.Error, TypeError, ValueError) as e:
+            debug(f"Result cache store failed ({stage}): {e}")
+
+    def _evict(self, conn):
+        """Drop least recently used entries once the cache is over its size limit"""
+        (total,) = conn.execute("SELECT value FROM totals WHERE name = 'bytes'").fetchone()
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * EVICT_TO_FRACTION)
+        victims, freed = [], 0
+        for digest, stage, version, size in conn.execute(
+                'SELECT digest, stage, version, size FROM results ORDER BY last_used'):
+            victims.append((digest, stage, version))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM results WHERE digest = ? AND stage = ? AND version = ?', victims)
+        debug(f"Result cache evicted {len(victims)} entries ({freed} bytes)")
+
+    def stats(self):
+        """Hit/miss counters for this process plus the size of the store"""
+        with self._stats_lock:
+            hits, misses = dict(self.hits), dict(self.misses)
+        report = {
+            'enabled': True,
+            'path': self.path,
+            'max_bytes': self.max_bytes,
+            'hits': sum(hits.values()),
+            'misses': sum(misses.values()),
+            'by_stage': {stage: {'hits': hits.get(stage, 0), 'misses': misses.get(stage, 0)}
+                         for stage in sorted(set(hits) | set(misses))},
+        }
+        try:
+            conn = self._connection()
+            report['entries'] = conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            report['bytes'] = conn.execute("SELECT value FROM totals WHERE name = 'bytes'").fetchone()[0]
+        except sqlite3.Error as e:
+            report['error'] = str(e)
+        return report
+
+    def clear(self):
+        """Remove every stored result"""
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM results')
+
+class NullCache:
+    """Stand-in used when the cache is disabled"""
+
+    def get(self, stage, version, image_path):
+        return None
+
+    def put(self, stage, version, image_path, value):
+        pass
+
+    def stats(self):
+        return {'enabled': False}
+
+    def clear(self):
+        pass
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def result_cache():
+    """Return the process-wide cache configured by RESULT_CACHE_PATH"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if RESULT_CACHE_PATH and RESULT_CACHE_PATH.lower() != 'off':
+                _cache = ResultCache(RESULT_CACHE_PATH)
+            else:
+                _cache = NullCache()
+    return _cache
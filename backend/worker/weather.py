@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Weather lookups for claim verification
+
+A lookup is started as a background asyncio task as soon as a claim's
+coordinates are known and joined with a deadline once the image analysis is
+done, so a slow provider never holds up the rest of the pipeline. Responses
+are shared between nearby claims through weather_cache. Each provider is asked
+once for a window of WEATHER_WINDOW_DAYS days ending on the capture date;
+the window is cached as a per-cell daily series and its rolling aggregates
+(7/30-day rainfall, heat days) are computed once per cell and day. Batch runs
+fill the cache up front with multi-location requests (prefetch_weather).
+
+Open-Meteo is the primary provider and Meteostat (RapidAPI, only when
+RAPIDAPI_KEY is set) the alternate. If the primary has not answered by its
+observed p95 latency a hedged request goes to the alternate and the first
+good answer wins. A per-provider circuit breaker stops sending traffic to a
+provider that keeps failing or timing out.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait, TimeoutError as FutureTimeoutError
+
+from http_client import http_client
+from weather_cache import NullWeatherCache, date_range, weather_cache
+
+DEBUG_MODE = os.getenv('DEBUG_MODE', 'true').lower() == 'true'
+# Seconds from the start of a lookup after which the claim continues without weather
+WEATHER_DEADLINE_S = float(os.getenv('WEATHER_DEADLINE_SECONDS', '5'))
+# Total time one Open-Meteo request may take across its retries
+OPEN_METEO_DEADLINE_S = 10.0
+# Locations per multi-location Open-Meteo request when prefetching a batch
+OPEN_METEO_BATCH_SIZE = int(os.getenv('OPEN_METEO_BATCH_SIZE', '100'))
+# Days of history fetched up to and including the capture date
+WEATHER_WINDOW_DAYS = int(os.getenv('WEATHER_WINDOW_DAYS', '30'))
+# A day whose maximum reaches this temperature (°C) counts as a heat day
+HEAT_DAY_C = float(os.getenv('WEATHER_HEAT_DAY_C', '35'))
+# Ranges starting further back than this come from the Open-Meteo archive API
+OPEN_METEO_FORECAST_PAST_DAYS = 92
+# Providers in order of preference; later ones only serve hedged requests
+WEATHER_PROVIDERS = [p.strip() for p in os.getenv('WEATHER_PROVIDERS', 'open_meteo,meteostat').split(',') if p.strip()]
+# The hedge fires when the first provider is slower than this latency percentile...
+WEATHER_HEDGE_PERCENTILE = float(os.getenv('WEATHER_HEDGE_PERCENTILE', '95'))
+# ...once it has this many samples; before that it fires after WEATHER_HEDGE_DELAY_S
+WEATHER_HEDGE_MIN_SAMPLES = 20
+WEATHER_HEDGE_DELAY_S = float(os.getenv('WEATHER_HEDGE_DELAY_SECONDS', '1.0'))
+WEATHER_HEDGE_MIN_DELAY_S = 0.05
+# Consecutive failures that open a provider's breaker, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('WEATHER_BREAKER_FAILURES', '3'))
+BREAKER_COOLDOWN_S = float(os.getenv('WEATHER_BREAKER_COOLDOWN_SECONDS', '30'))
+
+def debug(msg):
+    if DEBUG_MODE:
+        print(f"[DEBUG] {msg}", file=sys.stderr)
+
+def weather_unavailable(error='Weather data unavailable', source='open_meteo'):
+    """Result used whenever no weather data could be obtained"""
+    return {
+        'api_success': False,
+        'error': error,
+        'source': source
+    }
+
+# -----------------------------------------------------------------------------
+# Daily series and window aggregates
+# -----------------------------------------------------------------------------
+
+def window_bounds(end_iso, days=None):
+    """(start_iso, end_iso) of the `days`-day window ending on end_iso"""
+    days = days or WEATHER_WINDOW_DAYS
+    end = date.fromisoformat(end_iso[:10])
+    return (end - timedelta(days=days - 1)).isoformat(), end.isoformat()
+
+def window_aggregates(series, end_iso, days=None):
+    """
+    Rolling aggregates over the window ending on end_iso. `series` maps
+    date_iso to daily values; days without data are skipped, and an aggregate
+    with no data at all is None.
+    """
+    days = days or WEATHER_WINDOW_DAYS
+    ordered = [series.get(day) for day in date_range(*window_bounds(end_iso, days))]
+
+    def last(n, key):
+        return [v[key] for v in ordered[-n:] if v and v.get(key) is not None]
+
+    rain_7d, rain_30d = last(7, 'precipitation_mm'), last(30, 'precipitation_mm')
+    humidity_7d = last(7, 'humidity_percent')
+    tmax_30d = last(30, 'temperature_max')
+    return {
+        'window_days': days,
+        'days_with_data': sum(1 for v in ordered if v),
+        'rain_7d_mm': round(sum(rain_7d), 1) if rain_7d else None,
+        'rain_30d_mm': round(sum(rain_30d), 1) if rain_30d else None,
+        'max_daily_rain_7d_mm': max(rain_7d) if rain_7d else None,
+        'mean_humidity_7d': round(sum(humidity_7d) / len(humidity_7d), 1) if humidity_7d else None,
+        'heat_days_30d': sum(1 for t in tmax_30d if t >= HEAT_DAY_C) if tmax_30d else None,
+    }
+
+# -----------------------------------------------------------------------------
+# Open-Meteo
+# -----------------------------------------------------------------------------
+
+OPEN_METEO_DAILY = 'temperature_2m_max,temperature_2m_min,precipitation_sum,relative_humidity_2m_mean'
+
+def _open_meteo_endpoint(start_iso):
+    """(client, path) serving a range starting on start_iso: forecast API for recent days, archive before"""
+    oldest_recent = datetime.now(timezone.utc).date() - timedelta(days=OPEN_METEO_FORECAST_PAST_DAYS)
+    if date.fromisoformat(start_iso[:10]) < oldest_recent:
+        return 'open_meteo_archive', '/v1/archive'
+    return 'open_meteo', '/v1/forecast'
+
+def _open_meteo_series(data):
+    """{date_iso: daily values} from one Open-Meteo location object"""
+    daily = (data or {}).get('daily') or {}
+    times = daily.get('time') or []
+
+    def column(key):
+        values = daily.get(key) or []
+        return values + [None] * (len(times) - len(values))
+
+    return {
+        day[:10]: {'temperature_min': tmin, 'temperature_max': tmax, 'precipitation_mm': prcp, 'humidity_percent': rhum}
+        for day, tmin, tmax, prcp, rhum in zip(times, column('temperature_2m_min'), column('temperature_2m_max'),
+                                              column('precipitation_sum'), column('relative_humidity_2m_mean'))
+    }
+
+def _get_open_meteo(latitude, longitude, start_iso, end_iso):
+    client, path = _open_meteo_endpoint(start_iso)
+    params = {
+        'latitude': latitude,
+        'longitude': longitude,
+        'start_date': start_iso,
+        'end_date': end_iso,
+        'daily': OPEN_METEO_DAILY,
+        'timezone': 'auto'
+    }
+    # Pooled keep-alive connection with retries, bounded by the request deadline
+    status, data = http_client(client).get_json(path, params, deadline_s=OPEN_METEO_DEADLINE_S)
+    if status != 200:
+        raise RuntimeError(f"Open-Meteo returned HTTP {status}")
+    return data
+
+def _fetch_open_meteo_series(lat, lon, start_iso, end_iso):
+    """One Open-Meteo request for a date range; returns ({date_iso: values}, cacheable)"""
+    debug(f"Fetching weather for {lat:.4f}, {lon:.4f} from {start_iso} to {end_iso}")
+    return _open_meteo_series(_get_open_meteo(lat, lon, start_iso, end_iso)), True
+
+def _fetch_open_meteo_batch(points, start_iso, end_iso):
+    """
+    One multi-location Open-Meteo request for `points` [(lat, lon), ...] over a
+    date range. Returns a {date_iso: values} series per point, in order.
+    """
+    data = _get_open_meteo(','.join(f"{lat:.6f}" for lat, _ in points),
+                           ','.join(f"{lon:.6f}" for _, lon in points), start_iso, end_iso)
+    # A single location comes back as an object, several as a list in request order
+    locations = data if isinstance(data, list) else [data]
+    if len(locations) != len(points):
+        raise RuntimeError(f"Open-Meteo returned {len(locations)} locations for {len(points)}")
+    return [_open_meteo_series(location) for location in locations]
+
+# -----------------------------------------------------------------------------
+# Meteostat
+# -----------------------------------------------------------------------------
+
+def _fetch_meteostat_series(lat, lon, start_iso, end_iso):
+    """One Meteostat daily request through RapidAPI; returns ({date_iso: values}, cacheable)"""
+    debug(f"Fetching Meteostat weather for {lat:.4f}, {lon:.4f} from {start_iso} to {end_iso}")
+    params = {'lat': lat, 'lon': lon, 'start': start_iso, 'end': end_iso}
+    headers = {'x-rapidapi-key': os.getenv('RAPIDAPI_KEY', ''), 'x-rapidapi-host': 'meteostat.p.rapidapi.com'}
+    status, data = http_client('meteostat').get_json('/point/daily', params, headers, deadline_s=OPEN_METEO_DEADLINE_S)
+    if status != 200:
+        raise RuntimeError(f"Meteostat returned HTTP {status}")
+    return {
+        str(row['date'])[:10]: {'temperature_min': row.get('tmin'), 'temperature_max': row.get('tmax'),
+                                'precipitation_mm': row.get('prcp'), 'humidity_percent': row.get('rhum')}
+        for row in (data or {}).get('data') or [] if row.get('date')
+    }, True
+
+# -----------------------------------------------------------------------------
+# Per-provider weather
+# -----------------------------------------------------------------------------
+
+# Provider name -> fetch(lat, lon, start_iso, end_iso) -> ({date_iso: values}, cacheable)
+SERIES_FETCHERS = {
+    'open_meteo': _fetch_open_meteo_series,
+    'meteostat': _fetch_meteostat_series,
+}
+
+def weather_window(provider, lat, lon, end_iso, days=None):
+    """Daily series {date_iso: values} for the window ending on end_iso, cached per cell and day"""
+    start_iso, end_iso = window_bounds(end_iso, days)
+    return weather_cache().lookup_series(f"{provider}_daily", lat, lon, start_iso, end_iso,
+                                         lambda *span: _guarded_fetch(provider, *span))
+
+def _window_result(provider, lat, lon, date_iso):
+    """Capture-day values plus window aggregates from one provider; returns (result, cacheable)"""
+    try:
+        series = weather_window(provider, lat, lon, date_iso)
+    except Exception as e:
+        debug(f"✗ {provider} weather error: {e}")
+        return weather_unavailable(source=provider), False
+    day = series.get(date_iso[:10])
+    if not day:
+        debug(f"✗ {provider} has no data for {date_iso[:10]}")
+        return weather_unavailable(source=provider), False
+    aggregates = window_aggregates(series, date_iso)
+    debug(f"✓ {provider} weather: {aggregates['days_with_data']}/{aggregates['window_days']} days")
+    return {
+        'api_success': True,
+        'source': provider,
+        'processed_data': dict(day, precipitation_mm=day.get('precipitation_mm') or 0),
+        'window': aggregates
+    }, aggregates['days_with_data'] == aggregates['window_days']
+
+def _window_key(provider):
+    return f"{provider}_window{WEATHER_WINDOW_DAYS}"
+
+def provider_weather(provider, lat, lon, date_iso):
+    """
+    Weather for a claim from one provider. The aggregates are computed once
+    per cell and day and shared with every other claim there via the cache.
+    """
+    return weather_cache().lookup(_window_key(provider), lat, lon, date_iso,
+                                  lambda cell_lat, cell_lon, day: _window_result(provider, cell_lat, cell_lon, day))
+
+# -----------------------------------------------------------------------------
+# Batch prefetch
+# -----------------------------------------------------------------------------
+
+def prefetch_weather(points, batch_size=None):
+    """
+    Fill the weather cache for many claims before they are processed
+
+    `points` is an iterable of (lat, lon, date_iso), one per claim. Claims are
+    grouped by date and cache cell; the windows of cells not already cached are
+    requested `batch_size` cells at a time with multi-location Open-Meteo
+    requests, so N claims cost about N / batch_size round trips. Failed batches
+    are only logged: those claims fall back to their own lookup. Returns a
+    summary of the work done.
+    """
+    start = time.perf_counter()
+    batch_size = batch_size or OPEN_METEO_BATCH_SIZE
+    cache = weather_cache()
+    summary = {'claims': 0, 'cells': 0, 'already_cached': 0, 'requests': 0,
+               'failed_requests': 0, 'cells_fetched': 0}
+    if isinstance(cache, NullWeatherCache):
+        # Nowhere to put the results; every claim fetches its own weather
+        summary['skipped'] = 'weather cache disabled'
+        return summary
+
+    cells_by_date = {}
+    for lat, lon, date_iso in points:
+        summary['claims'] += 1
+        cells_by_date.setdefault(date_iso[:10], set()).add(cache.cell(lat, lon))
+
+    batches = []
+    for date_iso, cells in sorted(cells_by_date.items()):
+        start_iso, end_iso = window_bounds(date_iso)
+        summary['cells'] += len(cells)
+        missing = sorted(c for c in cells if cache.missing_days('open_meteo_daily', c[0], c[1], start_iso, end_iso))
+        summary['already_cached'] += len(cells) - len(missing)
+        batches.extend((start_iso, end_iso, missing[i:i + batch_size]) for i in range(0, len(missing), batch_size))
+
+    def run(batch):
+        start_iso, end_iso, cells = batch
+        try:
+            series = _fetch_open_meteo_batch(cells, start_iso, end_iso)
+        except Exception as e:
+            debug(f"✗ Weather prefetch for {len(cells)} cells ending {end_iso} failed: {e}")
+            return 0, False
+        stored = 0
+        for (cell_lat, cell_lon), values in zip(cells, series):
+            if values:
+                cache.put_series('open_meteo_daily', cell_lat, cell_lon, values)
+                stored += 1
+        return stored, True
+
+    # Concurrency is capped by the client's connection pool anyway
+    with ThreadPoolExecutor(max_workers=max(1, http_client('open_meteo').pool_size)) as pool:
+        for stored, ok in pool.map(run, batches):
+            summary['requests'] += 1
+            summary['failed_requests'] += 0 if ok else 1
+            summary['cells_fetched'] += stored
+
+    summary['elapsed_ms'] = round((time.perf_counter() - start) * 1000.0, 2)
+    debug(f"Weather prefetch: {summary['claims']} claims, {summary['cells']} cells, "
+          f"{summary['requests']} requests")
+    return summary
+
+# -----------------------------------------------------------------------------
+# Circuit breakers and hedged lookups
+# -----------------------------------------------------------------------------
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker for one provider. Closed: all calls allowed.
+    Open: none until the cooldown passes. Half-open: a single probe call,
+    whose outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown_s=BREAKER_COOLDOWN_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def available(self):
+        """False while open and cooling down; unlike allow, never claims the half-open probe"""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at < self.cooldown_s:
+                self.rejected += 1
+                return False
+            return True
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown_s:
+                self.state = 'half_open'
+                debug(f"Circuit for {self.name} half-open, sending a probe")
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.state, self.failures = 'closed', 0
+                return
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                    debug(f"✗ Circuit for {self.name} opened after {self.failures} failures")
+                self.state, self.opened_at = 'open', time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.failures,
+                    'times_opened': self.times_opened, 'rejected_calls': self.rejected}
+
+_breakers = {}
+_hedge_counts = {'lookups': 0, 'hedged': 0, 'alternate_wins': 0, 'all_failed': 0}
+_hedge_lock = threading.Lock()
+_leg_pool = None
+_leg_pool_pid = None
+
+def _provider_configured(name):
+    # Meteostat goes through RapidAPI and needs a key; Open-Meteo is keyless
+    return name in SERIES_FETCHERS and (name != 'meteostat' or bool(os.getenv('RAPIDAPI_KEY')))
+
+def _breaker(name):
+    with _hedge_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+def _count(field):
+    with _hedge_lock:
+        _hedge_counts[field] += 1
+
+def _get_leg_pool():
+    """Threads running provider requests; recreated after a fork"""
+    global _leg_pool, _leg_pool_pid
+    with _hedge_lock:
+        if _leg_pool is None or _leg_pool_pid != os.getpid():
+            _leg_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='weather-leg')
+            _leg_pool_pid = os.getpid()
+        return _leg_pool
+
+def _provider_client(provider, date_iso):
+    """Name of the HTTP client a lookup for date_iso will use: Open-Meteo splits forecast and archive"""
+    if provider == 'open_meteo':
+        return _open_meteo_endpoint(window_bounds(date_iso)[0])[0]
+    return provider
+
+def hedge_delay_s(provider, date_iso):
+    """Seconds to wait for `provider` before hedging: its latency percentile once known"""
+    latency = http_client(_provider_client(provider, date_iso)).latency
+    if latency.count < WEATHER_HEDGE_MIN_SAMPLES:
+        return WEATHER_HEDGE_DELAY_S
+    return max(WEATHER_HEDGE_MIN_DELAY_S, latency.percentile(WEATHER_HEDGE_PERCENTILE) / 1000.0)
+
+def _guarded_fetch(provider, lat, lon, start_iso, end_iso):
+    """
+    The provider's series fetch behind its circuit breaker. Only requests that
+    are actually sent ask the breaker and feed it; cache hits never reach here.
+    """
+    breaker = _breaker(provider)
+    if not breaker.allow():
+        raise RuntimeError(f"circuit for {provider} is open")
+    started = time.monotonic()
+    try:
+        result = SERIES_FETCHERS[provider](lat, lon, start_iso, end_iso)
+    except Exception:
+        breaker.record(False)
+        raise
+    # An answer slower than the claim's weather deadline is as good as a timeout
+    breaker.record(time.monotonic() - started <= WEATHER_DEADLINE_S)
+    return result
+
+def fetch_real_weather_data(lat, lon, date_iso):
+    """
+    Weather for a point and day from the first provider whose circuit is
+    closed, hedged to the next one if the first is slow. Served from the
+    per-cell cache when another claim already fetched it.
+    """
+    _count('lookups')
+    queue = [p for p in WEATHER_PROVIDERS if _provider_configured(p)]
+    # A cached answer sends no request, so it is served whatever the breakers say
+    cache = weather_cache()
+    for provider in queue:
+        if cache.peek(_window_key(provider), lat, lon, date_iso) is not None:
+            return provider_weather(provider, lat, lon, date_iso)
+
+    def next_provider():
+        # Open circuits are skipped here; the probe itself is claimed by the fetch that sends it
+        while queue:
+            provider = queue.pop(0)
+            if _breaker(provider).available():
+                return provider
+        return None
+
+    primary = next_provider()
+    if primary is None:
+        _count('all_failed')
+        return weather_unavailable('All weather providers unavailable (circuits open)')
+
+    pool = _get_leg_pool()
+    pending = {pool.submit(provider_weather, primary, lat, lon, date_iso): primary}
+    failed = None
+    hedge_at = time.monotonic() + hedge_delay_s(primary, date_iso)
+    while pending:
+        timeout = max(0.0, hedge_at - time.monotonic()) if queue else None
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            provider = pending.pop(future)
+            result = future.result()
+            if result.get('api_success'):
+                if provider != primary:
+                    _count('alternate_wins')
+                return result
+            failed = failed or result
+        # Hedge on a slow leg, or move on at once when one failed
+        if queue and (done or time.monotonic() >= hedge_at):
+            provider = next_provider()
+            if provider is not None:
+                if not done:
+                    _count('hedged')
+                    debug(f"Hedging weather lookup to {provider}")
+                pending[pool.submit(provider_weather, provider, lat, lon, date_iso)] = provider
+                hedge_at = time.monotonic() + hedge_delay_s(provider, date_iso)
+    _count('all_failed')
+    return failed
+
+def weather_provider_stats():
+    """Hedging counters and circuit breaker state per provider"""
+    with _hedge_lock:
+        report = dict(_hedge_counts)
+        breakers = dict(_breakers)
+    report['providers'] = {name: breaker.stats() for name, breaker in breakers.items()}
+    return report
+
+# -----------------------------------------------------------------------------
+# Background lookups
+# -----------------------------------------------------------------------------
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def _background_loop():
+    """Event loop running on a daemon thread, shared by every lookup in the process"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='weather-loop', daemon=True).start()
+    return _loop
+
+async def fetch_weather_async(lat, lon, date_iso):
+    """Coroutine form of fetch_real_weather_data"""
+    return await asyncio.to_thread(fetch_real_weather_data, lat, lon, date_iso)
+
+class BackgroundLookup:
+    """Handle for a coroutine running on the background loop, joined with a deadline"""
+
+    def __init__(self, coro, deadline_s):
+        self.started = time.monotonic()
+        self.deadline_s = deadline_s
+        self._future = asyncio.run_coroutine_threadsafe(coro, _background_loop())
+
+    def result(self, default):
+        """Wait for the lookup until its deadline; return `default` if it misses it or fails"""
+        remaining = self.deadline_s - (time.monotonic() - self.started)
+        try:
+            return self._future.result(timeout=max(0.0, remaining))
+        except FutureTimeoutError:
+            self._future.cancel()
+            debug(f"✗ Weather lookup missed its {self.deadline_s:.1f}s deadline")
+        except Exception as e:
+            debug(f"✗ Weather lookup failed: {e}")
+        return default
+
+def start_weather_lookup(lat, lon, date_iso, deadline_s=None):
+    """Start fetching weather in the background and return its BackgroundLookup"""
+    if deadline_s is None:
+        deadline_s = WEATHER_DEADLINE_S
+    return BackgroundLookup(fetch_weather_async(lat, lon, date_iso), deadline_s)
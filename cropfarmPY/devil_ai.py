@@ -7,32 +7,37 @@ Complete and tested version
 import sys
 import json
 import time
+import asyncio
 from datetime import datetime, timezone
 import os
 
-# Import required libraries
-try:
-    import cv2
-    import numpy as np
-    from PIL import Image
-    CV_AVAILABLE = True
-except ImportError:
-    CV_AVAILABLE = False
-    print("Warning: OpenCV not available. Install: pip install opencv-python numpy Pillow", file=sys.stderr)
+from modules.background import run_in_background
+from modules.block_stats import block_variance
+from modules.cache import cached_stage, result_cache
+from modules.crop_profiles import crop_profile
+from modules.weather_providers import (DROUGHT_HEAT_DAYS_30D, DROUGHT_RAIN_30D_MM, FLOOD_RAIN_7D_MM, MeteostatError,
+                                       OpenMeteoError, fetch_weather_window, weather_provider_stats)
+from modules.geodesy import boundary_distance_m
+from modules.image_context import ImageContext, analysis_reduction
+from modules.lazy_imports import lazy_import, has_capability, capabilities, startup_profile
+from modules.parallel import run_parallel
+from modules.weather_cache import weather_cache
+from modules.http_client import http_stats
 
-try:
-    from shapely.geometry import Point, Polygon
-    SHAPELY_AVAILABLE = True
-except ImportError:
-    SHAPELY_AVAILABLE = False
-    print("Warning: Shapely not available. Install: pip install shapely", file=sys.stderr)
+# Heavy libraries load on first use; availability comes from has_capability()
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+shapely_geometry = lazy_import('shapely.geometry')
 
-try:
-    import requests
-    REQUESTS_AVAILABLE = True
-except ImportError:
-    REQUESTS_AVAILABLE = False
-    print("Warning: Requests not available. Install: pip install requests", file=sys.stderr)
+# Modules each stage pulls in on first use
+STAGE_MODULES = {
+    'authenticity': ['numpy', 'cv2'],
+    'location': ['shapely.geometry'],
+    'external_validation': ['ssl', 'http.client'],
+}
+
+# Seconds after which a claim continues without weather validation
+WEATHER_DEADLINE_S = float(os.getenv('WEATHER_DEADLINE_SECONDS', '5'))
 
 def log_debug(message):
     """Debug logging"""
@@ -49,15 +54,21 @@ def safe_print_json(obj):
 class AuthenticityDetector:
     """Detects image/video manipulation"""
     
+    # Lighting (HSV V) is compared across quadrants and an 8x8 grid of regions; the sample
+    # photos peak at a grid spread of 55, so 70 only comes from stitched, differently lit shots
+    LIGHTING_GRID = 8
+    LIGHTING_GRID_STD_MAX = 70
+    
     @staticmethod
-    def analyze_image_forensics(image_path):
-        """Deep forensic analysis of image"""
-        if not CV_AVAILABLE:
+    @cached_stage('devil_ai.forensics', version=3)
+    def analyze_image_forensics(image):
+        """Deep forensic analysis of image (path or ImageContext)"""
+        if not has_capability('cv2'):
             return {'available': False, 'error': 'OpenCV not available', 'final_score': 0.5}
         
         try:
-            img = cv2.imread(image_path)
-            if img is None:
+            img = ImageContext.of(image)
+            if not img.loaded:
                 return {'error': 'Could not load image', 'final_score': 0.0}
             
             results = {
@@ -66,29 +77,40 @@ class AuthenticityDetector:
                 'authenticity_score': 1.0
             }
             
+            # The four checks run concurrently on the shared forensics pool; the
+            # grayscale and V planes and their integral images they need are built once up front
+            img.gray_integral
+            img.value_integral
+            checks = run_parallel({
+                'ela': (AuthenticityDetector._error_level_analysis, (img,)),
+                'noise': (AuthenticityDetector._analyze_noise_pattern, (img,)),
+                'compression': (AuthenticityDetector._analyze_compression, (img,)),
+                'lighting': (AuthenticityDetector._analyze_lighting, (img,)),
+            })
+            
             # ELA Analysis
-            ela_score = AuthenticityDetector._error_level_analysis(img)
+            ela_score = checks['ela']
             results['ela_analysis'] = ela_score
             if ela_score.get('suspicious', False):
                 results['manipulation_indicators'].append('ELA detected manipulation')
                 results['authenticity_score'] -= 0.3
             
             # Noise pattern
-            noise_score = AuthenticityDetector._analyze_noise_pattern(img)
+            noise_score = checks['noise']
             results['noise_analysis'] = noise_score
             if not noise_score.get('natural_noise', True):
                 results['manipulation_indicators'].append('Unnatural noise pattern')
                 results['authenticity_score'] -= 0.2
             
             # Compression
-            compression = AuthenticityDetector._analyze_compression(img)
+            compression = checks['compression']
             results['compression_analysis'] = compression
             if compression.get('multiple_saves_detected', False):
                 results['manipulation_indicators'].append('Multiple save/edit cycles')
                 results['authenticity_score'] -= 0.15
             
             # Lighting
-            lighting = AuthenticityDetector._analyze_lighting(img)
+            lighting = checks['lighting']
             results['lighting_analysis'] = lighting
             if not lighting.get('consistent', True):
                 results['manipulation_indicators'].append('Inconsistent lighting')
@@ -106,7 +128,7 @@ class AuthenticityDetector:
     def _error_level_analysis(img):
         """Detect edited regions using ELA"""
         try:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            gray = ImageContext.of(img).gray
             encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 90]
             _, encoded = cv2.imencode('.jpg', gray, encode_param)
             decoded = cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)
@@ -126,8 +148,7 @@ class AuthenticityDetector:
     def _analyze_noise_pattern(img):
         """Analyze noise patterns"""
         try:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            laplacian = cv2.Laplacian(gray, cv2.CV_64F)
+            laplacian = ImageContext.of(img).laplacian
             noise_variance = np.var(laplacian)
             
             return {
@@ -141,16 +162,10 @@ class AuthenticityDetector:
     def _analyze_compression(img):
         """Detect multiple compression cycles"""
         try:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            h, w = gray.shape
-            block_variances = []
+            ctx = ImageContext.of(img)
+            block_variances = block_variance(ctx.gray, ctx.gray_integral).ravel()
             
-            for y in range(0, h - 8, 8):
-                for x in range(0, w - 8, 8):
-                    block = gray[y:y+8, x:x+8]
-                    block_variances.append(np.var(block.astype(float)))
-            
-            var_of_vars = np.var(block_variances) if block_variances else 100
+            var_of_vars = np.var(block_variances) if block_variances.size else 100
             
             return {
                 'block_variance_uniformity': float(var_of_vars),
@@ -161,25 +176,25 @@ class AuthenticityDetector:
     
     @staticmethod
     def _analyze_lighting(img):
-        """Check lighting consistency"""
+        """Check lighting consistency over quadrants and a fine grid (region means of HSV V from its integral image)"""
         try:
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-            brightness = hsv[:, :, 2]
-            h, w = brightness.shape
-            
-            quadrants = [
-                brightness[0:h//2, 0:w//2],
-                brightness[0:h//2, w//2:w],
-                brightness[h//2:h, 0:w//2],
-                brightness[h//2:h, w//2:w]
-            ]
+            sat = ImageContext.of(img).value_integral
+            quadrant_means, _ = sat.grid_stats(2, 2)
+            brightness_std = np.std(quadrant_means)
             
-            means = [np.mean(q) for q in quadrants]
-            brightness_std = np.std(means)
+            grid_means, _ = sat.grid_stats(AuthenticityDetector.LIGHTING_GRID, AuthenticityDetector.LIGHTING_GRID)
+            grid_std = np.std(grid_means)
+            # Largest brightness step between neighbouring cells, reported as evidence only:
+            # scene content alone produces steps over 100 in genuine photos
+            max_step = max(np.abs(np.diff(grid_means, axis=0)).max(initial=0.0),
+                           np.abs(np.diff(grid_means, axis=1)).max(initial=0.0))
             
             return {
                 'brightness_variation': float(brightness_std),
-                'consistent': brightness_std < 40
+                'grid_size': AuthenticityDetector.LIGHTING_GRID,
+                'grid_brightness_variation': float(grid_std),
+                'max_neighbour_step': float(max_step),
+                'consistent': bool(brightness_std < 40 and grid_std < AuthenticityDetector.LIGHTING_GRID_STD_MAX)
             }
         except:
             return {'consistent': True}
@@ -190,7 +205,7 @@ class LocationValidator:
     @staticmethod
     def validate_coordinates(coords_list, farm_boundary_polygon):
         """Check if coordinates are within farm boundary"""
-        if not SHAPELY_AVAILABLE:
+        if not has_capability('shapely'):
             return {'available': False, 'error': 'Shapely not available', 'coordinates_valid': False}
         
         try:
@@ -202,11 +217,11 @@ class LocationValidator:
             else:
                 return {'error': 'Invalid coordinates format', 'coordinates_valid': False}
             
-            point = Point(lon, lat)
-            polygon = Polygon(farm_boundary_polygon)
+            point = shapely_geometry.Point(lon, lat)
+            polygon = shapely_geometry.Polygon(farm_boundary_polygon)
             
             is_inside = polygon.contains(point)
-            distance = point.distance(polygon.boundary) * 111000
+            distance = boundary_distance_m(lat, lon, farm_boundary_polygon)
             
             return {
                 'available': True,
@@ -223,27 +238,32 @@ class LocationValidator:
 class DamageAnalyzer:
     """Analyzes crop damage"""
     
+    # Segmentation only counts pixels and holds up at 1/4 scale; edge density
+    # depends on resolution, so the damage-type check keeps the full decode
+    SEGMENTATION_REDUCTION = 4
+    
     @staticmethod
-    def analyze_crop_damage(image_path, crop_type):
-        """Main damage analysis"""
-        if not CV_AVAILABLE:
+    def analyze_crop_damage(image, crop_type, reduction=None):
+        """Main damage analysis (path or ImageContext); `reduction` overrides the segmentation scale"""
+        if not has_capability('cv2'):
             return {'available': False, 'damage_assessment': {'calculated_damage_percent': 0, 'confidence': 0.3}}
         
         try:
-            img = cv2.imread(image_path)
-            if img is None:
+            img = ImageContext.of(image)
+            small = img.reduced(reduction or analysis_reduction(DamageAnalyzer.SEGMENTATION_REDUCTION))
+            if not small.loaded:
                 return {'error': 'Could not load image', 'available': False}
             
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-            total_pixels = img.shape[0] * img.shape[1]
+            total_pixels = small.pixel_count
             
-            segmentation = DamageAnalyzer._segment_image(hsv, crop_type)
+            segmentation = DamageAnalyzer._segment_image(small, crop_type)
             
             healthy_percent = (segmentation['healthy_pixels'] / total_pixels) * 100
             damaged_percent = (segmentation['damaged_pixels'] / total_pixels) * 100
             soil_percent = (segmentation['soil_pixels'] / total_pixels) * 100
             
-            damage_score = damaged_percent + (soil_percent * 0.7)
+            # The crop profile's class weights, already folded into one histogram dot product
+            damage_score = (segmentation['weighted_damage_pixels'] / total_pixels) * 100
             
             if damage_score < 15:
                 severity = 'minimal'
@@ -261,7 +281,8 @@ class DamageAnalyzer:
                 'segmentation': {
                     'healthy_percent': round(healthy_percent, 2),
                     'damaged_percent': round(damaged_percent, 2),
-                    'soil_exposed_percent': round(soil_percent, 2)
+                    'soil_exposed_percent': round(soil_percent, 2),
+                    'crop_profile': segmentation['crop_profile']
                 },
                 'damage_assessment': {
                     'calculated_damage_percent': round(damage_score, 2),
@@ -275,25 +296,20 @@ class DamageAnalyzer:
             return {'error': str(e), 'available': False, 'damage_assessment': {'calculated_damage_percent': 0, 'confidence': 0.3}}
     
     @staticmethod
-    def _segment_image(hsv, crop_type):
-        """Segment image"""
-        healthy_mask = cv2.inRange(hsv, (35, 40, 40), (85, 255, 255))
-        damaged_mask = cv2.inRange(hsv, (10, 40, 40), (35, 255, 255))
-        soil_mask = cv2.inRange(hsv, (0, 0, 0), (25, 100, 150))
-        
-        return {
-            'healthy_pixels': int(np.sum(healthy_mask > 0)),
-            'damaged_pixels': int(np.sum(damaged_mask > 0)),
-            'soil_pixels': int(np.sum(soil_mask > 0))
-        }
+    def _segment_image(img, crop_type):
+        """Segment image with the crop's profile (slice sums over the image's HSV histogram)"""
+        profile = crop_profile(crop_type)
+        segmentation = profile.segment(ImageContext.of(img).hsv_histogram)
+        segmentation['crop_profile'] = profile.name
+        return segmentation
     
     @staticmethod
     def _classify_damage_type(img, segmentation):
         """Classify damage type"""
         try:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            edges = cv2.Canny(gray, 50, 150)
-            edge_density = np.sum(edges > 0) / (img.shape[0] * img.shape[1])
+            img = ImageContext.of(img)
+            edges = img.canny
+            edge_density = np.sum(edges > 0) / img.pixel_count
             
             if edge_density > 0.15:
                 return {'type': 'pest_attack', 'confidence': 0.7}
@@ -310,46 +326,52 @@ class ExternalValidator:
     @staticmethod
     def validate_with_weather(coords, date_iso, claimed_reason):
         """Fetch and validate weather"""
-        if not REQUESTS_AVAILABLE:
-            return {'success': False, 'error': 'Requests library not available', 'supports_claim': False}
-        
         try:
             api_key = os.getenv('RAPIDAPI_KEY')
             if not api_key:
-                log_debug("Weather API key not configured - skipping")
-                return {'success': False, 'error': 'API key not configured', 'supports_claim': False}
-            
-            url = "https://meteostat.p.rapidapi.com/point/daily"
-            params = {'lat': coords['lat'], 'lon': coords['lon'], 'start': date_iso, 'end': date_iso}
-            headers = {'x-rapidapi-key': api_key, 'x-rapidapi-host': 'meteostat.p.rapidapi.com'}
+                log_debug("Weather API key not configured - using Open-Meteo only")
             
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+            # Capture day plus the 30 days before it, Meteostat hedged to Open-Meteo;
+            # shared with every claim in the same weather cell and day
+            weather = fetch_weather_window(coords['lat'], coords['lon'], date_iso, api_key, timeout=10)
+            supports = ExternalValidator._analyze_weather_support(weather, claimed_reason)
             
-            if response.status_code == 200:
-                data = response.json()
-                if 'data' in data and len(data['data']) > 0:
-                    weather = data['data'][0]
-                    supports = ExternalValidator._analyze_weather_support(weather, claimed_reason)
-                    
-                    return {
-                        'success': True,
-                        'weather_data': weather,
-                        'supports_claim': supports['supports'],
-                        'reasoning': supports['reasoning']
-                    }
-            
-            return {'success': False, 'error': f'API error: {response.status_code}', 'supports_claim': False}
+            return {
+                'success': True,
+                'weather_data': weather,
+                'supports_claim': supports['supports'],
+                'reasoning': supports['reasoning']
+            }
             
+        except (MeteostatError, OpenMeteoError) as e:
+            return {'success': False, 'error': f'API error: {e.status_code}', 'supports_claim': False}
         except Exception as e:
             log_debug(f"Weather API error: {str(e)}")
             return {'success': False, 'error': str(e), 'supports_claim': False}
     
+    @staticmethod
+    async def validate_with_weather_async(coords, date_iso, claimed_reason):
+        """Coroutine form of validate_with_weather"""
+        return await asyncio.to_thread(ExternalValidator.validate_with_weather, coords, date_iso, claimed_reason)
+    
+    @staticmethod
+    def start_validation(coords, date_iso, claimed_reason, deadline_s=None):
+        """Start weather validation in the background; join it with .result(default)"""
+        return run_in_background(
+            ExternalValidator.validate_with_weather_async(coords, date_iso, claimed_reason),
+            WEATHER_DEADLINE_S if deadline_s is None else deadline_s
+        )
+    
     @staticmethod
     def _analyze_weather_support(weather_data, claimed_reason):
         """Analyze weather support"""
-        humidity = weather_data.get('rhum', 50)
-        temp_avg = weather_data.get('tavg', 25)
-        rainfall = weather_data.get('prcp', 0)
+        # Providers report missing observations as null
+        humidity = weather_data.get('rhum') if weather_data.get('rhum') is not None else 50
+        temp_avg = weather_data.get('tavg') if weather_data.get('tavg') is not None else 25
+        rainfall = weather_data.get('prcp') if weather_data.get('prcp') is not None else 0
+        rain_7d = weather_data.get('rain_7d_mm')
+        rain_30d = weather_data.get('rain_30d_mm')
+        heat_days = weather_data.get('heat_days_30d')
         
         reasoning = []
         supports = False
@@ -365,10 +387,19 @@ class ExternalValidator:
             if rainfall < 5 and humidity < 40:
                 reasoning.append(f"Low rainfall ({rainfall}mm)")
                 supports = True
+            if rain_30d is not None and rain_30d < DROUGHT_RAIN_30D_MM:
+                reasoning.append(f"Only {rain_30d}mm of rain in the last 30 days")
+                supports = True
+            if heat_days is not None and heat_days >= DROUGHT_HEAT_DAYS_30D:
+                reasoning.append(f"{heat_days} heat days in the last 30 days")
+                supports = True
         elif claimed_reason == 'flood':
             if rainfall > 50:
                 reasoning.append(f"Heavy rainfall ({rainfall}mm)")
                 supports = True
+            if rain_7d is not None and rain_7d > FLOOD_RAIN_7D_MM:
+                reasoning.append(f"{rain_7d}mm of rain in the last 7 days")
+                supports = True
         
         return {'supports': supports, 'reasoning': reasoning}
 
@@ -471,24 +502,29 @@ def process_claim(input_data):
         claim_data = input_data['claim_data']
         images = input_data['media_uploads']['images']
         
-        # Phase 1: Authenticity
+        # External validation starts now and is joined after the image phases
+        coords = {'lat': images[0]['capture_metadata']['gps_coordinates'][0],
+                 'lon': images[0]['capture_metadata']['gps_coordinates'][1]}
+        date_iso = datetime.fromtimestamp(images[0]['capture_metadata']['timestamp'] / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+        weather_task = ExternalValidator.start_validation(coords, date_iso, claim_data['claim_reason'])
+        
+        # Phases 1-2: authenticity and damage share one decode per image
         authenticity_results = []
+        damage_results = []
         for img in images:
-            auth = AuthenticityDetector.analyze_image_forensics(img['file_path'])
+            ctx = ImageContext(img['file_path'])
+            auth = AuthenticityDetector.analyze_image_forensics(ctx)
             loc = LocationValidator.validate_coordinates(
                 img['capture_metadata']['gps_coordinates'],
                 farmer_data['farm_location']['registered_coordinates']
             )
             authenticity_results.append({'image_id': img['image_id'], 'forensics': auth, 'location': loc})
+            damage = DamageAnalyzer.analyze_crop_damage(ctx, farmer_data['crop_details']['crop_type'])
+            damage_results.append({'image_id': img['image_id'], 'analysis': damage})
+            ctx.release()
         
         avg_authenticity = sum(r['forensics'].get('final_score', 0.5) for r in authenticity_results) / len(authenticity_results)
         
-        # Phase 2: Damage
-        damage_results = []
-        for img in images:
-            damage = DamageAnalyzer.analyze_crop_damage(img['file_path'], farmer_data['crop_details']['crop_type'])
-            damage_results.append({'image_id': img['image_id'], 'analysis': damage})
-        
         valid_damages = [r['analysis']['damage_assessment']['calculated_damage_percent'] 
                         for r in damage_results if r['analysis'].get('available')]
         avg_damage = sum(valid_damages) / len(valid_damages) if valid_damages else 0
@@ -504,10 +540,9 @@ def process_claim(input_data):
         }
         
         # Phase 3: External
-        coords = {'lat': images[0]['capture_metadata']['gps_coordinates'][0],
-                 'lon': images[0]['capture_metadata']['gps_coordinates'][1]}
-        date_iso = datetime.fromtimestamp(images[0]['capture_metadata']['timestamp'] / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
-        external = ExternalValidator.validate_with_weather(coords, date_iso, claim_data['claim_reason'])
+        external = weather_task.result(
+            {'success': False, 'error': 'Weather lookup deadline exceeded', 'supports_claim': False}
+        )
         
         # Phase 4: Fraud
         fraud = FraudDetector.analyze_fraud_patterns(farmer_data, claim_data, damage_summary)
@@ -546,16 +581,63 @@ def process_claim(input_data):
             }
         }
         
+        cache_stats = result_cache().stats()
+        if cache_stats.get('enabled'):
+            log_debug(f"Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        weather_stats = weather_cache().stats()
+        if weather_stats.get('enabled'):
+            log_debug(f"Weather cache: {weather_stats['hits']} hits, {weather_stats['misses']} misses")
+        for provider, stats in http_stats().items():
+            log_debug(f"HTTP {provider}: {stats['requests']} requests, {stats['retries']} retries, "
+                      f"p95 {stats['latency']['p95_ms']}ms")
+        
         return output
         
     except Exception as e:
         return {'error': str(e), 'timestamp': datetime.now(timezone.utc).isoformat()}
 
+def startup_profile_report():
+    """Report the capabilities found and what each stage adds on first use"""
+    return {
+        'capabilities': capabilities(),
+        'stage_imports': {stage: startup_profile(modules) for stage, modules in STAGE_MODULES.items()},
+    }
+
+def resolution_drift_analyzers():
+    """Colour-statistics analyzers with their declared reductions, for --resolution-drift"""
+    from modules.content import SCENE_REDUCTION, classify_scene
+    return {
+        # Uncached and without YOLO: only the pixel statistics depend on the decode scale
+        'scene': (lambda ctx, r: classify_scene.__wrapped__(ctx, None, r), SCENE_REDUCTION),
+        'damage': (lambda ctx, r: DamageAnalyzer.analyze_crop_damage(ctx, 'Unknown', r),
+                   DamageAnalyzer.SEGMENTATION_REDUCTION),
+    }
+
 def main():
     """Entry point"""
     try:
         if len(sys.argv) < 2:
-            safe_print_json({"error": "Usage: python devil_ai.py <input_json_file>"})
+            safe_print_json({"error": "Usage: python devil_ai.py <input_json_file> | --startup-profile | --cache-stats [--clear] | --resolution-drift <image>..."})
+            return
+
+        if sys.argv[1] == '--startup-profile':
+            safe_print_json(startup_profile_report())
+            return
+
+        if sys.argv[1] == '--cache-stats':
+            if '--clear' in sys.argv:
+                result_cache().clear()
+                weather_cache().clear()
+            report = result_cache().stats()
+            report['weather'] = weather_cache().stats()
+            report['http'] = http_stats()
+            report['weather_providers'] = weather_provider_stats()
+            safe_print_json(report)
+            return
+        
+        if sys.argv[1] == '--resolution-drift':
+            from modules.resolution_drift import resolution_drift_report
+            safe_print_json(resolution_drift_report(sys.argv[2:], resolution_drift_analyzers()))
             return
         
         with open(sys.argv[1], 'r') as f:
@@ -1,9 +1,17 @@
 # modules/authenticity.py
-import cv2, numpy as np, math
-from typing import Dict, Any, Tuple
+from __future__ import annotations
+from typing import Dict, Any, Tuple, Union
+from modules.block_stats import dct_coefficient_histogram
+from modules.cache import cached_stage
+from modules.image_context import ImageContext
+from modules.lazy_imports import lazy_import
+from modules.parallel import run_parallel
 
-def ela_score(img_bgr: np.ndarray, quality: int = 90) -> Dict[str, Any]:
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+def ela_score(img: Union[ImageContext, np.ndarray], quality: int = 90) -> Dict[str, Any]:
+    gray = ImageContext.of(img).gray
     _, enc = cv2.imencode('.jpg', gray, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
     dec = cv2.imdecode(enc, cv2.IMREAD_GRAYSCALE)
     diff = cv2.absdiff(gray, dec)
@@ -13,38 +21,36 @@ def ela_score(img_bgr: np.ndarray, quality: int = 90) -> Dict[str, Any]:
         'suspicious': float(np.std(diff)) > 10.0
     }
 
-def double_jpeg_indicator(img_bgr: np.ndarray) -> Dict[str, Any]:
+def double_jpeg_indicator(img: Union[ImageContext, np.ndarray]) -> Dict[str, Any]:
     # Simple DCT periodicity heuristic over 8x8 blocks
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    h, w = gray.shape
-    blocks = []
-    for y in range(0, h - 8, 8):
-        for x in range(0, w - 8, 8):
-            block = gray[y:y+8, x:x+8].astype(np.float32) - 128.0
-            dct = cv2.dct(block)
-            blocks.append(dct.flatten())
-    if not blocks:
+    gray = ImageContext.of(img).gray
+    hist, n_blocks = dct_coefficient_histogram(gray, 0, 1, bins=100, value_range=(-50, 50))  # one AC coeff
+    if not n_blocks:
         return {'evidence': 0.0, 'double_jpeg_likely': False}
-    coeffs = np.stack(blocks, axis=0)
-    hist = np.histogram(coeffs[:, 1], bins=100, range=(-50, 50))[0]  # one AC coeff
     periodicity = float(np.std(hist[::2]) - np.std(hist[1::2]))  # crude even/odd difference
     return {'evidence': periodicity, 'double_jpeg_likely': periodicity > 5.0}
 
-def wavelet_noise_residual(img_bgr: np.ndarray) -> Tuple[np.ndarray, float]:
+def wavelet_noise_residual(img: Union[ImageContext, np.ndarray]) -> Tuple[np.ndarray, float]:
     # High-pass residual as PRNU surrogate when no camera reference is available
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+    gray = ImageContext.of(img).gray
     blur = cv2.GaussianBlur(gray, (0,0), 1.0)
     residual = cv2.subtract(gray, blur)
     snr = float(np.std(residual) / (np.std(blur) + 1e-6))
     return residual, snr
 
-def analyze_image_forensics(image_path: str) -> Dict[str, Any]:
-    img = cv2.imread(image_path, cv2.IMREAD_COLOR)
-    if img is None:
+@cached_stage('authenticity.forensics', version=1)
+def analyze_image_forensics(image: Union[str, ImageContext]) -> Dict[str, Any]:
+    ctx = ImageContext.of(image)
+    if not ctx.loaded:
         return {'available': False, 'error': 'Could not load image', 'final_score': 0.0}
-    ela = ela_score(img)
-    dj = double_jpeg_indicator(img)
-    residual, snr = wavelet_noise_residual(img)
+    ctx.gray  # shared by all three checks; built once before they fan out
+    checks = run_parallel({
+        'ela': (ela_score, (ctx,)),
+        'double_jpeg': (double_jpeg_indicator, (ctx,)),
+        'residual': (wavelet_noise_residual, (ctx,)),
+    })
+    ela, dj = checks['ela'], checks['double_jpeg']
+    residual, snr = checks['residual']
 
     # Score aggregation
     score = 1.0
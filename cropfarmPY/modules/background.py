@@ -0,0 +1,42 @@
+# modules/background.py
+"""
+Background asyncio tasks joined with a deadline
+
+External lookups are started as soon as their inputs are known and joined
+only when their result is needed, so a slow API never holds up image work.
+"""
+import asyncio, threading, time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Coroutine
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    # One event loop on a daemon thread, shared by every task in the process
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='background-loop', daemon=True).start()
+    return _loop
+
+class BackgroundTask:
+    def __init__(self, coro: Coroutine, deadline_s: float):
+        self.started = time.monotonic()
+        self.deadline_s = deadline_s
+        self._future = asyncio.run_coroutine_threadsafe(coro, _background_loop())
+
+    def result(self, default: Any) -> Any:
+        # Wait until the deadline (counted from start); fall back to `default` on timeout or error
+        remaining = self.deadline_s - (time.monotonic() - self.started)
+        try:
+            return self._future.result(timeout=max(0.0, remaining))
+        except FutureTimeoutError:
+            self._future.cancel()
+        except Exception:
+            pass
+        return default
+
+def run_in_background(coro: Coroutine, deadline_s: float) -> BackgroundTask:
+    return BackgroundTask(coro, deadline_s)
@@ -0,0 +1,100 @@
+# modules/block_stats.py
+"""
+Vectorized 8x8 block statistics
+
+Views a grayscale image as a (rows, cols, 8, 8) grid of blocks without copying
+it and computes per-block variance and DCT coefficients in bulk NumPy
+operations instead of one Python iteration per block. The grid reproduces the
+`for y in range(0, h - 8, 8)` loops the analyzers were written with, including
+the last row/column of blocks those loops skip.
+"""
+from __future__ import annotations
+from functools import lru_cache
+from typing import Optional, Tuple
+from modules.integral_image import IntegralImage
+from modules.lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+BLOCK = 8
+# Coefficients this close to a histogram edge are recomputed with cv2.dct so
+# they land in exactly the bin the per-block float32 transform would give
+DCT_EDGE_TOLERANCE = 1e-3
+
+def block_grid(shape: Tuple[int, ...]) -> Tuple[int, int]:
+    h, w = shape[:2]
+    return len(range(0, h - BLOCK, BLOCK)), len(range(0, w - BLOCK, BLOCK))
+
+def block_view(gray: np.ndarray) -> np.ndarray:
+    # (rows, cols, 8, 8) read-only strided view; block [i, j] is gray[8i:8i+8, 8j:8j+8]
+    nby, nbx = block_grid(gray.shape)
+    s0, s1 = gray.strides
+    return np.lib.stride_tricks.as_strided(gray, shape=(nby, nbx, BLOCK, BLOCK),
+                                           strides=(BLOCK * s0, BLOCK * s1, s0, s1), writeable=False)
+
+def block_variance(gray: np.ndarray, integral: Optional[IntegralImage] = None) -> np.ndarray:
+    """
+    Population variance of every block, shape (rows, cols).
+    For 8-bit input the sums are exact integers, so var = (n*S2 - S1^2) / n^2 is
+    bit-for-bit what np.var(block.astype(float)) returns for each block.
+    Given the plane's IntegralImage, the block sums are read from its tables.
+    """
+    if gray.dtype != np.uint8:
+        return block_view(gray).astype(np.float64).var(axis=(2, 3))
+    n = BLOCK * BLOCK
+    if integral is not None:
+        nby, nbx = block_grid(gray.shape)
+        s1, s2, _ = integral.grid_sums(np.arange(nby + 1) * BLOCK, np.arange(nbx + 1) * BLOCK)
+        return (n * s2 - s1 * s1) / float(n * n)
+    blocks = block_view(gray)
+    s1 = blocks.sum(axis=(2, 3), dtype=np.int64)
+    squares = block_view(gray.astype(np.uint16) ** 2)  # 255^2 fits in uint16
+    s2 = squares.sum(axis=(2, 3), dtype=np.int64)
+    return (n * s2 - s1 * s1) / float(n * n)
+
+@lru_cache(maxsize=None)
+def dct_matrix(n: int = BLOCK) -> np.ndarray:
+    # Orthonormal DCT-II basis (row u = frequency u), the transform cv2.dct applies
+    x = np.arange(n)
+    m = np.cos(np.pi * (2 * x[None, :] + 1) * x[:, None] / (2 * n)) * np.sqrt(2.0 / n)
+    m[0, :] = np.sqrt(1.0 / n)
+    m.setflags(write=False)
+    return m
+
+def block_dct(gray: np.ndarray, offset: float = 128.0) -> np.ndarray:
+    # Full 2-D DCT of every (block - offset), shape (rows, cols, 8, 8), as one batched matmul
+    c = dct_matrix()
+    blocks = block_view(gray).astype(np.float64) - offset
+    return c @ blocks @ c.T
+
+def block_dct_coefficient(gray: np.ndarray, u: int, v: int, offset: float = 128.0) -> np.ndarray:
+    # DCT coefficient [u, v] of every (block - offset), shape (rows, cols), without the full transform
+    c = dct_matrix()
+    nby, nbx = block_grid(gray.shape)
+    bands = gray[:nby * BLOCK, :nbx * BLOCK].reshape(nby, BLOCK, nbx, BLOCK)
+    coeff = np.einsum('y,iyjx,x->ij', c[u], bands, c[v], dtype=np.float64)
+    return coeff - offset * c[u].sum() * c[v].sum()
+
+def dct_coefficient_histogram(gray: np.ndarray, u: int, v: int, bins: int, value_range: Tuple[float, float],
+                              offset: float = 128.0) -> Tuple[np.ndarray, int]:
+    """
+    np.histogram of DCT coefficient [u, v] over all blocks, identical to histogramming
+    the float32 cv2.dct results block by block. Returns (counts, block count).
+    """
+    coeff = block_dct_coefficient(gray, u, v, offset)
+    lo, hi = value_range
+    width = (hi - lo) / bins
+    steps = (coeff - lo) / width
+    near_edge = ((np.abs(steps - np.round(steps)) * width < DCT_EDGE_TOLERANCE)
+                 & (coeff > lo - DCT_EDGE_TOLERANCE) & (coeff < hi + DCT_EDGE_TOLERANCE))
+    values = coeff.astype(np.float32)
+    if near_edge.any():
+        # Flat regions put many identical blocks on an edge; transform each distinct block once
+        edge_blocks = np.ascontiguousarray(block_view(gray)[near_edge])
+        keys = edge_blocks.reshape(-1, BLOCK * BLOCK).view(f'V{BLOCK * BLOCK * gray.itemsize}').ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        exact = np.array([cv2.dct(edge_blocks[k].astype(np.float32) - offset)[u, v] for k in first],
+                         dtype=np.float32)
+        values[near_edge] = exact[inverse.ravel()]
+    return np.histogram(values.ravel(), bins=bins, range=value_range)[0], int(coeff.size)
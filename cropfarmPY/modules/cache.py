@@ -0,0 +1,39 @@
+# modules/cache.py
+"""
+Result caching for per-image analyzers
+
+cached_stage wraps an analyzer so its result is stored in the shared
+content-hash keyed ResultCache (modules/result_cache.py) and a resubmitted
+photo skips the analysis.
+"""
+import functools, os
+from typing import Any, Callable, Dict, Optional
+from modules.image_context import image_path_of
+from modules.result_cache import result_cache
+
+def _cacheable(result: Any) -> bool:
+    # Errors and "library unavailable" results depend on the environment, not the image
+    return isinstance(result, dict) and 'error' not in result and result.get('available', True) is not False
+
+def cached_stage(stage: str, version: int, variant: Optional[Callable[..., str]] = None):
+    """
+    Cache a per-image analyzer whose first argument is an image path or ImageContext.
+    `variant(*args)` adds anything else the result depends on (e.g. which detector ran).
+    """
+    def decorator(func: Callable[..., Dict[str, Any]]):
+        @functools.wraps(func)
+        def wrapper(image, *args, **kwargs):
+            image_path = image_path_of(image)
+            if not image_path or not os.path.isfile(image_path):
+                return func(image, *args, **kwargs)
+            key = f"{stage}:{variant(image, *args, **kwargs)}" if variant else stage
+            cache = result_cache()
+            cached = cache.get(key, version, image_path)
+            if cached is not None:
+                return cached
+            result = func(image, *args, **kwargs)
+            if _cacheable(result):
+                cache.put(key, version, image_path, result)
+            return result
+        return wrapper
+    return decorator
@@ -1,27 +1,43 @@
 # modules/content.py
-import cv2, numpy as np
-from typing import Dict, Any, List
+from __future__ import annotations
+from typing import Dict, Any, List, Optional, Union
+from modules.cache import cached_stage
+from modules.hsv_histogram import band_mask
+from modules.image_context import ImageContext, analysis_reduction
+from modules.lazy_imports import lazy_import, has_capability
+from modules.tiled_stats import count_masks
 
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except Exception:
-    YOLO_AVAILABLE = False
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+ultralytics = lazy_import('ultralytics')
 
 COCO_PERSON_ID = 0
 COCO_ANIMAL_IDS = {15, 16, 17, 18, 19, 20, 21, 22, 23}  # cat,dog,horse,sheep,cow,elephant,bear,zebra,giraffe
+SCENE_REDUCTION = 4  # colour-mask percentages drift well under a point at 1/4 scale
 
 class ContentDetector:
     def __init__(self, model_name: str = "yolov8n.pt"):
-        self.model = YOLO(model_name) if YOLO_AVAILABLE else None
+        self.model_name = model_name
+        self._model = None
 
-    def detect_objects(self, image_path: str) -> Dict[str, Any]:
-        img = cv2.imread(image_path)
-        if img is None:
+    @property
+    def model(self):
+        # YOLO weights are only loaded once a detection is actually requested
+        if self._model is None and has_capability('ultralytics'):
+            try:
+                self._model = ultralytics.YOLO(self.model_name)
+            except Exception:
+                self._model = None
+        return self._model
+
+    def detect_objects(self, image: Union[str, ImageContext]) -> Dict[str, Any]:
+        ctx = ImageContext.of(image)
+        if not ctx.loaded:
             return {'available': False, 'error': 'Could not load image'}
         people, animals = 0, 0
         if self.model:
-            res = self.model(image_path, verbose=False)
+            # YOLO takes the already decoded BGR array instead of reading the file again
+            res = self.model(ctx.bgr, verbose=False)
             for r in res:
                 for b in r.boxes:
                     cls_id = int(b.cls)
@@ -31,42 +47,40 @@ class ContentDetector:
                         animals += 1
         return {'available': True, 'people': people, 'animals': animals}
 
-def vegetation_mask(img_bgr: np.ndarray) -> np.ndarray:
-    b, g, r = cv2.split(img_bgr.astype(np.float32))
-    exg = 2*g - r - b
+def vegetation_mask(img: Union[ImageContext, np.ndarray]) -> np.ndarray:
+    # ExG spans -510..510, so int16 is exact and half the size of float32 planes
+    b, g, r = cv2.split(ImageContext.of(img).bgr)
+    exg = 2*g.astype(np.int16) - r - b
     mask = (exg > 20).astype(np.uint8)  # tune threshold per dataset
     return mask
 
-def water_mask(img_bgr: np.ndarray) -> np.ndarray:
-    hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
-    lower = np.array([85, 30, 30], dtype=np.uint8)   # cyan/blue
-    upper = np.array([130, 255, 255], dtype=np.uint8)
-    return cv2.inRange(hsv, lower, upper)
+def water_mask(img: Union[ImageContext, np.ndarray]) -> np.ndarray:
+    return band_mask(img, 'water')
+
+def fire_mask(img: Union[ImageContext, np.ndarray]) -> np.ndarray:
+    return band_mask(img, 'fire')
 
-def fire_mask(img_bgr: np.ndarray) -> np.ndarray:
-    hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
-    lower1 = np.array([0, 120, 180], dtype=np.uint8)
-    upper1 = np.array([25, 255, 255], dtype=np.uint8)
-    lower2 = np.array([160, 120, 180], dtype=np.uint8)
-    upper2 = np.array([179, 255, 255], dtype=np.uint8)
-    mask1 = cv2.inRange(hsv, lower1, upper1)
-    mask2 = cv2.inRange(hsv, lower2, upper2)
-    return cv2.bitwise_or(mask1, mask2)
+def _scene_variant(image: Union[str, ImageContext], yolo: ContentDetector, reduction: Optional[int] = None) -> str:
+    # People/animal counts depend on whether a detector could actually run; percentages on the decode scale
+    detector = yolo.model_name if yolo and has_capability('ultralytics') else 'no-detector'
+    return f"{detector}:1/{reduction or analysis_reduction(SCENE_REDUCTION)}"
 
-def classify_scene(image_path: str, yolo: ContentDetector) -> Dict[str, Any]:
-    img = cv2.imread(image_path)
-    if img is None:
+@cached_stage('content.scene', version=2, variant=_scene_variant)
+def classify_scene(image: Union[str, ImageContext], yolo: ContentDetector, reduction: Optional[int] = None) -> Dict[str, Any]:
+    ctx = ImageContext.of(image)
+    # Masks only count pixels, so they run on a reduced decode; YOLO keeps the full image
+    small = ctx.reduced(reduction or analysis_reduction(SCENE_REDUCTION))
+    if not small.loaded:
         return {'available': False, 'error': 'Could not load image'}
-    det = yolo.detect_objects(image_path) if yolo else {'people': 0, 'animals': 0, 'available': False}
-    veg = vegetation_mask(img)
-    wat = water_mask(img)
-    fir = fire_mask(img)
+    det = yolo.detect_objects(ctx) if yolo else {'people': 0, 'animals': 0, 'available': False}
+    # Water and fire come from the HSV histogram; ExG vegetation is an RGB test of its own
+    counts = small.hsv_histogram.counts_of(('water', 'fire'))
+    counts.update(count_masks(small, {'vegetation': vegetation_mask}))
 
-    h, w, _ = img.shape
-    area = h * w
-    veg_pct = float(100.0 * np.count_nonzero(veg) / area)
-    water_pct = float(100.0 * np.count_nonzero(wat) / area)
-    fire_pct = float(100.0 * np.count_nonzero(fir) / area)
+    area = small.pixel_count
+    veg_pct = float(100.0 * counts['vegetation'] / area)
+    water_pct = float(100.0 * counts['water'] / area)
+    fire_pct = float(100.0 * counts['fire'] / area)
 
     scenario = "pure_farm" if veg_pct > 40 and det['people'] == 0 and det['animals'] == 0 and water_pct < 5 and fire_pct < 1 else "mixed"
     if water_pct >= 10:
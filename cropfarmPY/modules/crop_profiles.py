@@ -0,0 +1,85 @@
+# modules/crop_profiles.py
+"""
+Per-crop segmentation profiles
+
+A profile holds the HSV ranges that count as healthy canopy, damaged tissue
+and exposed soil for one crop, and the weight each class carries in the
+damage score. Its bands are added to the shared HSV histogram's bin edges and
+the profile compiles into boolean slices of that histogram plus a per-bin
+weight map, so segmenting an image for any crop is a few slice sums and one
+dot product over the histogram it already has. Registering a crop adds bin
+edges, never another pass over the pixels.
+"""
+from __future__ import annotations
+from typing import Dict, Optional, Sequence, Tuple
+from modules.hsv_histogram import HSV_BANDS, HsvHistogram, HsvRange, band_selection, register_hsv_band
+from modules.lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+SEGMENT_CLASSES = ('healthy', 'damaged', 'soil')
+DEFAULT_DAMAGE_WEIGHTS = {'damaged': 1.0, 'soil': 0.7}
+
+class CropProfile:
+    def __init__(self, name: str, healthy: Sequence[HsvRange], damaged: Sequence[HsvRange],
+                 soil: Sequence[HsvRange], damage_weights: Optional[Dict[str, float]] = None):
+        self.name = name
+        self.ranges = {'healthy': list(healthy), 'damaged': list(damaged), 'soil': list(soil)}
+        self.damage_weights = dict(DEFAULT_DAMAGE_WEIGHTS if damage_weights is None else damage_weights)
+        self._compiled: Dict[Tuple, Tuple[Dict[str, np.ndarray], np.ndarray]] = {}
+
+    def compile(self, s_edges: Tuple[int, ...], v_edges: Tuple[int, ...]) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        # Class selections and the weight map, built on first use per histogram layout (NumPy stays lazy at import)
+        key = (s_edges, v_edges)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            selections = {cls: band_selection(self.ranges[cls], s_edges, v_edges) for cls in SEGMENT_CLASSES}
+            weights = np.zeros(next(iter(selections.values())).shape)
+            for cls, weight in self.damage_weights.items():
+                weights += weight * selections[cls]  # classes that overlap add up, as separate percentages would
+            compiled = self._compiled[key] = (selections, weights)
+        return compiled
+
+    def segment(self, hist: HsvHistogram) -> Dict[str, float]:
+        selections, weights = self.compile(hist.s_edges, hist.v_edges)
+        result = {f'{cls}_pixels': int(hist.counts[sel].sum()) for cls, sel in selections.items()}
+        result['weighted_damage_pixels'] = float(np.vdot(hist.counts, weights))
+        return result
+
+CROP_PROFILES: Dict[str, CropProfile] = {}
+
+def register_crop_profile(profile: CropProfile) -> CropProfile:
+    # Histograms built before a new crop's edges were added cannot serve it, so register at import time
+    for cls, ranges in profile.ranges.items():
+        key = f'{profile.name}.{cls}'
+        if HSV_BANDS.get(key) != ranges:
+            register_hsv_band(key, ranges)
+    CROP_PROFILES[profile.name] = profile
+    return profile
+
+def crop_profile(crop_type: Optional[str]) -> CropProfile:
+    return CROP_PROFILES.get((crop_type or '').strip().lower(), CROP_PROFILES['default'])
+
+_SOIL = [((0, 0, 0), (25, 100, 150))]
+
+register_crop_profile(CropProfile('default', HSV_BANDS['healthy'], HSV_BANDS['damaged'], HSV_BANDS['soil']))
+register_crop_profile(CropProfile(
+    'rice',
+    healthy=[((35, 40, 40), (90, 255, 255))],       # paddy canopy runs bluer than most crops
+    damaged=[((12, 40, 40), (35, 255, 255))],       # straw-yellow blight and drying
+    soil=_SOIL,
+    damage_weights={'damaged': 1.0, 'soil': 0.5},   # puddled fields show soil and water between hills
+))
+register_crop_profile(CropProfile(
+    'cotton',
+    healthy=[((35, 40, 40), (85, 255, 255))],
+    damaged=[((0, 60, 40), (9, 255, 220)), ((10, 40, 40), (35, 255, 255))],  # leaf reddening as well as yellowing
+    soil=_SOIL,
+))
+register_crop_profile(CropProfile(
+    'sugarcane',
+    healthy=[((30, 40, 40), (85, 255, 255))],       # young cane is yellow-green
+    damaged=[((10, 40, 40), (29, 255, 255))],
+    soil=_SOIL,
+    damage_weights={'damaged': 0.8, 'soil': 0.7},   # dry lower-leaf trash is normal in a standing crop
+))
@@ -1,24 +1,26 @@
 # modules/environment.py
-import os, requests
+import asyncio, os
 from typing import Dict, Any
+from modules.background import BackgroundTask, run_in_background
+from modules.weather_providers import (DROUGHT_HEAT_DAYS_30D, DROUGHT_RAIN_30D_MM, FLOOD_RAIN_7D_MM,
+                                       MeteostatError, OpenMeteoError, fetch_weather_window)
+
+# Seconds after which a claim continues without weather validation
+WEATHER_DEADLINE_S = float(os.getenv('WEATHER_DEADLINE_SECONDS', '5'))
+WEATHER_TIMEOUT_RESULT = {'success': False, 'error': 'weather_deadline_exceeded', 'supports_claim': False}
 
 def validate_with_weather(lat: float, lon: float, date_iso: str, claim_reason: str) -> Dict[str, Any]:
-    api_key = os.getenv('RAPIDAPI_KEY')
-    if not api_key:
-        return {'success': False, 'error': 'API key not configured', 'supports_claim': False}
-    url = "https://meteostat.p.rapidapi.com/point/daily"
-    params = {'lat': lat, 'lon': lon, 'start': date_iso, 'end': date_iso}
-    headers = {'x-rapidapi-key': api_key, 'x-rapidapi-host': 'meteostat.p.rapidapi.com'}
-    r = requests.get(url, params=params, headers=headers, timeout=15)
-    if r.status_code != 200:
-        return {'success': False, 'error': f'API {r.status_code}', 'supports_claim': False}
-    data = r.json().get('data', [])
-    if not data:
-        return {'success': False, 'error': 'no_data', 'supports_claim': False}
-    row = data[0]
+    # Without a RapidAPI key only the keyless Open-Meteo provider is used
+    try:
+        row = fetch_weather_window(lat, lon, date_iso, os.getenv('RAPIDAPI_KEY'), timeout=15)
+    except (MeteostatError, OpenMeteoError) as e:
+        return {'success': False, 'error': 'no_data' if e.status_code == 200 else str(e), 'supports_claim': False}
+    except Exception as e:
+        return {'success': False, 'error': str(e), 'supports_claim': False}
     hum = float(row.get('rhum', 50) or 50)
     tavg = float(row.get('tavg', 25) or 25)
     prcp = float(row.get('prcp', 0) or 0)
+    rain_7d, rain_30d, heat_days = row.get('rain_7d_mm'), row.get('rain_30d_mm'), row.get('heat_days_30d')
     supports = False
     reasons = []
     if claim_reason == 'pest_attack':
@@ -27,8 +29,25 @@ def validate_with_weather(lat: float, lon: float, date_iso: str, claim_reason: s
         supports = len(reasons) > 0
     elif claim_reason == 'drought':
         if prcp < 5 and hum < 40: reasons.append(f'low_rain_{prcp}_low_hum_{hum}')
+        if rain_30d is not None and rain_30d < DROUGHT_RAIN_30D_MM: reasons.append(f'low_rain_30d_{rain_30d}')
+        if heat_days is not None and heat_days >= DROUGHT_HEAT_DAYS_30D: reasons.append(f'heat_days_30d_{heat_days}')
         supports = len(reasons) > 0
     elif claim_reason == 'flood':
         if prcp > 50: reasons.append(f'heavy_rain_{prcp}')
+        if rain_7d is not None and rain_7d > FLOOD_RAIN_7D_MM: reasons.append(f'heavy_rain_7d_{rain_7d}')
         supports = len(reasons) > 0
-    return {'success': True, 'weather': {'rhum': hum, 'tavg': tavg, 'prcp': prcp}, 'supports_claim': supports, 'reasoning': reasons}
+    weather = {'rhum': hum, 'tavg': tavg, 'prcp': prcp, 'rain_7d_mm': rain_7d, 'rain_30d_mm': rain_30d,
+               'heat_days_30d': heat_days, 'source': row.get('source')}
+    return {'success': True, 'weather': weather, 'supports_claim': supports, 'reasoning': reasons}
+
+async def validate_with_weather_async(lat: float, lon: float, date_iso: str, claim_reason: str) -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(validate_with_weather, lat, lon, date_iso, claim_reason)
+    except Exception as e:
+        return {'success': False, 'error': str(e), 'supports_claim': False}
+
+def start_weather_validation(lat: float, lon: float, date_iso: str, claim_reason: str,
+                             deadline_s: float = None) -> BackgroundTask:
+    # Join with .result(WEATHER_TIMEOUT_RESULT) once the result is actually needed
+    return run_in_background(validate_with_weather_async(lat, lon, date_iso, claim_reason),
+                             WEATHER_DEADLINE_S if deadline_s is None else deadline_s)
@@ -0,0 +1,185 @@
+# Shared module: canonical copy in backend/worker/, vendored unchanged into cropfarmPY/modules/
+"""
+Vectorized geodesy for geofencing
+
+NumPy versions of the distance and point-in-polygon checks so N photo points
+are validated against a parcel in one call and shapely is not needed for an
+exact answer. All functions broadcast over their lat/lon arguments; rings are
+sequences of [lon, lat] pairs as in GeoJSON, closed or not.
+
+Boundary distances come from a ParcelFrame: the parcel projected once into an
+azimuthal equidistant frame centred on it, where distances are planar metres.
+Frames are kept in a small LRU keyed by the ring, so repeated checks against
+the same parcel only project the query points.
+"""
+
+import threading
+from collections import OrderedDict
+
+try:
+    from .lazy_imports import lazy_import    # cropfarmPY, imported as modules.geodesy
+except ImportError:
+    from lazy_imports import lazy_import     # worker, run from its own directory
+
+np = lazy_import('numpy')
+
+EARTH_RADIUS_M = 6371000.0
+# Points this close to an edge count as inside, like shapely's contains-or-touches
+BOUNDARY_TOLERANCE_M = 1e-3
+# Upper bound on points x edges evaluated at once, to keep the temporaries small
+MAX_PAIRS_PER_CHUNK = 1 << 21
+FRAME_CACHE_SIZE = 256
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres, element-wise over broadcastable arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def equirectangular_m(lat1, lon1, lat2, lon2):
+    """
+    Flat-earth distance in metres using the cosine of the mean latitude.
+
+    Cheaper than haversine (one cosine, no arcsin). Below 70 degrees latitude
+    it differs from haversine by less than 0.01 mm for distances up to 1 km
+    and less than 1 cm up to 10 km. It degrades near the poles and across the
+    antimeridian, so use haversine_m for anything else.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    x = (lon2 - lon1) * np.cos((lat1 + lat2) / 2.0)
+    y = lat2 - lat1
+    return EARTH_RADIUS_M * np.hypot(x, y)
+
+def _edges(ring):
+    """(start, end) vertex arrays of every polygon edge, shape (M, 2) each"""
+    ring = np.asarray(ring, dtype=np.float64)[:, :2]
+    if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+        return ring[:-1], ring[1:]
+    return ring, np.roll(ring, -1, axis=0)
+
+def _chunks(n_points, n_edges):
+    step = max(1, MAX_PAIRS_PER_CHUNK // max(1, n_edges))
+    for start in range(0, n_points, step):
+        yield slice(start, min(n_points, start + step))
+
+def _as_points(lats, lons):
+    return (np.atleast_1d(np.asarray(lats, dtype=np.float64)),
+            np.atleast_1d(np.asarray(lons, dtype=np.float64)))
+
+def points_in_polygon(lats, lons, ring):
+    """Even-odd ray casting in lon/lat for every point against every edge at once; boundary points are undefined"""
+    lats, lons = _as_points(lats, lons)
+    a, b = _edges(ring)
+    inside = np.zeros(lats.shape, dtype=bool)
+    for s in _chunks(len(lats), len(a)):
+        py, px = lats[s, None], lons[s, None]
+        crosses = (a[:, 1] > py) != (b[:, 1] > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = a[:, 0] + (py - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+        inside[s] = np.count_nonzero(crosses & (px < x_cross), axis=1) % 2 == 1
+    return inside
+
+class ParcelFrame:
+    """
+    A parcel ring projected into a spherical azimuthal equidistant frame centred
+    on its bounding box. Distances from the centre are exact; within a few
+    kilometres of the parcel the planar distances differ from great-circle ones
+    by well under a millimetre.
+    """
+
+    def __init__(self, ring):
+        self.ring = np.asarray(ring, dtype=np.float64)[:, :2]
+        lons, lats = self.ring[:, 0], self.ring[:, 1]
+        self.lat0 = (lats.min() + lats.max()) / 2.0
+        self.lon0 = (lons.min() + lons.max()) / 2.0
+        self._sin0, self._cos0 = np.sin(np.radians(self.lat0)), np.cos(np.radians(self.lat0))
+        x, y = self.project(lats, lons)
+        self.a, self.b = _edges(np.column_stack([x, y]))
+
+    def project(self, lats, lons):
+        """(x, y) in metres east/north of the frame centre"""
+        phi, dlam = np.radians(lats), np.radians(np.asarray(lons) - self.lon0)
+        sin_phi, cos_phi, cos_dlam = np.sin(phi), np.cos(phi), np.cos(dlam)
+        cos_c = np.clip(self._sin0 * sin_phi + self._cos0 * cos_phi * cos_dlam, -1.0, 1.0)
+        c = np.arccos(cos_c)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = np.where(c > 1e-12, c / np.sin(c), 1.0)
+        x = EARTH_RADIUS_M * k * cos_phi * np.sin(dlam)
+        y = EARTH_RADIUS_M * k * (self._cos0 * sin_phi - self._sin0 * cos_phi * cos_dlam)
+        return x, y
+
+    def unproject(self, x, y):
+        """(lat, lon) of frame coordinates"""
+        rho = np.hypot(x, y)
+        c = rho / EARTH_RADIUS_M
+        sin_c, cos_c = np.sin(c), np.cos(c)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sin_phi = np.where(rho > 0, cos_c * self._sin0 + y * sin_c * self._cos0 / rho, self._sin0)
+        lat = np.degrees(np.arcsin(np.clip(sin_phi, -1.0, 1.0)))
+        lon = self.lon0 + np.degrees(np.arctan2(x * sin_c, rho * self._cos0 * cos_c - y * self._sin0 * sin_c))
+        return lat, lon
+
+    def nearest(self, lats, lons):
+        """(metres, nearest_lat, nearest_lon) from every point to the closest point on the boundary"""
+        lats, lons = _as_points(lats, lons)
+        px, py = self.project(lats, lons)
+        a, b = self.a, self.b
+        d = b - a
+        length2 = np.einsum('ij,ij->i', d, d)
+        dist = np.empty(lats.shape)
+        nx = np.empty(lats.shape)
+        ny = np.empty(lats.shape)
+        for s in _chunks(len(lats), len(a)):
+            rx, ry = px[s, None] - a[:, 0], py[s, None] - a[:, 1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = np.where(length2 > 0, (rx * d[:, 0] + ry * d[:, 1]) / length2, 0.0)
+            t = np.clip(t, 0.0, 1.0)
+            ex, ey = rx - t * d[:, 0], ry - t * d[:, 1]
+            e2 = ex * ex + ey * ey
+            best = np.argmin(e2, axis=1)
+            rows = np.arange(len(best))
+            bt = t[rows, best]
+            dist[s] = np.sqrt(e2[rows, best])
+            nx[s] = a[best, 0] + bt * d[best, 0]
+            ny[s] = a[best, 1] + bt * d[best, 1]
+        near_lat, near_lon = self.unproject(nx, ny)
+        return dist, near_lat, near_lon
+
+    def validate(self, lats, lons):
+        """(inside, metres to the boundary) for every point; the distance is 0 for inside points"""
+        dist, _, _ = self.nearest(lats, lons)
+        inside = points_in_polygon(lats, lons, self.ring) | (dist <= BOUNDARY_TOLERANCE_M)
+        return inside, np.where(inside, 0.0, dist)
+
+_frames = OrderedDict()
+_frames_lock = threading.Lock()
+
+def parcel_frame(ring):
+    """Process-wide ParcelFrame for a ring, built once and kept in an LRU"""
+    key = np.ascontiguousarray(np.asarray(ring, dtype=np.float64)[:, :2]).tobytes()
+    with _frames_lock:
+        frame = _frames.get(key)
+        if frame is not None:
+            _frames.move_to_end(key)
+            return frame
+    frame = ParcelFrame(ring)
+    with _frames_lock:
+        _frames[key] = frame
+        while len(_frames) > FRAME_CACHE_SIZE:
+            _frames.popitem(last=False)
+    return frame
+
+def distance_to_boundary(lats, lons, ring):
+    """(metres, nearest_lat, nearest_lon) arrays from every point to the ring's boundary"""
+    return parcel_frame(ring).nearest(lats, lons)
+
+def boundary_distance_m(lat, lon, ring):
+    """Metres from one point to the ring's boundary"""
+    return float(distance_to_boundary([lat], [lon], ring)[0][0])
+
+def validate_points(lats, lons, ring):
+    """
+    Geofence N points against one polygon in a single call.
+    Returns (inside, metres to the boundary) arrays; the distance is 0 for inside points.
+    """
+    return parcel_frame(ring).validate(lats, lons)
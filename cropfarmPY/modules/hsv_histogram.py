@@ -0,0 +1,109 @@
+# modules/hsv_histogram.py
+"""
+Single-pass HSV histogram for colour-band pixel counts
+
+Each image is binned once into a compact 3-D histogram (every hue x a few
+saturation x a few value bins) and a band's pixel count is a sum over a slice
+of it, instead of one cv2.inRange mask and count per band. Saturation and
+value bin edges sit at the bounds of every band in HSV_BANDS, so the slice
+sums equal the inRange counts exactly and a new band only adds edges.
+"""
+from __future__ import annotations
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+from modules.image_context import ImageContext
+from modules.lazy_imports import lazy_import
+from modules.tiled_stats import row_bands
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+HsvRange = Tuple[Tuple[int, int, int], Tuple[int, int, int]]  # inclusive (lower, upper), OpenCV scale (H 0-179)
+
+HSV_BANDS: Dict[str, List[HsvRange]] = {
+    'healthy': [((35, 40, 40), (85, 255, 255))],
+    'damaged': [((10, 40, 40), (35, 255, 255))],
+    'soil': [((0, 0, 0), (25, 100, 150))],
+    'water': [((85, 30, 30), (130, 255, 255))],      # cyan/blue
+    'fire': [((0, 120, 180), (25, 255, 255)), ((160, 120, 180), (179, 255, 255))],
+}
+HUE_BINS = 180
+CALCHIST_EXACT_PIXELS = 1 << 24  # calcHist counts in float32, exact up to 2**24 per bin
+
+def register_hsv_band(name: str, ranges: Sequence[HsvRange]) -> None:
+    # Histograms built before this call keep their edges and reject the new band
+    HSV_BANDS[name] = list(ranges)
+    _layout.cache_clear()
+
+def _edges(axis: int) -> Tuple[int, ...]:
+    # A cut at every band bound on this axis, so each band covers whole bins
+    cuts = {0, 256}
+    for ranges in HSV_BANDS.values():
+        for lower, upper in ranges:
+            cuts.update((lower[axis], upper[axis] + 1))
+    return tuple(sorted(cuts))
+
+@lru_cache(maxsize=None)
+def _layout() -> Tuple[Tuple[int, ...], Tuple[int, ...], np.ndarray]:
+    s_edges, v_edges = _edges(1), _edges(2)
+    levels = np.arange(256)
+    lut = np.empty((256, 1, 3), np.uint8)  # hue kept as is, S and V mapped to their bin index
+    lut[:, 0, 0] = levels
+    lut[:, 0, 1] = np.searchsorted(s_edges, levels, side='right') - 1
+    lut[:, 0, 2] = np.searchsorted(v_edges, levels, side='right') - 1
+    return s_edges, v_edges, lut
+
+def _bins(edges: Tuple[int, ...], lo: int, hi: int) -> slice:
+    try:
+        return slice(edges.index(lo), edges.index(hi + 1))
+    except ValueError:
+        raise ValueError(f"range {lo}-{hi} does not fall on histogram bin edges {edges}") from None
+
+def band_selection(ranges: Sequence[HsvRange], s_edges: Tuple[int, ...], v_edges: Tuple[int, ...]) -> np.ndarray:
+    # Union of the ranges as a boolean over bins, so overlapping ranges are not counted twice
+    sel = np.zeros((HUE_BINS, len(s_edges) - 1, len(v_edges) - 1), bool)
+    for lower, upper in ranges:
+        sel[lower[0]:upper[0] + 1, _bins(s_edges, lower[1], upper[1]), _bins(v_edges, lower[2], upper[2])] = True
+    return sel
+
+class HsvHistogram:
+    def __init__(self, counts: np.ndarray, s_edges: Tuple[int, ...], v_edges: Tuple[int, ...]):
+        self.counts = counts
+        self.s_edges = s_edges
+        self.v_edges = v_edges
+
+    @classmethod
+    def of(cls, image) -> 'HsvHistogram':
+        ctx = ImageContext.of(image)
+        s_edges, v_edges, lut = _layout()
+        shape = [HUE_BINS, len(s_edges) - 1, len(v_edges) - 1]
+        ranges = [0, shape[0], 0, shape[1], 0, shape[2]]
+        counts = np.zeros(shape, np.int64)
+        for band in row_bands(ctx):
+            binned = cv2.LUT(band.hsv, lut)
+            step = max(1, CALCHIST_EXACT_PIXELS // binned.shape[1])
+            for top in range(0, binned.shape[0], step):
+                counts += cv2.calcHist([binned[top:top + step]], [0, 1, 2], None, shape, ranges).astype(np.int64)
+        return cls(counts, s_edges, v_edges)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def selection(self, ranges: Sequence[HsvRange]) -> np.ndarray:
+        return band_selection(ranges, self.s_edges, self.v_edges)
+
+    def count(self, band: str) -> int:
+        return int(self.counts[self.selection(HSV_BANDS[band])].sum())
+
+    def counts_of(self, bands: Sequence[str]) -> Dict[str, int]:
+        return {band: self.count(band) for band in bands}
+
+def band_mask(image, band: str) -> np.ndarray:
+    # Per-pixel mask for callers that need locations rather than counts
+    hsv = ImageContext.of(image).hsv
+    mask = None
+    for lower, upper in HSV_BANDS[band]:
+        part = cv2.inRange(hsv, np.array(lower, np.uint8), np.array(upper, np.uint8))
+        mask = part if mask is None else cv2.bitwise_or(mask, part)
+    return mask
@@ -0,0 +1,145 @@
+# modules/image_context.py
+"""
+Decode-once image context shared by every analyzer
+
+An ImageContext decodes its image on first use and memoizes the derived planes
+(grayscale, HSV, Laplacian, Canny edges), so forensics, scene classification,
+object detection and damage analysis all work from the same buffers instead
+of each calling cv2.imread and cvtColor again.
+
+Colour-statistics analyzers that only count pixels can work from a reduced
+context (ctx.reduced(4)): JPEGs are then decoded straight at 1/2, 1/4 or 1/8
+scale in the DCT domain, which costs a fraction of the full decode's CPU and
+memory. Each analyzer declares the coarsest reduction its statistics tolerate;
+IMAGE_ANALYSIS_REDUCTION caps it (1 analyses everything at full resolution).
+"""
+from __future__ import annotations
+import os
+from functools import cached_property
+from typing import Dict, Optional, Tuple, Union
+from modules.integral_image import IntegralImage
+from modules.lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+CANNY_THRESHOLDS = (50, 150)
+REDUCTIONS = (1, 2, 4, 8)   # scales the JPEG decoder can produce directly
+ANALYSIS_REDUCTION = int(os.getenv('IMAGE_ANALYSIS_REDUCTION', '8'))
+
+def analysis_reduction(declared: int) -> int:
+    # The analyzer's declared reduction, capped by the configured one
+    factor = max(1, min(declared, ANALYSIS_REDUCTION))
+    return max(r for r in REDUCTIONS if r <= factor)
+
+class ImageContext:
+    def __init__(self, path: Optional[str] = None, bgr: Optional[np.ndarray] = None, reduction: int = 1):
+        self.path = path
+        self.reduction = reduction
+        self._reduced: Dict[int, 'ImageContext'] = {}
+        if bgr is not None:
+            self.__dict__['bgr'] = bgr
+
+    @classmethod
+    def of(cls, image: Union[str, 'ImageContext', np.ndarray]) -> 'ImageContext':
+        # Analyzers accept a path, an already decoded BGR array or a shared context
+        if isinstance(image, ImageContext):
+            return image
+        if isinstance(image, str):
+            return cls(path=image)
+        return cls(bgr=image)
+
+    @cached_property
+    def bgr(self) -> Optional[np.ndarray]:
+        # None when the file cannot be decoded, matching cv2.imread
+        if not self.path:
+            return None
+        if self.reduction == 1:
+            return cv2.imread(self.path, cv2.IMREAD_COLOR)
+        return cv2.imread(self.path, getattr(cv2, f'IMREAD_REDUCED_COLOR_{self.reduction}'))
+
+    def reduced(self, factor: int) -> 'ImageContext':
+        # Context at 1/factor scale, memoized; from a path it never touches the full decode
+        if factor <= 1:
+            return self
+        ctx = self._reduced.get(factor)
+        if ctx is None:
+            if self.path:
+                ctx = ImageContext(self.path, reduction=factor)
+            else:
+                # In-memory images have no compressed form to shrink, so resample instead
+                small = None
+                if self.bgr is not None:
+                    h, w = self.bgr.shape[:2]
+                    small = cv2.resize(self.bgr, (max(1, -(-w // factor)), max(1, -(-h // factor))),
+                                       interpolation=cv2.INTER_AREA)
+                ctx = ImageContext(bgr=small, reduction=factor)
+            self._reduced[factor] = ctx
+        return ctx
+
+    @property
+    def loaded(self) -> bool:
+        return self.bgr is not None
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.bgr.shape
+
+    @property
+    def pixel_count(self) -> int:
+        return self.bgr.shape[0] * self.bgr.shape[1]
+
+    @cached_property
+    def gray(self) -> np.ndarray:
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+
+    @cached_property
+    def hsv(self) -> np.ndarray:
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV)
+
+    @cached_property
+    def value(self) -> np.ndarray:
+        # HSV V is the largest of B, G and R, so it needs no full HSV conversion
+        if 'hsv' in self.__dict__:
+            return np.ascontiguousarray(self.hsv[:, :, 2])
+        b, g, r = cv2.split(self.bgr)
+        return cv2.max(cv2.max(b, g), r)
+
+    @cached_property
+    def laplacian(self) -> np.ndarray:
+        return cv2.Laplacian(self.gray, cv2.CV_64F)
+
+    @cached_property
+    def canny(self) -> np.ndarray:
+        return cv2.Canny(self.gray, *CANNY_THRESHOLDS)
+
+    @cached_property
+    def gray_integral(self) -> IntegralImage:
+        # Summed-area tables of the grayscale plane, shared by block and regional statistics
+        return IntegralImage(self.gray)
+
+    @cached_property
+    def value_integral(self) -> IntegralImage:
+        # Summed-area tables of HSV V, for brightness statistics over regions
+        return IntegralImage(self.value)
+
+    @cached_property
+    def hsv_histogram(self) -> 'HsvHistogram':
+        # Every HSV band count for this image comes from this one pass
+        from modules.hsv_histogram import HsvHistogram
+        return HsvHistogram.of(self)
+
+    def release(self) -> None:
+        # Drop the derived planes (and the decode, when it can be redone from the path)
+        for name in ('gray', 'hsv', 'value', 'laplacian', 'canny', 'gray_integral', 'value_integral', 'hsv_histogram'):
+            self.__dict__.pop(name, None)
+        if self.path:
+            self.__dict__.pop('bgr', None)
+        for ctx in self._reduced.values():
+            ctx.release()
+        self._reduced.clear()
+
+def image_path_of(image: Union[str, ImageContext, np.ndarray]) -> Optional[str]:
+    if isinstance(image, ImageContext):
+        return image.path
+    return image if isinstance(image, str) else None
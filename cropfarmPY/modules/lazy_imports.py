@@ -0,0 +1,100 @@
+# Shared module: canonical copy in backend/worker/, vendored unchanged into cropfarmPY/modules/
+"""
+Lazy imports and capability probing
+
+Heavy libraries are only imported the first time a stage touches them, so the
+metadata/geofence path starts without paying for NumPy, OpenCV, shapely,
+torch or YOLO.
+"""
+
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+from functools import lru_cache
+
+# Capability name -> modules that must all be importable
+CAPABILITY_MODULES = {
+    'pil': ('PIL',),
+    'numpy': ('numpy',),
+    'shapely': ('shapely',),
+    'torch': ('torch', 'torchvision'),
+    'cv2': ('cv2', 'numpy'),
+    'requests': ('requests',),
+    'exif': ('exif',),
+    'ultralytics': ('ultralytics',),
+}
+
+# Module name -> seconds spent importing it (first import only)
+IMPORT_TIMES = {}
+
+_import_lock = threading.RLock()
+
+def import_timed(name):
+    """Import a module, recording how long the first import took"""
+    # import_module (rather than a sys.modules lookup) waits for a module that
+    # another thread is still initialising instead of returning it half-built
+    with _import_lock:
+        already_loaded = name in sys.modules
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        if not already_loaded:
+            IMPORT_TIMES[name] = time.perf_counter() - start
+    return module
+
+class LazyModule:
+    """Module proxy that performs the real import on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = import_timed(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule {self._name} ({state})>"
+
+def lazy_import(name):
+    """Return a proxy for `name` that imports it on first use"""
+    return LazyModule(name)
+
+@lru_cache(maxsize=None)
+def has_capability(name):
+    """Check (once per process) whether a capability's modules are installed, without importing them"""
+    try:
+        return all(importlib.util.find_spec(mod) is not None for mod in CAPABILITY_MODULES[name])
+    except (ImportError, ValueError):
+        return False
+
+def capabilities():
+    """Return the cached availability of every known capability"""
+    return {name: has_capability(name) for name in CAPABILITY_MODULES}
+
+def startup_profile(modules):
+    """
+    Import each module in order and report the time it cost
+
+    Modules already loaded before the call are reported as preloaded; shared
+    dependencies are charged to the first module that pulls them in.
+    """
+    report = []
+    for name in modules:
+        if name in sys.modules:
+            report.append({'module': name, 'import_ms': round(IMPORT_TIMES.get(name, 0.0) * 1000.0, 2),
+                           'preloaded': True})
+            continue
+        try:
+            import_timed(name)
+            report.append({'module': name, 'import_ms': round(IMPORT_TIMES[name] * 1000.0, 2),
+                           'preloaded': False})
+        except ImportError as e:
+            report.append({'module': name, 'import_ms': None, 'error': str(e)})
+    return report
@@ -1,11 +1,13 @@
 # modules/metadata.py
 from typing import Dict, Any
-from exif import Image as ExifImage
+from modules.lazy_imports import lazy_import
+
+exif = lazy_import('exif')
 
 def read_exif(image_path: str) -> Dict[str, Any]:
     try:
         with open(image_path, 'rb') as f:
-            img = ExifImage(f)
+            img = exif.Image(f)
         if not img.has_exif:
             return {'has_exif': False, 'anomalies': ['no_exif']}
         meta = {
@@ -0,0 +1,44 @@
+# modules/parallel.py
+"""
+Shared thread pool for per-image sub-analyses
+
+Forensic checks spend nearly all their time inside OpenCV/NumPy calls that
+release the GIL, so running them on threads overlaps them on multi-core hosts.
+One pool is shared by every analyzer in the process. Its size and OpenCV's
+own worker count are set together so the two do not oversubscribe the cores.
+"""
+import os, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+from modules.lazy_imports import lazy_import, has_capability
+
+cv2 = lazy_import('cv2')
+
+CPU_COUNT = os.cpu_count() or 1
+# Threads running sub-analyses concurrently; 1 runs them inline on the caller's thread
+FORENSICS_THREADS = max(1, int(os.getenv('FORENSICS_THREADS', str(min(4, CPU_COUNT)))))
+# Threads each OpenCV call may use internally; by default the cores left per pool thread
+OPENCV_THREADS = max(1, int(os.getenv('OPENCV_THREADS', str(max(1, CPU_COUNT // FORENSICS_THREADS)))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def forensics_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if has_capability('cv2'):
+                cv2.setNumThreads(OPENCV_THREADS)
+            _pool = ThreadPoolExecutor(max_workers=FORENSICS_THREADS, thread_name_prefix='forensics')
+    return _pool
+
+def run_parallel(tasks: Dict[str, Tuple[Callable[..., Any], tuple]]) -> Dict[str, Any]:
+    """
+    Run {name: (func, args)} on the shared pool and return {name: result} in the
+    order the tasks were given. The first exception raised by a task is re-raised.
+    """
+    if FORENSICS_THREADS == 1 or len(tasks) < 2:
+        return {name: func(*args) for name, (func, args) in tasks.items()}
+    pool = forensics_pool()
+    futures = {name: pool.submit(func, *args) for name, (func, args) in tasks.items()}
+    return {name: future.result() for name, future in futures.items()}
@@ -1,13 +1,15 @@
 # modules/pipeline.py
-import cv2, json
+import json
 from datetime import datetime, timezone
 from typing import Dict, Any, List
 from modules.authenticity import analyze_image_forensics
 from modules.content import ContentDetector, classify_scene
+from modules.image_context import ImageContext
 from modules.metadata import read_exif
-from modules.environment import validate_with_weather
+from modules.environment import start_weather_validation, WEATHER_TIMEOUT_RESULT
 from modules.fraud import analyze_fraud
 from modules.fusion import fuse_scores, decide
+from modules.geodesy import boundary_distance_m
 
 def process_claim(input_data: Dict[str,Any]) -> Dict[str,Any]:
     farmer = input_data['farmer_data']
@@ -15,23 +17,34 @@ def process_claim(input_data: Dict[str,Any]) -> Dict[str,Any]:
     images = input_data['media_uploads']['images']
     crop_type = farmer.get('crop_details', {}).get('crop_type', 'Unknown')
 
+    # Weather validation runs in the background while the images are analysed
+    first_ts = images[0]['capture_metadata'].get('timestamp')
+    date_iso = datetime.fromtimestamp(first_ts/1000, tz=timezone.utc).strftime("%Y-%m-%d") if first_ts else datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    lat = images[0]['capture_metadata']['gps_coordinates'][0]
+    lon = images[0]['capture_metadata']['gps_coordinates'][1]
+    weather_task = start_weather_validation(lat, lon, date_iso, claim.get('claim_reason',''))
+
     yolo = ContentDetector()
     auth_scores, scenes, exifs = [], [], []
     per_image = []
 
     for img in images:
         path = img['file_path']
-        auth = analyze_image_forensics(path)
-        scene = classify_scene(path, yolo)
+        # Decoded once; forensics, scene classification and YOLO share the buffers
+        ctx = ImageContext(path)
+        auth = analyze_image_forensics(ctx)
+        scene = classify_scene(ctx, yolo)
+        ctx.release()
         exif_info = read_exif(path)
         loc = {'coordinates_valid': False, 'distance_from_boundary_m': None}
         try:
             from shapely.geometry import Point, Polygon
             gps = img['capture_metadata']['gps_coordinates']
             point = Point(gps[1], gps[0])
-            poly = Polygon(farmer['farm_location']['registered_coordinates'])
+            ring = farmer['farm_location']['registered_coordinates']
+            poly = Polygon(ring)
             loc['coordinates_valid'] = poly.contains(point)
-            loc['distance_from_boundary_m'] = round(point.distance(poly.boundary)*111000, 2)
+            loc['distance_from_boundary_m'] = round(boundary_distance_m(gps[0], gps[1], ring), 2)
         except Exception:
             pass
 
@@ -47,11 +60,7 @@ def process_claim(input_data: Dict[str,Any]) -> Dict[str,Any]:
     damage_conf = 0.75 if veg_list else 0.5
     severity = 'minimal' if damage_percent < 15 else ('moderate' if damage_percent < 35 else ('severe' if damage_percent < 60 else 'critical'))
 
-    first_ts = images[0]['capture_metadata'].get('timestamp')
-    date_iso = datetime.fromtimestamp(first_ts/1000, tz=timezone.utc).strftime("%Y-%m-%d") if first_ts else datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    lat = images[0]['capture_metadata']['gps_coordinates'][0]
-    lon = images[0]['capture_metadata']['gps_coordinates'][1]
-    weather = validate_with_weather(lat, lon, date_iso, claim.get('claim_reason',''))
+    weather = weather_task.result(dict(WEATHER_TIMEOUT_RESULT))
     fraud = analyze_fraud(farmer, claim, {'calculated_damage_percent': damage_percent}, avg_auth, scenes[0] if scenes else {})
 
     final_conf = fuse_scores(avg_auth, damage_conf, fraud['fraud_likelihood'], weather.get('supports_claim', False))
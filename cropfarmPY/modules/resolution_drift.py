@@ -0,0 +1,83 @@
+# modules/resolution_drift.py
+"""
+Accuracy drift of reduced-resolution analysis
+
+Runs each analyzer on the same image at every decode reduction and reports how
+far its numeric outputs move from the full-resolution result, which labels
+flip, and what each pass cost, so declared reductions can be checked against
+real claim photos.
+"""
+import time
+from typing import Any, Callable, Dict, Iterable, Tuple
+from modules.image_context import ImageContext, REDUCTIONS, analysis_reduction
+
+# analyzer(ctx, reduction) -> result dict; paired with the reduction it declares
+Analyzer = Callable[[ImageContext, int], Dict[str, Any]]
+
+def _leaves(value: Any, prefix: str = '') -> Dict[str, Any]:
+    # Nested result dicts flattened to dotted keys
+    if not isinstance(value, dict):
+        return {prefix: value}
+    out: Dict[str, Any] = {}
+    for key, item in value.items():
+        out.update(_leaves(item, f"{prefix}.{key}" if prefix else key))
+    return out
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _compare(full: Dict[str, Any], reduced: Dict[str, Any]) -> Dict[str, Any]:
+    drift, changed = {}, []
+    for key, base in full.items():
+        other = reduced.get(key)
+        if _is_number(base) and _is_number(other):
+            drift[key] = round(abs(other - base), 4)
+        elif other != base:
+            changed.append(key)
+    return {'max_abs_drift': max(drift.values(), default=0.0), 'drift': drift, 'changed_labels': changed}
+
+def _run(path: str, analyze: Analyzer, reduction: int) -> Tuple[Dict[str, Any], float, Tuple[int, ...]]:
+    # Fresh context per pass so each one pays for its own decode
+    ctx = ImageContext(path)
+    start = time.perf_counter()
+    result = analyze(ctx, reduction)
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    decoded = ctx.reduced(reduction)
+    shape = tuple(decoded.shape[:2]) if decoded.loaded else ()
+    ctx.release()
+    return result, elapsed_ms, shape
+
+def resolution_drift_report(paths: Iterable[str], analyzers: Dict[str, Tuple[Analyzer, int]],
+                            reductions: Iterable[int] = REDUCTIONS) -> Dict[str, Any]:
+    reductions = sorted({1, *reductions})
+    images = []
+    summary: Dict[str, Dict[str, Any]] = {
+        name: {
+            'declared_reduction': declared,
+            'configured_reduction': analysis_reduction(declared),
+            'by_reduction': {f"1/{r}": {'max_abs_drift': 0.0, 'changed_labels': 0, 'total_ms': 0.0} for r in reductions},
+        }
+        for name, (_, declared) in analyzers.items()
+    }
+    paths = list(paths)
+    if paths:
+        # The first call pays for lazy imports; keep that out of the timings
+        for analyze, _ in analyzers.values():
+            _run(paths[0], analyze, 1)
+    for path in paths:
+        entry: Dict[str, Any] = {'path': path, 'analyzers': {}}
+        for name, (analyze, _) in analyzers.items():
+            runs = {r: _run(path, analyze, r) for r in reductions}
+            full = _leaves(runs[1][0])
+            per_reduction = {}
+            for r, (result, elapsed_ms, shape) in runs.items():
+                comparison = _compare(full, _leaves(result))
+                comparison.update({'decoded_shape': list(shape), 'elapsed_ms': round(elapsed_ms, 2)})
+                per_reduction[f"1/{r}"] = comparison
+                totals = summary[name]['by_reduction'][f"1/{r}"]
+                totals['max_abs_drift'] = max(totals['max_abs_drift'], comparison['max_abs_drift'])
+                totals['changed_labels'] += len(comparison['changed_labels'])
+                totals['total_ms'] = round(totals['total_ms'] + elapsed_ms, 2)
+            entry['analyzers'][name] = per_reduction
+        images.append(entry)
+    return {'summary': summary, 'images': images}
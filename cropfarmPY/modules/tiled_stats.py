@@ -0,0 +1,108 @@
+# Shared module: canonical copy in backend/worker/, vendored unchanged into cropfarmPY/modules/
+"""
+Tile-streamed image statistics
+
+Very large frames (a 48 MP drone photo) are analysed in fixed-height bands of
+rows instead of as one array. Each band's per-channel count, mean and sum of
+squared deviations (M2) are folded into running totals with Chan et al.'s
+parallel merge, so the float64 temporaries are band-sized however large the
+image is, while the merged means and standard deviations match the
+whole-image NumPy result to floating-point rounding.
+
+Analyzers that only count pixels run their masks over row bands of an
+ImageContext instead, so the HSV planes and masks they build stay band-sized
+too. Every mask is a per-pixel test, so the summed band counts are exactly the
+whole-image counts.
+"""
+
+import os
+
+try:
+    from .lazy_imports import lazy_import    # cropfarmPY, imported as modules.tiled_stats
+except ImportError:
+    from lazy_imports import lazy_import     # worker, run from its own directory
+
+np = lazy_import('numpy')
+
+# Rows per band; the temporaries hold at most rows * width * channels float64 values
+TILE_ROWS = int(os.getenv('IMAGE_TILE_ROWS', '256'))
+# Images up to this many pixels are analysed whole; larger ones are streamed
+TILED_MIN_PIXELS = int(os.getenv('IMAGE_TILED_MIN_PIXELS', '8000000'))
+
+class RunningStats:
+    """Per-channel count, mean and M2 that can absorb samples or merge another RunningStats"""
+
+    def __init__(self, channels=1):
+        self.count = 0
+        self.mean = np.zeros(channels)
+        self.m2 = np.zeros(channels)
+
+    def update(self, values):
+        """Fold in an (..., channels) array of samples"""
+        values = values.reshape(-1, len(self.mean))
+        if not len(values):
+            return self
+        mean = values.mean(axis=0, dtype=np.float64)
+        m2 = ((values - mean) ** 2).sum(axis=0)
+        return self._merge(len(values), mean, m2)
+
+    def merge(self, other):
+        return self._merge(other.count, other.mean, other.m2)
+
+    def _merge(self, count, mean, m2):
+        if not count:
+            return self
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / total)
+        self.count = total
+        return self
+
+    def pooled(self):
+        """All channels as one sample, i.e. the statistics np.mean/np.std give over the whole array"""
+        pooled = RunningStats(1)
+        for c in range(len(self.mean)):
+            pooled._merge(self.count, self.mean[c:c + 1], self.m2[c:c + 1])
+        return pooled
+
+    @property
+    def variance(self):
+        """Population variance per channel (ddof=0, like np.var)"""
+        return self.m2 / self.count if self.count else np.full(len(self.mean), np.nan)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+def image_bands(img, rows=TILE_ROWS):
+    """Yield a PIL image as (rows, width, channels) uint8 arrays, one band at a time"""
+    width, height = img.size
+    for top in range(0, height, rows):
+        yield np.asarray(img.crop((0, top, width, min(height, top + rows))))
+
+def streamed_channel_stats(img, rows=TILE_ROWS):
+    """RunningStats over every pixel of a PIL image, built band by band"""
+    stats = RunningStats(len(img.getbands()))
+    for band in image_bands(img, rows):
+        stats.update(band)
+    return stats
+
+def row_bands(ctx, rows=TILE_ROWS):
+    """Yield contexts over row views of an ImageContext's decoded image, dropping each band's planes once consumed"""
+    if ctx.pixel_count <= TILED_MIN_PIXELS:
+        yield ctx
+        return
+    bgr = ctx.bgr
+    for top in range(0, bgr.shape[0], rows):
+        band = type(ctx)(bgr=bgr[top:top + rows])
+        yield band
+        band.release()
+
+def count_masks(ctx, masks, rows=TILE_ROWS):
+    """Non-zero pixel count of each named mask(band) callable, summed over the row bands"""
+    counts = dict.fromkeys(masks, 0)
+    for band in row_bands(ctx, rows):
+        for name, mask in masks.items():
+            counts[name] += int(np.count_nonzero(mask(band)))
+    return counts
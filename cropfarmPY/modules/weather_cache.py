@@ -0,0 +1,334 @@
+# Shared module: canonical copy in backend/worker/, vendored unchanged into cropfarmPY/modules/
+"""
+Persistent cache for weather lookups
+
+Claims after a storm cluster in a few square kilometres on the same day, so
+provider responses are stored in SQLite keyed by provider, date and a
+quantized lat/lon cell rather than the exact photo coordinates. Lookups are
+issued for the cell centre so every claim in a cell shares one entry. Data for
+today and the last few days expires quickly because providers still revise it;
+older dates never expire. Multi-day windows are stored the same way, one row
+per day, so overlapping windows from nearby claims only fetch the days they
+do not share. SQLite in WAL mode makes the file safe to share between worker
+processes.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    from .result_cache import APP_DIR    # cropfarmPY, imported as modules.weather_cache
+except ImportError:
+    from result_cache import APP_DIR     # worker, run from its own directory
+
+DEBUG_MODE = os.getenv('DEBUG_MODE', 'true').lower() == 'true'
+# Empty or 'off' disables the cache
+WEATHER_CACHE_PATH = os.getenv('WEATHER_CACHE_PATH', os.path.join(APP_DIR, 'cache', 'weather.sqlite3'))
+# Cell size in degrees; 0.05 is about 5.5 km north-south
+WEATHER_CELL_DEG = float(os.getenv('WEATHER_CELL_DEG', '0.05'))
+# Seconds an entry for today (or a future date) stays valid
+WEATHER_TODAY_TTL_S = float(os.getenv('WEATHER_TODAY_TTL_SECONDS', '900'))
+# Dates within this many days of today are still being revised by providers
+WEATHER_SETTLING_DAYS = int(os.getenv('WEATHER_SETTLING_DAYS', '3'))
+WEATHER_SETTLING_TTL_S = float(os.getenv('WEATHER_SETTLING_TTL_SECONDS', '21600'))
+# Expired rows are swept at most this often
+PURGE_INTERVAL_S = 300.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS weather (
+    provider TEXT NOT NULL,
+    cell_lat REAL NOT NULL,
+    cell_lon REAL NOT NULL,
+    day TEXT NOT NULL,
+    value TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (provider, cell_lat, cell_lon, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS weather_expires_at ON weather(expires_at);
+"""
+
+def debug(msg):
+    if DEBUG_MODE:
+        print(f"[DEBUG] {msg}", file=sys.stderr)
+
+def cell_of(lat, lon, cell_deg=None):
+    """Centre of the grid cell containing a point, rounded so it is stable as a key"""
+    step = cell_deg or WEATHER_CELL_DEG
+    return (round((math.floor(lat / step) + 0.5) * step, 6),
+            round((math.floor(lon / step) + 0.5) * step, 6))
+
+def ttl_for(date_iso, today=None):
+    """Seconds an entry for `date_iso` stays valid, or None for settled historical dates"""
+    today = today or datetime.now(timezone.utc).date()
+    day = date.fromisoformat(date_iso[:10])
+    if day >= today:
+        return WEATHER_TODAY_TTL_S
+    if day >= today - timedelta(days=WEATHER_SETTLING_DAYS):
+        return WEATHER_SETTLING_TTL_S
+    return None
+
+def date_range(start_iso, end_iso):
+    """Every date_iso from start_iso to end_iso inclusive"""
+    start, end = date.fromisoformat(start_iso[:10]), date.fromisoformat(end_iso[:10])
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+class WeatherCache:
+    """(provider, cell, date) keyed store for provider responses (JSON-serializable)"""
+
+    def __init__(self, path, cell_deg=None):
+        self.path = path
+        self.cell_deg = cell_deg or WEATHER_CELL_DEG
+        self.hits = Counter()
+        self.misses = Counter()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def cell(self, lat, lon):
+        return cell_of(lat, lon, self.cell_deg)
+
+    def _read(self, provider, cell_lat, cell_lon, day):
+        try:
+            row = self._connection().execute(
+                'SELECT value, expires_at FROM weather '
+                'WHERE provider = ? AND cell_lat = ? AND cell_lon = ? AND day = ?',
+                (provider, cell_lat, cell_lon, day)
+            ).fetchone()
+            if row is not None and (row[1] is None or row[1] > time.time()):
+                return json.loads(row[0])
+        except (OSError, sqlite3.Error, ValueError) as e:
+            debug(f"Weather cache lookup failed ({provider}): {e}")
+        return None
+
+    def _count(self, provider, hit):
+        with self._stats_lock:
+            (self.hits if hit else self.misses)[provider] += 1
+
+    def get(self, provider, lat, lon, date_iso):
+        """Cached value for the cell containing (lat, lon) on `date_iso`, or None if missing or expired"""
+        value = self._read(provider, *self.cell(lat, lon), date_iso[:10])
+        self._count(provider, value is not None)
+        return value
+
+    def peek(self, provider, lat, lon, date_iso):
+        """Like get, but not counted as a hit or miss"""
+        return self._read(provider, *self.cell(lat, lon), date_iso[:10])
+
+    def put(self, provider, lat, lon, date_iso, value):
+        """Store a provider response; failures are logged and otherwise ignored"""
+        cell_lat, cell_lon = self.cell(lat, lon)
+        now = time.time()
+        ttl = ttl_for(date_iso)
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO weather (provider, cell_lat, cell_lon, day, value, fetched_at, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (provider, cell_lat, cell_lon, date_iso[:10], json.dumps(value, separators=(',', ':')),
+                     now, None if ttl is None else now + ttl)
+                )
+                if now - self._last_purge > PURGE_INTERVAL_S:
+                    self._last_purge = now
+                    conn.execute('DELETE FROM weather WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+        except (OSError, sqlite3.Error, TypeError, ValueError) as e:
+            debug(f"Weather cache store failed ({provider}): {e}")
+
+    def lookup(self, provider, lat, lon, date_iso, fetch):
+        """
+        Cached value, or `fetch(cell_lat, cell_lon, date_iso)` on a miss. The fetch
+        returns (value, cacheable); only cacheable values are stored. Concurrent
+        misses for one key in this process share a single fetch.
+        """
+        cell_lat, cell_lon = self.cell(lat, lon)
+        day = date_iso[:10]
+        value = self._read(provider, cell_lat, cell_lon, day)
+        if value is not None:
+            self._count(provider, True)
+            return value
+
+        key = (provider, cell_lat, cell_lon, day)
+        with self._inflight_lock:
+            lock = self._inflight.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                # Another thread may have filled the entry while this one waited
+                value = self._read(provider, cell_lat, cell_lon, day)
+                self._count(provider, value is not None)
+                if value is None:
+                    value, cacheable = fetch(cell_lat, cell_lon, date_iso)
+                    if cacheable:
+                        self.put(provider, lat, lon, date_iso, value)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        return value
+
+    def _read_series(self, provider, cell_lat, cell_lon, start_iso, end_iso):
+        try:
+            rows = self._connection().execute(
+                'SELECT day, value, expires_at FROM weather '
+                'WHERE provider = ? AND cell_lat = ? AND cell_lon = ? AND day BETWEEN ? AND ?',
+                (provider, cell_lat, cell_lon, start_iso, end_iso)
+            ).fetchall()
+            now = time.time()
+            return {day: json.loads(value) for day, value, expires_at in rows
+                    if expires_at is None or expires_at > now}
+        except (OSError, sqlite3.Error, ValueError) as e:
+            debug(f"Weather cache series lookup failed ({provider}): {e}")
+            return {}
+
+    def put_series(self, provider, lat, lon, values):
+        """Store {date_iso: value} for one cell in a single transaction, each day with its own TTL"""
+        cell_lat, cell_lon = self.cell(lat, lon)
+        now = time.time()
+        rows = []
+        for day, value in values.items():
+            ttl = ttl_for(day)
+            rows.append((provider, cell_lat, cell_lon, day[:10], json.dumps(value, separators=(',', ':')),
+                         now, None if ttl is None else now + ttl))
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO weather (provider, cell_lat, cell_lon, day, value, fetched_at, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        except (OSError, sqlite3.Error, TypeError, ValueError) as e:
+            debug(f"Weather cache series store failed ({provider}): {e}")
+
+    def missing_days(self, provider, lat, lon, start_iso, end_iso):
+        """Days in [start_iso, end_iso] with no valid entry, not counted as hits or misses"""
+        cached = self._read_series(provider, *self.cell(lat, lon), start_iso[:10], end_iso[:10])
+        return [day for day in date_range(start_iso, end_iso) if day not in cached]
+
+    def lookup_series(self, provider, lat, lon, start_iso, end_iso, fetch):
+        """
+        Daily values {date_iso: value} for the cell containing (lat, lon) over
+        [start_iso, end_iso]. Days already cached are reused; the span covering
+        the missing ones is requested with `fetch(cell_lat, cell_lon, first_missing,
+        last_missing)`, which returns ({date_iso: value}, cacheable). A series
+        counts as one hit when fully cached, otherwise one miss.
+        """
+        cell_lat, cell_lon = self.cell(lat, lon)
+        start_iso, end_iso = start_iso[:10], end_iso[:10]
+        days = date_range(start_iso, end_iso)
+        series = self._read_series(provider, cell_lat, cell_lon, start_iso, end_iso)
+        if len(series) == len(days):
+            self._count(provider, True)
+            return series
+
+        key = (provider, cell_lat, cell_lon, start_iso, end_iso)
+        with self._inflight_lock:
+            lock = self._inflight.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                series = self._read_series(provider, cell_lat, cell_lon, start_iso, end_iso)
+                missing = [day for day in days if day not in series]
+                self._count(provider, not missing)
+                if missing:
+                    fetched, cacheable = fetch(cell_lat, cell_lon, missing[0], missing[-1])
+                    if cacheable and fetched:
+                        self.put_series(provider, cell_lat, cell_lon, fetched)
+                    series.update({day: value for day, value in fetched.items() if start_iso <= day <= end_iso})
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        return series
+
+    def stats(self):
+        """Hit/miss counters and hit rate for this process plus the size of the store"""
+        with self._stats_lock:
+            hits, misses = dict(self.hits), dict(self.misses)
+        total_hits, total_misses = sum(hits.values()), sum(misses.values())
+        report = {
+            'enabled': True,
+            'path': self.path,
+            'cell_deg': self.cell_deg,
+            'hits': total_hits,
+            'misses': total_misses,
+            'hit_rate': round(total_hits / (total_hits + total_misses), 3) if total_hits + total_misses else None,
+            'by_provider': {p: {'hits': hits.get(p, 0), 'misses': misses.get(p, 0)}
+                            for p in sorted(set(hits) | set(misses))},
+        }
+        try:
+            conn = self._connection()
+            report['entries'] = conn.execute('SELECT COUNT(*) FROM weather').fetchone()[0]
+            report['permanent_entries'] = conn.execute(
+                'SELECT COUNT(*) FROM weather WHERE expires_at IS NULL').fetchone()[0]
+        except sqlite3.Error as e:
+            report['error'] = str(e)
+        return report
+
+    def clear(self):
+        """Remove every stored response"""
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM weather')
+
+class NullWeatherCache:
+    """Stand-in used when the cache is disabled"""
+
+    def get(self, provider, lat, lon, date_iso):
+        return None
+
+    def peek(self, provider, lat, lon, date_iso):
+        return None
+
+    def put(self, provider, lat, lon, date_iso, value):
+        pass
+
+    def lookup(self, provider, lat, lon, date_iso, fetch):
+        # Without a cache there is no shared cell, so fetch the exact point
+        return fetch(lat, lon, date_iso)[0]
+
+    def put_series(self, provider, lat, lon, values):
+        pass
+
+    def missing_days(self, provider, lat, lon, start_iso, end_iso):
+        return date_range(start_iso, end_iso)
+
+    def lookup_series(self, provider, lat, lon, start_iso, end_iso, fetch):
+        return fetch(lat, lon, start_iso[:10], end_iso[:10])[0]
+
+    def stats(self):
+        return {'enabled': False}
+
+    def clear(self):
+        pass
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def weather_cache():
+    """Return the process-wide cache configured by WEATHER_CACHE_PATH"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if WEATHER_CACHE_PATH and WEATHER_CACHE_PATH.lower() != 'off':
+                _cache = WeatherCache(WEATHER_CACHE_PATH)
+            else:
+                _cache = NullWeatherCache()
+    return _cache
@@ -0,0 +1,319 @@
+# modules/weather_providers.py
+"""
+Hedged weather lookups across providers
+
+Each provider is asked once for a window of WEATHER_WINDOW_DAYS days ending on
+the capture date, cached as a per-cell daily series; rolling aggregates
+(7/30-day rain, heat days) are computed once per cell and day and shared.
+
+Meteostat (RapidAPI, needs a key) is asked first and Open-Meteo (keyless) is
+the alternate. If the first provider has not answered by its observed p95
+latency, a hedged request goes to the alternate and the first good answer
+wins. Each provider has a circuit breaker that stops traffic to it after
+repeated failures or timeouts. Rows are Meteostat-shaped (tavg, tmin, tmax,
+prcp, rhum) whichever provider answered, plus the aggregates and a 'source' key.
+"""
+import os, sys, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from modules.http_client import HttpError, http_client
+from modules.weather_cache import date_range, weather_cache
+
+WEATHER_PROVIDERS = [p.strip() for p in os.getenv('WEATHER_PROVIDERS', 'meteostat,open_meteo').split(',') if p.strip()]
+WEATHER_HEDGE_PERCENTILE = float(os.getenv('WEATHER_HEDGE_PERCENTILE', '95'))
+WEATHER_HEDGE_MIN_SAMPLES = 20          # below this the fixed delay is used
+WEATHER_HEDGE_DELAY_S = float(os.getenv('WEATHER_HEDGE_DELAY_SECONDS', '1.0'))
+WEATHER_HEDGE_MIN_DELAY_S = 0.05
+WEATHER_WINDOW_DAYS = int(os.getenv('WEATHER_WINDOW_DAYS', '30'))   # days up to and including the capture date
+HEAT_DAY_C = float(os.getenv('WEATHER_HEAT_DAY_C', '35'))          # daily max at which a day counts as hot
+OPEN_METEO_FORECAST_PAST_DAYS = 92
+# Multi-day thresholds behind drought and flood claims
+DROUGHT_RAIN_30D_MM = 20.0
+DROUGHT_HEAT_DAYS_30D = 5
+FLOOD_RAIN_7D_MM = 150.0
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('WEATHER_BREAKER_FAILURES', '3'))
+BREAKER_COOLDOWN_S = float(os.getenv('WEATHER_BREAKER_COOLDOWN_SECONDS', '30'))
+# An answer slower than the claim's weather deadline counts as a timeout
+SLOW_CALL_S = float(os.getenv('WEATHER_DEADLINE_SECONDS', '5'))
+
+def _log(message: str) -> None:
+    if os.getenv('DEBUG_MODE', 'true').lower() == 'true':
+        print(f"[DEBUG] {message}", file=sys.stderr)
+
+class MeteostatError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f'API {status_code}')
+        self.status_code = status_code   # 200 with an empty data list means no observations
+
+class OpenMeteoError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f'Open-Meteo API {status_code}')
+        self.status_code = status_code
+
+class WeatherUnavailable(Exception):
+    pass
+
+def _get_json(provider: str, path: str, params: Dict[str, Any], headers: Optional[Dict[str, str]], timeout: float):
+    try:
+        return http_client(provider).get_json(path, params, headers, deadline_s=timeout)
+    except HttpError as e:
+        if e.status is None:
+            raise
+        return e.status, None   # retryable status that persisted
+
+def window_bounds(end_iso: str, days: Optional[int] = None) -> Tuple[str, str]:
+    days = days or WEATHER_WINDOW_DAYS
+    end = date.fromisoformat(end_iso[:10])
+    return (end - timedelta(days=days - 1)).isoformat(), end.isoformat()
+
+def window_aggregates(series: Dict[str, Dict[str, Any]], end_iso: str, days: Optional[int] = None) -> Dict[str, Any]:
+    # Rolling sums/counts over the window ending on end_iso; None when there is no data at all
+    days = days or WEATHER_WINDOW_DAYS
+    ordered = [series.get(day) for day in date_range(*window_bounds(end_iso, days))]
+    last = lambda n, key: [v[key] for v in ordered[-n:] if v and v.get(key) is not None]
+    rain_7d, rain_30d, rhum_7d, tmax_30d = last(7, 'prcp'), last(30, 'prcp'), last(7, 'rhum'), last(30, 'tmax')
+    return {
+        'window_days': days,
+        'days_with_data': sum(1 for v in ordered if v),
+        'rain_7d_mm': round(sum(rain_7d), 1) if rain_7d else None,
+        'rain_30d_mm': round(sum(rain_30d), 1) if rain_30d else None,
+        'max_daily_rain_7d_mm': max(rain_7d) if rain_7d else None,
+        'mean_humidity_7d': round(sum(rhum_7d) / len(rhum_7d), 1) if rhum_7d else None,
+        'heat_days_30d': sum(1 for t in tmax_30d if t >= HEAT_DAY_C) if tmax_30d else None,
+    }
+
+def _meteostat_series(api_key: str, timeout: float):
+    def fetch(lat: float, lon: float, start_iso: str, end_iso: str):
+        params = {'lat': lat, 'lon': lon, 'start': start_iso, 'end': end_iso}
+        headers = {'x-rapidapi-key': api_key, 'x-rapidapi-host': 'meteostat.p.rapidapi.com'}
+        status, body = _get_json('meteostat', '/point/daily', params, headers, timeout)
+        if status != 200:
+            raise MeteostatError(status)
+        rows = (body or {}).get('data') or []
+        return {str(row['date'])[:10]: {k: v for k, v in row.items() if k != 'date'} for row in rows if row.get('date')}, True
+    return fetch
+
+def _open_meteo_endpoint(start_iso: str) -> Tuple[str, str]:
+    # The forecast API only reaches ~3 months back; older ranges come from the archive
+    recent = date.fromisoformat(start_iso[:10]) >= datetime.now(timezone.utc).date() - timedelta(days=OPEN_METEO_FORECAST_PAST_DAYS)
+    return ('open_meteo', '/v1/forecast') if recent else ('open_meteo_archive', '/v1/archive')
+
+def _open_meteo_series(timeout: float):
+    def fetch(lat: float, lon: float, start_iso: str, end_iso: str):
+        provider, path = _open_meteo_endpoint(start_iso)
+        params = {'latitude': lat, 'longitude': lon, 'start_date': start_iso, 'end_date': end_iso,
+                  'daily': 'temperature_2m_mean,temperature_2m_max,temperature_2m_min,'
+                           'precipitation_sum,relative_humidity_2m_mean',
+                  'timezone': 'auto'}
+        status, body = _get_json(provider, path, params, None, timeout)
+        if status != 200:
+            raise OpenMeteoError(status)
+        daily = (body or {}).get('daily') or {}
+        times = daily.get('time') or []
+        column = lambda key: (daily.get(key) or []) + [None] * len(times)
+        return {day[:10]: {'tavg': tavg, 'tmin': tmin, 'tmax': tmax, 'prcp': prcp, 'rhum': rhum}
+                for day, tavg, tmin, tmax, prcp, rhum in zip(
+                    times, column('temperature_2m_mean'), column('temperature_2m_min'), column('temperature_2m_max'),
+                    column('precipitation_sum'), column('relative_humidity_2m_mean'))}, True
+    return fetch
+
+def _window_key(provider: str, days: Optional[int] = None) -> str:
+    return f'{provider}_window{days or WEATHER_WINDOW_DAYS}'
+
+def _window_row(provider: str, series_fetch, no_data: Exception, lat: float, lon: float, end_iso: str,
+                days: Optional[int]) -> Dict[str, Any]:
+    # Capture-day row plus aggregates, computed once per cell and day and shared through the cache
+    days = days or WEATHER_WINDOW_DAYS
+
+    def fetch(cell_lat: float, cell_lon: float, day: str):
+        start_iso, stop_iso = window_bounds(day, days)
+        series = weather_cache().lookup_series(f'{provider}_daily', cell_lat, cell_lon, start_iso, stop_iso,
+                                               lambda *span: _guarded_fetch(provider, series_fetch, *span))
+        row = series.get(day[:10])
+        if not row:
+            raise no_data
+        aggregates = window_aggregates(series, day, days)
+        return dict(row, **aggregates), aggregates['days_with_data'] == days
+    return weather_cache().lookup(_window_key(provider, days), lat, lon, end_iso, fetch)
+
+def fetch_meteostat_window(lat: float, lon: float, end_iso: str, api_key: str, timeout: float = 15,
+                           days: Optional[int] = None) -> Dict[str, Any]:
+    """Meteostat row for end_iso plus window aggregates; raises MeteostatError (200 = no data)"""
+    return _window_row('meteostat', _meteostat_series(api_key, timeout), MeteostatError(200), lat, lon, end_iso, days)
+
+def fetch_open_meteo_window(lat: float, lon: float, end_iso: str, timeout: float = 15,
+                            days: Optional[int] = None) -> Dict[str, Any]:
+    """Open-Meteo values for end_iso as a Meteostat-shaped row plus window aggregates; raises OpenMeteoError"""
+    return _window_row('open_meteo', _open_meteo_series(timeout), OpenMeteoError(200), lat, lon, end_iso, days)
+
+class CircuitBreaker:
+    # closed -> open after N consecutive failures -> half_open (one probe) after the cooldown
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cooldown_s: float = BREAKER_COOLDOWN_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        # False while open and cooling down; unlike allow, never claims the half-open probe
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at < self.cooldown_s:
+                self.rejected += 1
+                return False
+            return True
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown_s:
+                self.state = 'half_open'
+                _log(f"Circuit for {self.name} half-open, sending a probe")
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.state, self.failures = 'closed', 0
+                return
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                    _log(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state, self.opened_at = 'open', time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.failures,
+                    'times_opened': self.times_opened, 'rejected_calls': self.rejected}
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_counts = {'lookups': 0, 'hedged': 0, 'alternate_wins': 0, 'all_failed': 0}
+_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_pid: Optional[int] = None
+
+def _breaker(name: str) -> CircuitBreaker:
+    with _lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+def _count(field: str) -> None:
+    with _lock:
+        _counts[field] += 1
+
+def _leg_pool() -> ThreadPoolExecutor:
+    # Recreated after a fork: the parent's threads do not exist in the child
+    global _pool, _pool_pid
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool, _pool_pid = ThreadPoolExecutor(max_workers=8, thread_name_prefix='weather-leg'), os.getpid()
+        return _pool
+
+def hedge_delay_s(provider: str, date_iso: str, days: Optional[int] = None) -> float:
+    # Latency of the client the leg will use: Open-Meteo windows that start long ago go to the archive
+    client = _open_meteo_endpoint(window_bounds(date_iso, days)[0])[0] if provider == 'open_meteo' else provider
+    latency = http_client(client).latency
+    if latency.count < WEATHER_HEDGE_MIN_SAMPLES:
+        return WEATHER_HEDGE_DELAY_S
+    return max(WEATHER_HEDGE_MIN_DELAY_S, latency.percentile(WEATHER_HEDGE_PERCENTILE) / 1000.0)
+
+def _fetchers(lat: float, lon: float, date_iso: str, api_key: Optional[str], timeout: float,
+              days: Optional[int]) -> Dict[str, Callable[[], Dict[str, Any]]]:
+    fetchers = {'open_meteo': lambda: fetch_open_meteo_window(lat, lon, date_iso, timeout, days)}
+    if api_key:
+        fetchers['meteostat'] = lambda: fetch_meteostat_window(lat, lon, date_iso, api_key, timeout, days)
+    return fetchers
+
+def _guarded_fetch(provider: str, series_fetch, lat: float, lon: float, start_iso: str, end_iso: str):
+    # Only requests actually sent ask the breaker and feed it; cache hits never get here
+    breaker = _breaker(provider)
+    if not breaker.allow():
+        raise WeatherUnavailable(f'Circuit for {provider} is open')
+    started = time.monotonic()
+    try:
+        result = series_fetch(lat, lon, start_iso, end_iso)
+    except Exception:
+        breaker.record(False)
+        raise
+    breaker.record(time.monotonic() - started <= SLOW_CALL_S)
+    return result
+
+def _leg(provider: str, fetch: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    return dict(fetch(), source=provider)
+
+def fetch_weather_window(lat: float, lon: float, date_iso: str, api_key: Optional[str] = None,
+                         timeout: float = 15, days: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Row for the capture date plus aggregates over the `days` before it, from
+    the first provider that answers. Raises the first provider's error when
+    every provider fails, WeatherUnavailable when every circuit is open.
+    """
+    _count('lookups')
+    fetchers = _fetchers(lat, lon, date_iso, api_key, timeout, days)
+    queue: List[str] = [p for p in WEATHER_PROVIDERS if p in fetchers]
+    # A cached answer sends no request, so it is served whatever the breakers say
+    cache = weather_cache()
+    for provider in queue:
+        if cache.peek(_window_key(provider, days), lat, lon, date_iso) is not None:
+            return _leg(provider, fetchers[provider])
+
+    def next_provider() -> Optional[str]:
+        # Open circuits are skipped here; the probe itself is claimed by the fetch that sends it
+        while queue:
+            provider = queue.pop(0)
+            if _breaker(provider).available():
+                return provider
+        return None
+
+    primary = next_provider()
+    if primary is None:
+        _count('all_failed')
+        raise WeatherUnavailable('All weather providers unavailable (circuits open)')
+
+    pool = _leg_pool()
+    pending = {pool.submit(_leg, primary, fetchers[primary]): primary}
+    error: Optional[Exception] = None
+    hedge_at = time.monotonic() + hedge_delay_s(primary, date_iso, days)
+    while pending:
+        done, _ = wait(pending, timeout=max(0.0, hedge_at - time.monotonic()) if queue else None,
+                       return_when=FIRST_COMPLETED)
+        for future in done:
+            provider = pending.pop(future)
+            try:
+                row = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if provider != primary:
+                _count('alternate_wins')
+            return row
+        # Hedge on a slow leg, or move on at once when one failed
+        if queue and (done or time.monotonic() >= hedge_at):
+            provider = next_provider()
+            if provider is not None:
+                if not done:
+                    _count('hedged')
+                    _log(f"Hedging weather lookup to {provider}")
+                pending[pool.submit(_leg, provider, fetchers[provider])] = provider
+                hedge_at = time.monotonic() + hedge_delay_s(provider, date_iso, days)
+    _count('all_failed')
+    raise error
+
+def weather_provider_stats() -> Dict[str, Any]:
+    with _lock:
+        report: Dict[str, Any] = dict(_counts)
+        breakers = dict(_breakers)
+    report['providers'] = {name: breaker.stats() for name, breaker in breakers.items()}
+    return report